@@ -0,0 +1,50 @@
+"""Benchmark of the exact classical value solver on graphs larger than G14.
+
+Times the branch and bound search on G14 and on larger graphs, and the cvxpy
+ILP backend with --ilp (which needs a MILP solver, e.g. HiGHS).
+
+    uv run python benchmarks/classical_value.py --ilp
+"""
+
+import argparse
+import time
+
+import networkx as nx
+
+from nlg_data.classical import solve_coloring_game
+
+
+def graphs(data_folder: str) -> dict[str, tuple[nx.Graph, int]]:
+    g14 = nx.read_edgelist(f"{data_folder}/games/g14/g14.nx", nodetype=int)
+    return {
+        "G14": (g14, 4),
+        "Mycielski 5 (not 4-colorable)": (nx.mycielski_graph(5), 4),
+        "G(20, 0.5)": (nx.gnp_random_graph(20, 0.5, seed=0), 4),
+        "G(24, 0.4)": (nx.gnp_random_graph(24, 0.4, seed=0), 4),
+        "G(30, 0.3)": (nx.gnp_random_graph(30, 0.3, seed=0), 4),
+        "Petersen, 2 colors": (nx.petersen_graph(), 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--data-folder", default="data")
+    parser.add_argument("--ilp", action="store_true", help="Also time the ILP")
+    args = parser.parse_args()
+
+    backends = ["search", "ilp"] if args.ilp else ["search"]
+    print(f"{'graph':<32}{'n':>4}{'m':>5}  {'backend':<8}{'value':>18}{'time':>11}")
+    for name, (graph, colors) in graphs(args.data_folder).items():
+        for backend in backends:
+            start = time.perf_counter()
+            solution = solve_coloring_game(graph, colors, backend=backend)
+            elapsed = time.perf_counter() - start
+            value = f"{solution.questions - solution.losses}/{solution.questions}"
+            print(
+                f"{name:<32}{graph.number_of_nodes():>4}{graph.number_of_edges():>5}"
+                f"  {backend:<8}{value:>18}{elapsed * 1e3:>9.0f} ms"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""Startup benchmark: checks that importing the models stays cheap.
+
+Each import runs in a fresh interpreter so nothing is cached between runs. The
+script exits with a nonzero status if the best time exceeds the budget or if a
+heavy dependency gets imported eagerly.
+
+    uv run python benchmarks/import_time.py
+"""
+
+import argparse
+import json
+import subprocess
+import sys
+
+BUDGET_SECONDS = 0.5
+"""Upper bound on the best-of-N wall time of `import nlg_data.models`"""
+
+HEAVY_MODULES = ("pandas", "pytz", "qiskit_ibm_runtime", "rustworkx", "tinydb")
+"""Modules which must not be pulled in just by importing the models"""
+
+_probe = """
+import json, sys, time
+t = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - t
+print(json.dumps({{"elapsed": elapsed, "modules": sorted(sys.modules)}}))
+"""
+
+
+def measure(module: str) -> tuple[float, set[str]]:
+    output = subprocess.run(
+        [sys.executable, "-c", _probe.format(module=module)],
+        capture_output=True,
+        check=True,
+        text=True,
+    ).stdout
+    result = json.loads(output)
+    return result["elapsed"], set(result["modules"])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--module", default="nlg_data.models")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--budget", type=float, default=BUDGET_SECONDS)
+    args = parser.parse_args()
+
+    timings = []
+    loaded = set()
+    for _ in range(args.repeat):
+        elapsed, loaded = measure(args.module)
+        timings.append(elapsed)
+
+    best = min(timings)
+    print(f"import {args.module}: best {best * 1e3:.1f} ms over {args.repeat} runs")
+
+    failures = []
+    if best > args.budget:
+        failures.append(f"exceeded the budget of {args.budget * 1e3:.0f} ms")
+
+    eager = sorted(m for m in HEAVY_MODULES if m in loaded)
+    if eager:
+        failures.append(f"eagerly imported {', '.join(eager)}")
+
+    for failure in failures:
+        print(f"FAIL: {failure}", file=sys.stderr)
+
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
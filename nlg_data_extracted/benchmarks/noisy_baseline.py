@@ -0,0 +1,84 @@
+"""Benchmark of the batched noisy simulation of a strategy's circuits.
+
+Times the baseline of every circuit over a grid of noise points, first with
+depolarizing and readout noise only, then also sweeping the ZZ angle. Uses
+the QASM files of --circuits if given, otherwise random 4 qubit circuits of
+the same size as transpiled G14 ones, with one per question.
+
+    uv run python benchmarks/noisy_baseline.py --circuits data/games/g14/circuits/4q
+"""
+
+import argparse
+import time
+
+import networkx as nx
+import numpy as np
+
+from nlg_data.qasm import parse_qasm
+from nlg_data.simulation import NoiseSweep, load_circuits, simulate_baseline
+
+
+def random_circuits(data_folder: str, layers: int = 6, seed: int = 0) -> dict:
+    g14 = nx.read_edgelist(f"{data_folder}/games/g14/g14.nx", nodetype=int)
+    questions = [(v, v) for v in g14] + [
+        e for u, v in g14.edges for e in ((u, v), (v, u))
+    ]
+    rng = np.random.default_rng(seed)
+    circuits = {}
+    for question in questions:
+        lines = ["OPENQASM 2.0;", "qreg q[4];", "creg c[4];"]
+        for _ in range(layers):
+            for q in range(4):
+                a, b = rng.uniform(-np.pi, np.pi, 2)
+                lines.append(f"rz({a}) q[{q}]; sx q[{q}]; rz({b}) q[{q}];")
+            lines.append("ecr q[0],q[2]; ecr q[1],q[3];")
+        lines += [f"measure q[{q}] -> c[{q}];" for q in range(4)]
+        circuits[question] = parse_qasm("\n".join(lines))
+
+    return circuits
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--data-folder", default="data")
+    parser.add_argument("--circuits", help="Folder of QASM files to simulate")
+    args = parser.parse_args()
+
+    if args.circuits:
+        circuits = load_circuits(args.circuits)
+    else:
+        circuits = random_circuits(args.data_folder)
+
+    # Readout errors of a few percent, correlated between the first two bits
+    rng = np.random.default_rng(0)
+    spam = np.eye(16) + rng.uniform(0, 0.02, (16, 16))
+    spam /= spam.sum(axis=0)
+
+    sweeps = {
+        "p1 x p2 x readout x crosstalk": NoiseSweep.grid(
+            p1=np.linspace(0, 0.005, 10),
+            p2=np.linspace(0, 0.05, 10),
+            readout=np.linspace(0, 1, 5),
+            crosstalk=[0, 1],
+        ),
+        "p1 x p2 x zz": NoiseSweep.grid(
+            p1=np.linspace(0, 0.005, 10),
+            p2=np.linspace(0, 0.05, 10),
+            zz=np.linspace(0, 0.1, 10),
+        ),
+    }
+    print(f"{len(circuits)} circuits")
+    print(f"{'sweep':<32}{'points':>8}{'time':>11}{'mean win rate':>16}")
+    for name, noise in sweeps.items():
+        start = time.perf_counter()
+        baseline = simulate_baseline(circuits, noise, spam=spam)
+        elapsed = time.perf_counter() - start
+        mean = baseline.win_rates.mean(axis=1)
+        print(
+            f"{name:<32}{len(noise):>8}{elapsed:>9.1f} s"
+            f"{mean.min():>8.3f}-{mean.max():.3f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
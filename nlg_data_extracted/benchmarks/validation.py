@@ -0,0 +1,100 @@
+"""Benchmark of validating and serializing a large experiments table.
+
+Compares validating each document on its own (`Experiment(**doc)`, as the
+notebooks do) with the bulk TypeAdapter path and the unchecked path for
+trusted data. The synthetic table is built by perturbing the experiments in
+data/db.json.
+
+    uv run python benchmarks/validation.py --size 10000
+"""
+
+import argparse
+import gc
+import json
+import random
+import time
+from datetime import timedelta
+from pathlib import Path
+
+from nlg_data.models import (
+    Experiment,
+    construct_experiments,
+    dump_experiments,
+    validate_experiments,
+    validate_experiments_json,
+)
+
+
+def synthetic_docs(db_file: Path, size: int, seed: int = 0) -> list[dict]:
+    rng = random.Random(seed)
+    templates = list(json.loads(db_file.read_text("utf-8"))["experiments"].values())
+    docs = []
+    for i in range(size):
+        doc = json.loads(json.dumps(rng.choice(templates)))
+        experiment = Experiment(**doc)
+        experiment.date += timedelta(minutes=i)
+        experiment.win_rate.value = rng.uniform(0.8, 1.0)
+        experiment.attributes["job_id"] = f"synthetic-{i}"
+        docs.append(experiment.model_dump(mode="json"))
+
+    return docs
+
+
+def timed(label: str, fn, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+
+    print(f"{label:<40} {best * 1e3:9.1f} ms")
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--size", type=int, default=10_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--db", type=Path, default=Path("data/db.json"))
+    args = parser.parse_args()
+
+    docs = synthetic_docs(args.db, args.size)
+    data = json.dumps(docs)
+    experiments = validate_experiments(docs)
+    print(f"{args.size} synthetic experiments\n")
+
+    per_doc = timed(
+        "validate: Experiment(**doc) per document",
+        lambda: [Experiment(**doc) for doc in docs],
+        args.repeat,
+    )
+    bulk = timed(
+        "validate: TypeAdapter(list[Experiment])",
+        lambda: validate_experiments(docs),
+        args.repeat,
+    )
+    timed("validate: from json", lambda: validate_experiments_json(data), args.repeat)
+    unchecked = timed(
+        "construct: unchecked, trusted data",
+        lambda: construct_experiments(docs),
+        args.repeat,
+    )
+    print()
+    dump_per_doc = timed(
+        "dump: model_dump(mode='json') per model",
+        lambda: [e.model_dump(mode="json") for e in experiments],
+        args.repeat,
+    )
+    dump_bulk = timed(
+        "dump: TypeAdapter", lambda: dump_experiments(experiments), args.repeat
+    )
+
+    print()
+    print(f"bulk validation speedup:      {per_doc / bulk:.2f}x")
+    print(f"unchecked speedup:            {per_doc / unchecked:.2f}x")
+    print(f"bulk dump speedup:            {dump_per_doc / dump_bulk:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,209 @@
+"""Plans how many shots to give each circuit of an experiment.
+
+Experiments give every circuit the same shots, but circuits with a win rate
+near 0 or 1 barely vary while the others are much noisier. The variance term
+of the `calculate_ci` bound is the variance of the mean win rate,
+sum_i sigma2_i / n_i / m^2, where sigma2_i = wr_i * (1 - wr_i). For a fixed
+total of shots it is smallest when n_i is proportional to sigma_i (Neyman
+allocation). The other term, 2 log(2/d) / (3 n), grows when a circuit gets
+few shots, so the planner also picks a minimum number of shots per circuit.
+
+The variances come from earlier experiments on the same device:
+
+    store = CountsStore.load(data_folder)
+    queries = store.experiment(new_doc_id).queries
+    _, sigma2 = historical_sigma2(store, earlier_doc_ids, queries)
+    shots = plan_allocation(sigma2, budget=88 * 2048)
+    simulate_allocation(store, new_doc_id, shots)
+
+The queries of the counts store are those of a graph coloring game, so a
+vertex question (va == vb) is won by answering the same color and an edge
+question by answering different ones.
+"""
+
+from typing import Iterable
+
+import numpy as np
+
+from .counts_store import CountsStore
+
+_bisection_steps = 100
+
+
+def allocation_ci(sigma2, shots, d: float = 0.05) -> np.ndarray:
+    """calculate_ci for circuits that each get their own number of shots.
+
+    Reduces to calculate_ci when all circuits get the same shots. Works on
+    the last axis, so many allocations can be compared at once.
+    """
+    sigma2 = np.asarray(sigma2, dtype=np.float64)
+    shots = np.asarray(shots, dtype=np.float64)
+    m = sigma2.shape[-1]
+    log_term = 2 * np.log(2 / d)
+    term1 = log_term / (3 * shots.min(axis=-1))
+    variance = (sigma2 / shots).sum(axis=-1) / m**2
+    return term1 + np.sqrt(log_term * variance)
+
+
+def neyman_allocation(sigma2, budget: int, min_shots: int = 1) -> np.ndarray:
+    """Shots proportional to sigma of each circuit, but at least min_shots.
+
+    The shots are rounded so they add up to the budget exactly.
+    """
+    sigma = np.sqrt(np.clip(np.asarray(sigma2, dtype=np.float64), 0, None))
+    m = len(sigma)
+    if budget < m * min_shots:
+        raise ValueError(f"A budget of {budget} can't give {m} circuits {min_shots}")
+
+    if sigma.sum() == 0:
+        return _round_to_budget(np.full(m, budget / m), budget)
+
+    # Find the scale c with sum(max(min_shots, c * sigma)) == budget
+    lo, hi = 0.0, budget / sigma.sum()
+    for _ in range(_bisection_steps):
+        c = (lo + hi) / 2
+        if np.maximum(min_shots, c * sigma).sum() > budget:
+            hi = c
+        else:
+            lo = c
+
+    return _round_to_budget(np.maximum(min_shots, lo * sigma), budget)
+
+
+def plan_allocation(
+    sigma2, budget: int, d: float = 0.05, min_shots: int | None = None
+) -> np.ndarray:
+    """Allocation of the budget with the narrowest confidence interval.
+
+    Args:
+        min_shots: Minimum shots per circuit. By default, the one giving the
+            narrowest interval is chosen. With 1, this is plain Neyman
+            allocation, which minimizes the variance of the mean instead.
+    """
+    m = len(sigma2)
+    if min_shots is not None:
+        return neyman_allocation(sigma2, budget, min_shots)
+
+    floors = np.unique(np.geomspace(1, budget // m, 64).astype(int))
+    candidates = np.array([neyman_allocation(sigma2, budget, f) for f in floors])
+    return candidates[allocation_ci(sigma2, candidates, d).argmin()]
+
+
+def budget_for_ci(sigma2, target: float, d: float = 0.05) -> tuple[int, np.ndarray]:
+    """Smallest total shots, and their allocation, for a CI of at most target"""
+    m = len(sigma2)
+
+    def width(budget):
+        return allocation_ci(sigma2, plan_allocation(sigma2, budget, d), d)
+
+    lo, hi = m, m
+    while width(hi) > target:
+        lo, hi = hi, hi * 2
+        if hi > 10**12:
+            raise ValueError(f"A CI of {target} needs an unreasonable budget")
+
+    while hi - lo > max(1, lo // 1000):
+        mid = (lo + hi) // 2
+        if width(mid) > target:
+            lo = mid
+        else:
+            hi = mid
+
+    return hi, plan_allocation(sigma2, hi, d)
+
+
+def coloring_wins(queries: np.ndarray, answers: np.ndarray) -> np.ndarray:
+    """Whether answers win a graph coloring game, for (n, 2) queries and answers"""
+    vertex = queries[..., 0] == queries[..., 1]
+    same = answers[..., 0] == answers[..., 1]
+    return np.where(vertex, same, ~same)
+
+
+def circuit_win_rates(store: CountsStore, doc_id: int) -> tuple[np.ndarray, np.ndarray]:
+    """Queries and win rates of an experiment, computed from its counts"""
+    counts = store.experiment(doc_id)
+    wins = coloring_wins(counts.queries[:, None, :], store.outcomes[None, :, :])
+    shots = counts.counts.sum(axis=1)
+    win_rates = (counts.counts * wins).sum(axis=1) / np.maximum(shots, 1)
+    return np.asarray(counts.queries), win_rates
+
+
+def historical_sigma2(
+    store: CountsStore, doc_ids: Iterable[int], queries: np.ndarray | None = None
+) -> tuple[np.ndarray, np.ndarray]:
+    """Mean wr * (1 - wr) of every query over the given experiments.
+
+    Args:
+        queries: Queries to return the sigma2 of, e.g. the circuits of the
+            next experiment. Queries that weren't asked before get the mean.
+
+    Returns:
+        The queries as a (queries, 2) array, by default the distinct ones that
+        were asked, and their sigma2.
+    """
+    wanted = queries
+    queries, sigma2 = [], []
+    for doc_id in doc_ids:
+        q, wr = circuit_win_rates(store, doc_id)
+        queries.append(q)
+        sigma2.append(wr * (1 - wr))
+
+    queries, inverse = np.unique(np.concatenate(queries), axis=0, return_inverse=True)
+    inverse = inverse.ravel()
+    totals = np.bincount(inverse, weights=np.concatenate(sigma2))
+    sigma2 = totals / np.bincount(inverse)
+    if wanted is None:
+        return queries, sigma2
+
+    by_query = dict(zip(map(tuple, queries.tolist()), sigma2))
+    default = sigma2.mean()
+    wanted = np.asarray(wanted)
+    return wanted, np.array(
+        [by_query.get(q, default) for q in map(tuple, wanted.tolist())]
+    )
+
+
+def simulate_allocation(
+    store: CountsStore,
+    doc_id: int,
+    shots,
+    repetitions: int = 2000,
+    seed: int | None = None,
+) -> dict[str, float]:
+    """Compares an allocation with equal shots by resampling an experiment.
+
+    Each circuit is resampled from the win rate of its stored counts, once
+    with the planned shots and once with the same total split equally. The
+    spread of the mean win rate over the repetitions shows the gain.
+
+    Args:
+        shots: Planned shots, in the order of the experiment's circuits.
+    """
+    rng = np.random.default_rng(seed)
+    _, win_rates = circuit_win_rates(store, doc_id)
+    shots = np.asarray(shots, dtype=np.int64)
+    equal = _round_to_budget(np.full(len(shots), shots.sum() / len(shots)), shots.sum())
+
+    def spread(n):
+        wins = rng.binomial(n, win_rates, size=(repetitions, len(n)))
+        return float((wins / n).mean(axis=1).std())
+
+    sigma2 = win_rates * (1 - win_rates)
+    std_equal, std_planned = spread(equal), spread(shots)
+    return {
+        "std_equal": std_equal,
+        "std_planned": std_planned,
+        "simulated_gain": std_equal / std_planned,
+        "ci_equal": float(allocation_ci(sigma2, equal)),
+        "ci_planned": float(allocation_ci(sigma2, shots)),
+    }
+
+
+def _round_to_budget(shots: np.ndarray, budget: int) -> np.ndarray:
+    # Largest remainder rounding, which keeps the total equal to the budget
+    rounded = np.floor(shots).astype(np.int64)
+    remainder = int(budget - rounded.sum())
+    if remainder > 0:
+        rounded[np.argsort(rounded - shots)[:remainder]] += 1
+
+    return rounded
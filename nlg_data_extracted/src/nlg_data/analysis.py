@@ -0,0 +1,123 @@
+"""Runs per-experiment analyses in parallel over the counts store.
+
+The packed arrays of the counts store are copied into shared memory once, and
+every worker process attaches to them when it starts. Tasks then only carry the
+doc id and the row range of an experiment, so no histogram data is pickled or
+copied into the workers.
+
+    from nlg_data.analysis import run_parallel
+
+    def vertex_win_rate(counts: ExperimentCounts) -> float:
+        vertex = counts.queries[:, 0] == counts.queries[:, 1]
+        return counts.win_rates[vertex].mean()
+
+    win_rates = run_parallel(vertex_win_rate, doc_ids, data_folder=Path("data"))
+
+The analysed function has to be picklable, i.e. defined at the top level of a
+module (or of the notebook when processes are forked).
+"""
+
+import multiprocessing
+from multiprocessing.shared_memory import SharedMemory
+from pathlib import Path
+from typing import Any, Callable, Iterable, TypeVar
+
+import numpy as np
+
+from .counts_store import CountsStore, ExperimentCounts
+
+T = TypeVar("T")
+
+_shared_arrays = ("counts", "queries", "win_rates")
+
+# Set in each worker process by _attach
+_worker_store: dict[str, Any] = {}
+
+
+def run_parallel(
+    fn: Callable[[ExperimentCounts], T],
+    experiments: Iterable[int],
+    store: CountsStore | None = None,
+    *,
+    data_folder: Path = Path("data"),
+    processes: int | None = None,
+    chunksize: int | None = None,
+    progress: Callable[[int, int], None] | None = None,
+) -> list[T]:
+    """Applies fn to the counts of each experiment using a process pool.
+
+    Args:
+        fn: Function of the counts of a single experiment.
+        experiments: Doc ids of the experiments, or documents with a doc_id.
+        store: Counts store to use, otherwise it is loaded from data_folder.
+        processes: Number of worker processes, defaults to the number of CPUs.
+        chunksize: Number of experiments sent to a worker at once. Defaults to
+            splitting the work into about four chunks per process.
+        progress: Called with (completed, total) after every chunk.
+
+    Returns:
+        The results in the same order as experiments.
+    """
+    store = store or CountsStore.load(data_folder)
+    doc_ids = [int(getattr(e, "doc_id", e)) for e in experiments]
+    tasks = []
+    for doc_id in doc_ids:
+        i = store.index_of(doc_id)
+        tasks.append((doc_id, int(store.offsets[i]), int(store.offsets[i + 1])))
+
+    processes = processes or multiprocessing.cpu_count()
+    if chunksize is None:
+        chunksize = max(1, len(tasks) // (4 * processes))
+    chunks = [tasks[i : i + chunksize] for i in range(0, len(tasks), chunksize)]
+
+    blocks: list[SharedMemory] = []
+    try:
+        specs = {}
+        for name in _shared_arrays:
+            array = np.asarray(getattr(store, name))
+            block = SharedMemory(create=True, size=max(array.nbytes, 1))
+            blocks.append(block)
+            np.ndarray(array.shape, array.dtype, buffer=block.buf)[:] = array
+            specs[name] = (block.name, array.shape, array.dtype.str)
+
+        results: list[T] = []
+        with multiprocessing.Pool(
+            processes, initializer=_attach, initargs=(specs, store.answers, fn)
+        ) as pool:
+            # imap keeps the chunks in order, regardless of which finishes first
+            for chunk_results in pool.imap(_run_chunk, chunks):
+                results.extend(chunk_results)
+                if progress is not None:
+                    progress(len(results), len(tasks))
+
+        return results
+    finally:
+        for block in blocks:
+            block.close()
+            block.unlink()
+
+
+def _attach(specs: dict[str, tuple[str, tuple, str]], answers: int, fn: Callable):
+    for name, (block_name, shape, dtype) in specs.items():
+        block = SharedMemory(name=block_name)
+        _worker_store[f"_{name}_block"] = block
+        _worker_store[name] = np.ndarray(shape, np.dtype(dtype), buffer=block.buf)
+
+    _worker_store["answers"] = answers
+    _worker_store["fn"] = fn
+
+
+def _run_chunk(chunk: list[tuple[int, int, int]]) -> list:
+    fn = _worker_store["fn"]
+    results = []
+    for doc_id, start, stop in chunk:
+        counts = ExperimentCounts(
+            doc_id=doc_id,
+            queries=_worker_store["queries"][start:stop],
+            counts=_worker_store["counts"][start:stop],
+            win_rates=_worker_store["win_rates"][start:stop],
+            answers=_worker_store["answers"],
+        )
+        results.append(fn(counts))
+
+    return results
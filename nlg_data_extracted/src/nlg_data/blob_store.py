@@ -0,0 +1,281 @@
+"""Content-addressed store for the files that experiments reference.
+
+Raw data archives, result files and circuit folders are stored under the
+SHA-256 of their content in ``data/blobs``, so an artifact that many
+experiments point at is kept once:
+
+    objects/ab/cdef...   content of each blob, read-only
+    index.json           size, mtime and references of each blob, and the
+                         digest of every source file already hashed
+    snapshots/NAME.json  digests pinned by a snapshot
+
+A folder is stored as a tree: a JSON manifest of its files' digests, stored
+as a blob itself. Its digest changes if any file does.
+
+    blobs = BlobStore.open(data_folder)
+    digest = blobs.put(data_folder / "raw_data/ibm_2024/<id>/raw.zip")
+    blobs.add_ref(digest)
+    blobs.verify(digest)  # stat check, deep=True rehashes
+    blobs.snapshot("before-reingest")
+    blobs.save()
+
+Looking up a blob, checking that it exists and the stat check of `verify`
+are O(1). A source file is only hashed again when its size or mtime change.
+Raw data is hardlinked into the store when it's on the same file system
+(put with link=True), and checkouts and snapshots hardlink or only record
+digests, so no raw data is copied. A linked source shares its inode with the
+blob, so it's made read-only as well, and `read` checks the digest of what it
+returns in case the source was written in place anyway.
+"""
+
+import hashlib
+import json
+import os
+import shutil
+from dataclasses import dataclass, field
+from pathlib import Path
+
+store_folder = Path("blobs")
+"""Location of the store relative to the data folder"""
+
+
+@dataclass
+class BlobStore:
+    root: Path
+
+    blobs: dict[str, dict] = field(default_factory=dict)
+    """Size, mtime_ns, refs and whether it's a tree, for every digest"""
+
+    sources: dict[str, dict] = field(default_factory=dict)
+    """Size, mtime_ns and digest of every file put in the store, by path"""
+
+    @classmethod
+    def open(cls, data_folder: Path) -> "BlobStore":
+        root = data_folder / store_folder
+        try:
+            index = json.loads((root / "index.json").read_text("utf-8"))
+        except FileNotFoundError:
+            index = {"blobs": {}, "sources": {}}
+
+        return cls(root, index["blobs"], index["sources"])
+
+    def save(self):
+        self.root.mkdir(parents=True, exist_ok=True)
+        index = {"blobs": self.blobs, "sources": self.sources}
+        tmp_file = self.root / "index.json.tmp"
+        tmp_file.write_text(json.dumps(index, indent=1, sort_keys=True), "utf-8")
+        tmp_file.replace(self.root / "index.json")
+
+    def __contains__(self, digest: str) -> bool:
+        return digest in self.blobs
+
+    def path(self, digest: str) -> Path:
+        return self.root / "objects" / digest[:2] / digest[2:]
+
+    def put(self, path: Path, link: bool = False) -> str:
+        """Stores a file or a folder, returning its digest.
+
+        Args:
+            link: Hardlink the files instead of copying them. Only use this
+                for files that are never modified in place, like raw data.
+        """
+        path = Path(path)
+        if path.is_dir():
+            return self.put_tree(path, link)
+
+        return self.put_file(path, link)
+
+    def put_file(self, path: Path, link: bool = False) -> str:
+        stat = path.stat()
+        key = str(path.resolve())
+        source = self.sources.get(key)
+        if (
+            source is not None
+            and source["size"] == stat.st_size
+            and source["mtime_ns"] == stat.st_mtime_ns
+            and source["digest"] in self.blobs
+        ):
+            return source["digest"]
+
+        with path.open("rb") as f:
+            digest = hashlib.file_digest(f, "sha256").hexdigest()
+
+        if digest not in self.blobs:
+            self._write(digest, path, link=link)
+
+        self.sources[key] = {
+            "size": stat.st_size,
+            "mtime_ns": stat.st_mtime_ns,
+            "digest": digest,
+        }
+        return digest
+
+    def put_tree(self, folder: Path, link: bool = False) -> str:
+        manifest = {
+            file.relative_to(folder).as_posix(): self.put_file(file, link)
+            for file in sorted(folder.rglob("*"))
+            if file.is_file()
+        }
+        return self.put_manifest(manifest)
+
+    def put_manifest(self, manifest: dict[str, str]) -> str:
+        """Stores a tree of blobs already in the store, returning its digest"""
+        data = json.dumps(manifest, sort_keys=True, separators=(",", ":")).encode()
+        digest = hashlib.sha256(data).hexdigest()
+        if digest in self.blobs:
+            return digest
+
+        self.put_bytes(data, tree=True)
+
+        # The files of a tree are kept as long as the tree is
+        for file_digest in manifest.values():
+            self.add_ref(file_digest)
+
+        return digest
+
+    def put_bytes(self, data: bytes, tree: bool = False) -> str:
+        digest = hashlib.sha256(data).hexdigest()
+        if digest in self.blobs:
+            return digest
+
+        tmp_file = self.root / f"{digest}.tmp"
+        tmp_file.parent.mkdir(parents=True, exist_ok=True)
+        tmp_file.write_bytes(data)
+        self._write(digest, tmp_file, tree=tree)
+        tmp_file.unlink(missing_ok=True)
+        return digest
+
+    def read(self, digest: str) -> bytes:
+        """Content of a blob. Raises ValueError if it doesn't match its digest"""
+        data = self.path(digest).read_bytes()
+        if hashlib.sha256(data).hexdigest() != digest:
+            raise ValueError(f"Blob {digest} is corrupted")
+        return data
+
+    def add_ref(self, digest: str):
+        self.blobs[digest]["refs"] += 1
+
+    def release(self, digest: str):
+        """Drops a reference. Blobs without any are removed by gc"""
+        if digest in self.blobs:
+            self.blobs[digest]["refs"] = max(0, self.blobs[digest]["refs"] - 1)
+
+    def verify(self, digest: str, deep: bool = False) -> bool:
+        """Whether a blob is intact.
+
+        By default compares the size and mtime of the file with the index,
+        in O(1). With deep, the content is hashed again.
+        """
+        blob = self.blobs.get(digest)
+        if blob is None:
+            return False
+
+        try:
+            stat = self.path(digest).stat()
+        except FileNotFoundError:
+            return False
+
+        if stat.st_size != blob["size"] or stat.st_mtime_ns != blob["mtime_ns"]:
+            return False
+        if not deep:
+            return True
+
+        with self.path(digest).open("rb") as f:
+            return hashlib.file_digest(f, "sha256").hexdigest() == digest
+
+    def manifest(self, digest: str) -> dict[str, str]:
+        """Files of a tree and their digests"""
+        if not self.blobs[digest]["tree"]:
+            raise ValueError(f"Blob {digest} is a file, not a tree")
+
+        return json.loads(self.read(digest))
+
+    def checkout(self, digest: str, destination: Path):
+        """Recreates a file or tree at destination, hardlinking the blobs"""
+        if not self.blobs[digest]["tree"]:
+            if not _link(self.path(digest), destination):
+                _copy(self.path(digest), destination)
+            return
+
+        for name, file_digest in self.manifest(digest).items():
+            self.checkout(file_digest, destination / name)
+
+    def snapshot(self, name: str):
+        """Pins every blob stored now, so gc keeps them.
+
+        Only the digests are written, so this is cheap whatever the size of
+        the data. Blobs are immutable, so the snapshot can be checked out
+        later as long as it isn't dropped.
+        """
+        folder = self.root / "snapshots"
+        folder.mkdir(parents=True, exist_ok=True)
+        (folder / f"{name}.json").write_text(json.dumps(sorted(self.blobs)), "utf-8")
+
+    def snapshots(self) -> dict[str, list[str]]:
+        folder = self.root / "snapshots"
+        return {
+            file.stem: json.loads(file.read_text("utf-8"))
+            for file in sorted(folder.glob("*.json"))
+        }
+
+    def drop_snapshot(self, name: str):
+        (self.root / "snapshots" / f"{name}.json").unlink(missing_ok=True)
+
+    def gc(self) -> list[str]:
+        """Removes blobs without references that no snapshot pins"""
+        pinned = {d for digests in self.snapshots().values() for d in digests}
+        removed = []
+        for digest, blob in list(self.blobs.items()):
+            if blob["refs"] > 0 or digest in pinned:
+                continue
+
+            if blob["tree"]:
+                for file_digest in self.manifest(digest).values():
+                    self.release(file_digest)
+
+            self.path(digest).unlink(missing_ok=True)
+            del self.blobs[digest]
+            removed.append(digest)
+
+        # Releasing the files of removed trees can free more blobs
+        if removed:
+            removed += self.gc()
+
+        self.sources = {
+            k: v for k, v in self.sources.items() if v["digest"] in self.blobs
+        }
+        return removed
+
+    def _write(self, digest: str, source: Path, tree=False, link=False):
+        target = self.path(digest)
+        tmp_file = target.with_name(target.name + ".tmp")
+        tmp_file.unlink(missing_ok=True)
+        if not (link and _link(source, tmp_file)):
+            _copy(source, tmp_file)
+        # A linked blob is the source file, so this makes the source read-only
+        # too, and writing to it in place fails instead of changing the blob
+        tmp_file.chmod(0o444)
+        tmp_file.replace(target)
+
+        stat = target.stat()
+        self.blobs[digest] = {
+            "size": stat.st_size,
+            "mtime_ns": stat.st_mtime_ns,
+            "refs": 0,
+            "tree": tree,
+        }
+
+
+def _link(source: Path, target: Path) -> bool:
+    target.parent.mkdir(parents=True, exist_ok=True)
+    try:
+        os.link(source, target)
+        return True
+    except OSError:
+        # Other file system, or links aren't supported
+        return False
+
+
+def _copy(source: Path, target: Path):
+    target.parent.mkdir(parents=True, exist_ok=True)
+    shutil.copy2(source, target)
@@ -0,0 +1,175 @@
+"""Gate and depth statistics of the QASM circuits of a strategy.
+
+Every circuit in a folder is parsed once, and its metrics are cached in
+``data/qasm_metrics.json`` under the SHA-256 of the file, so a circuit shared
+by many experiments, or unchanged since the last ingest, is never parsed
+again:
+
+    cache = MetricsCache.load(data_folder)
+    cache.circuits(data_folder / "games/g14/circuits/4q")  # metrics by file name
+    cache.folder(data_folder / "games/g14/circuits/4q").max_depth
+    cache.save()
+
+The metrics match the ``quantumSpecific`` block of the submissions, but only
+count the qubits a circuit uses, since transpiled circuits are defined on the
+whole device. Barriers don't add to the depth, but like in Qiskit, they
+synchronize the qubits they span.
+"""
+
+import hashlib
+import json
+import logging
+from collections import Counter
+from dataclasses import dataclass, field
+from pathlib import Path
+
+import numpy as np
+
+from .models import CircuitMetrics
+from .qasm import Circuit, parse_qasm
+
+logger = logging.getLogger(__name__)
+
+cache_file = Path("qasm_metrics.json")
+"""Location of the cache relative to the data folder"""
+
+_version = 1
+"""Bumped when the metrics change, which invalidates the cache"""
+
+_suffixes = (".qasm", ".txt")
+"""Extensions of circuit files. The Duke circuits are OpenQASM saved as
+``line N (a, b).txt``"""
+
+
+def circuit_metrics(circuit: Circuit) -> dict:
+    """Gate counts and depths of a single circuit"""
+    gate_counts = Counter()
+    arity = Counter()
+    depth: dict[str, int] = {}
+    two_qubit_depth: dict[str, int] = {}
+    for i in circuit.instructions:
+        wires = [f"q{q}" for q in i.qubits] + [f"c{c}" for c in i.clbits]
+        level = max((depth.get(w, 0) for w in wires), default=0)
+        level2 = max((two_qubit_depth.get(w, 0) for w in wires), default=0)
+        if i.name != "barrier":
+            level += 1
+        if i.name not in ("measure", "barrier", "reset"):
+            gate_counts[i.name] += 1
+            arity[min(len(i.qubits), 3)] += 1
+            level2 += len(i.qubits) >= 2
+
+        for w in wires:
+            depth[w] = level
+            two_qubit_depth[w] = level2
+
+    # Barriers of transpiled circuits often span the whole device
+    qubits = {q for i in circuit.instructions if i.name != "barrier" for q in i.qubits}
+    return {
+        "qubits": len(qubits),
+        "gates": sum(gate_counts.values()),
+        "single_qubit_gates": arity[1],
+        "two_qubit_gates": arity[2],
+        "multi_qubit_gates": arity[3],
+        "measurements": len(circuit.measurements),
+        "depth": max(depth.values(), default=0),
+        "two_qubit_depth": max(two_qubit_depth.values(), default=0),
+        "gate_counts": dict(sorted(gate_counts.items())),
+    }
+
+
+def aggregate_metrics(circuits: list[dict]) -> CircuitMetrics | None:
+    """Statistics over the circuits of a strategy, None without any circuit"""
+    if not circuits:
+        return None
+
+    def column(name: str) -> np.ndarray:
+        return np.array([c[name] for c in circuits])
+
+    gate_counts = Counter()
+    for c in circuits:
+        gate_counts.update(c["gate_counts"])
+
+    return CircuitMetrics(
+        num_circuits=len(circuits),
+        qubits=int(column("qubits").max()),
+        gates=float(column("gates").mean()),
+        max_gates=int(column("gates").max()),
+        single_qubit_gates=float(column("single_qubit_gates").mean()),
+        two_qubit_gates=float(column("two_qubit_gates").mean()),
+        max_two_qubit_gates=int(column("two_qubit_gates").max()),
+        depth=float(column("depth").mean()),
+        max_depth=int(column("depth").max()),
+        two_qubit_depth=float(column("two_qubit_depth").mean()),
+        gate_counts=dict(sorted(gate_counts.items())),
+    )
+
+
+@dataclass
+class MetricsCache:
+    file: Path
+
+    circuits_by_digest: dict[str, dict | None] = field(default_factory=dict)
+    """Metrics of every circuit parsed so far, by SHA-256 of its file. None if
+    it couldn't be parsed, so it isn't tried again"""
+
+    _folders: dict[Path, dict[str, dict]] = field(
+        default_factory=dict, init=False, repr=False
+    )
+    """Metrics of the folders read in this session, which ingest reads for
+    every experiment of a strategy"""
+
+    @classmethod
+    def load(cls, data_folder: Path) -> "MetricsCache":
+        file = data_folder / cache_file
+        try:
+            cache = json.loads(file.read_text("utf-8"))
+        except FileNotFoundError:
+            return cls(file)
+
+        if cache.get("version") != _version:
+            return cls(file)
+
+        return cls(file, cache["circuits"])
+
+    def save(self):
+        cache = {"version": _version, "circuits": self.circuits_by_digest}
+        tmp_file = self.file.with_suffix(".tmp")
+        tmp_file.write_text(json.dumps(cache, sort_keys=True), "utf-8")
+        tmp_file.replace(self.file)
+
+    def circuits(self, folder: Path) -> dict[str, dict]:
+        """Metrics of each QASM file in a folder, by file name.
+
+        Both ``.qasm`` and ``.txt`` files are read. Files that can't be parsed
+        are logged and left out, and so are folders without any circuit.
+        """
+        folder = Path(folder).resolve()
+        if folder in self._folders:
+            return self._folders[folder]
+
+        metrics = {}
+        files = sorted(f for f in folder.glob("*") if f.suffix in _suffixes)
+        for file in files:
+            data = file.read_bytes()
+            digest = hashlib.sha256(data).hexdigest()
+            if digest not in self.circuits_by_digest:
+                try:
+                    circuit = parse_qasm(data.decode("utf-8"))
+                    self.circuits_by_digest[digest] = circuit_metrics(circuit)
+                except ValueError as e:
+                    logger.warning("Skipping circuit %s: %s", file, e)
+                    self.circuits_by_digest[digest] = None
+
+            if self.circuits_by_digest[digest] is not None:
+                metrics[file.name] = self.circuits_by_digest[digest]
+
+        if not metrics:
+            logger.warning(
+                "No circuits in %s out of %d candidate files", folder, len(files)
+            )
+        self._folders[folder] = metrics
+        return metrics
+
+    def folder(self, folder: Path) -> CircuitMetrics | None:
+        """Aggregate metrics of the circuits in a folder"""
+        return aggregate_metrics(list(self.circuits(folder).values()))
@@ -0,0 +1,383 @@
+"""Exact classical value of graph coloring games.
+
+In the coloring game of a graph, the referee asks each player a vertex, either
+the same vertex (won when both answer the same color) or the two ends of an
+edge in either order (won when they answer different colors). With the
+questions drawn uniformly, G14 has 14 + 2 * 37 = 88 of them.
+
+A classical strategy is a coloring for each player. For a fixed coloring a of
+Alice, Bob's best answer at v only depends on the colors Alice gives to v and
+its neighbors. Answering a(v) loses the edges to neighbors that share a(v),
+and answering any other color c loses the vertex question and the edges to
+neighbors colored c, so Bob loses
+
+    loss(v) = min(same(v), 1 + min_c count_c(v))
+
+questions at v, where count_c(v) counts the neighbors of v that Alice colors
+c. The classical value is 1 - min_a sum_v loss(v) / questions, a search over
+Alice's colorings only.
+
+The search assigns colors vertex by vertex, keeping each color class as a
+bitset of vertices so counts are popcounts:
+
+* Colors are interchangeable, so a vertex can only take a color already used
+  or the first unused one.
+* Branches are pruned with a lower bound from the counts assigned so far,
+  starting from the cost of a coloring found by local search.
+* The cost still to come only depends on the colors and counts of the
+  assigned vertices that have unassigned neighbors, so it is memoized on
+  that state, up to a relabeling of the colors.
+
+    graph = load_graph(game, data_folder)
+    solution = solve_coloring_game(graph, colors=4)
+    solution.value  # 86 / 88 for G14
+
+The ILP backend solves the same problem with cvxpy, which is useful to check
+the search or for graphs where it is too slow.
+"""
+
+import random
+from dataclasses import dataclass
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+import networkx as nx
+
+if TYPE_CHECKING:
+    from .models import NonlocalGame
+
+
+@dataclass(frozen=True)
+class ClassicalSolution:
+    losses: int
+    """Questions lost by the best strategy"""
+
+    questions: int
+
+    alice: dict
+    """Color Alice answers for each vertex"""
+
+    bob: dict
+    """Color Bob answers for each vertex"""
+
+    @property
+    def value(self) -> float:
+        return 1 - self.losses / self.questions
+
+
+def load_graph(game: "NonlocalGame", data_folder: Path) -> nx.Graph:
+    """Reads the graph stored with a game, as in games/g14/g14.nx"""
+    for obj in game.objects:
+        if obj.name == "graph":
+            return nx.read_edgelist(data_folder / obj.path, nodetype=int)
+
+    raise ValueError(f"Game {game.name} has no graph object")
+
+
+def optimal_classical_value(
+    game: "NonlocalGame", data_folder: Path, colors: int = 4, backend="search"
+) -> float:
+    """Classical value of a graph coloring game, read from its graph object"""
+    graph = load_graph(game, data_folder)
+    return solve_coloring_game(graph, colors, backend=backend).value
+
+
+def solve_coloring_game(
+    graph: nx.Graph, colors: int = 4, backend="search", **kwargs
+) -> ClassicalSolution:
+    """Finds an optimal classical strategy for the coloring game of a graph.
+
+    Args:
+        colors: Number of colors, i.e. answers, of each player.
+        backend: "search" for the branch and bound, or "ilp" for cvxpy.
+        **kwargs: Passed to the backend, e.g. solver for the ILP.
+    """
+    if backend == "search":
+        return _ColoringSearch(graph, colors, **kwargs).solve()
+    if backend == "ilp":
+        return _solve_ilp(graph, colors, **kwargs)
+
+    raise ValueError(f"Unknown backend {backend!r}, expected 'search' or 'ilp'")
+
+
+def strategy_losses(graph: nx.Graph, alice: dict, colors: int) -> int:
+    """Questions lost by Alice's coloring against Bob's best response"""
+    losses = 0
+    for v in graph:
+        count = [0] * colors
+        for u in graph[v]:
+            count[alice[u]] += 1
+
+        losses += min(count[alice[v]], 1 + min(count))
+
+    return losses
+
+
+def best_response(graph: nx.Graph, alice: dict, colors: int) -> dict:
+    """Bob's coloring that loses the fewest questions against Alice's"""
+    bob = {}
+    for v in graph:
+        count = [0] * colors
+        for u in graph[v]:
+            count[alice[u]] += 1
+
+        other = min(range(colors), key=count.__getitem__)
+        bob[v] = alice[v] if count[alice[v]] <= 1 + count[other] else other
+
+    return bob
+
+
+class _ColoringSearch:
+    def __init__(self, graph: nx.Graph, colors: int, seed: int = 0, restarts=20):
+        self.graph = graph
+        self.colors = colors
+        self.seed = seed
+        self.restarts = restarts
+
+        # Vertices are assigned in an order that closes them early: each next
+        # vertex has the most neighbors among those already assigned
+        self.order = _closing_order(graph)
+        index = {v: i for i, v in enumerate(self.order)}
+        n = len(self.order)
+        self.neighbors = [0] * n
+        for v, i in index.items():
+            for u in graph[v]:
+                self.neighbors[i] |= 1 << index[u]
+
+        # Vertex v is closed, i.e. its loss is known, once it and all of its
+        # neighbors are assigned
+        self.closes_at = [[] for _ in range(n)]
+        for i in range(n):
+            self.closes_at[max(_bits(self.neighbors[i] | 1 << i))].append(i)
+
+        self.open_after = []
+        for i in range(n):
+            assigned = (1 << (i + 1)) - 1
+            self.open_after.append(
+                [v for v in range(i + 1) if self.neighbors[v] & ~assigned]
+            )
+
+        self.color = [-1] * n
+        self.classes = [0] * colors
+        self.memo: dict[tuple, tuple[int, bool]] = {}
+
+    def solve(self) -> ClassicalSolution:
+        n = len(self.order)
+        questions = n + 2 * self.graph.number_of_edges()
+        if n == 0:
+            return ClassicalSolution(0, questions, {}, {})
+
+        upper = self._local_search()
+        losses = self._search(0, 0, upper + 1)
+        alice = self._reconstruct(losses)
+        return ClassicalSolution(
+            losses=losses,
+            questions=questions,
+            alice=alice,
+            bob=best_response(self.graph, alice, self.colors),
+        )
+
+    def _count(self, v: int, c: int) -> int:
+        return (self.neighbors[v] & self.classes[c]).bit_count()
+
+    def _loss(self, v: int) -> int:
+        counts = [self._count(v, c) for c in range(self.colors)]
+        return min(counts[self.color[v]], 1 + min(counts))
+
+    def _lower_bound(self, i: int) -> int:
+        # Counts only grow as more vertices are assigned, so the losses with
+        # the current counts bound the losses of the open vertices
+        bound = 0
+        for v in self.open_after[i - 1] if i else ():
+            bound += self._loss(v)
+
+        for v in range(i, len(self.order)):
+            bound += min(self._count(v, c) for c in range(self.colors))
+
+        return bound
+
+    def _key(self, i: int) -> tuple:
+        # The step, and the colors of the open vertices and their counts up to
+        # relabeling the colors
+        open_vertices = self.open_after[i - 1]
+        counts = [
+            [self._count(v, c) for v in open_vertices] for c in range(self.colors)
+        ]
+        first = {}
+        for v in open_vertices:
+            first.setdefault(self.color[v], len(first))
+
+        relabel = sorted(
+            range(self.colors), key=lambda c: (first.get(c, self.colors), counts[c])
+        )
+        new = {c: j for j, c in enumerate(relabel)}
+        return (
+            i,
+            tuple(new[self.color[v]] for v in open_vertices),
+            tuple(tuple(counts[c]) for c in relabel),
+        )
+
+    def _assign(self, i: int, c: int):
+        self.color[i] = c
+        self.classes[c] |= 1 << i
+
+    def _unassign(self, i: int):
+        self.classes[self.color[i]] &= ~(1 << i)
+        self.color[i] = -1
+
+    def _search(self, i: int, used: int, budget: int) -> int:
+        """Fewest losses of the vertices closed from step i on.
+
+        Returns the exact value if it is below budget, otherwise a lower bound
+        that is at least budget.
+        """
+        n = len(self.order)
+        if i == n:
+            return 0
+
+        key = self._key(i) if i else None
+        if key in self.memo:
+            value, exact = self.memo[key]
+            if exact or value >= budget:
+                return value
+
+        bound = self._lower_bound(i)
+        if bound >= budget:
+            if key is not None:
+                self.memo[key] = (bound, False)
+            return bound
+
+        best = None
+        for c in range(min(used + 1, self.colors)):
+            limit = budget if best is None else min(budget, best)
+            self._assign(i, c)
+            cost = sum(self._loss(v) for v in self.closes_at[i])
+            if cost < limit:
+                cost += self._search(i + 1, max(used, c + 1), limit - cost)
+            self._unassign(i)
+
+            best = cost if best is None else min(best, cost)
+
+        if key is not None:
+            self.memo[key] = (best, best < budget)
+        return best
+
+    def _reconstruct(self, losses: int) -> dict:
+        # Follow the colors whose cost plus best remainder matches the optimum
+        used = 0
+        for i in range(len(self.order)):
+            for c in range(min(used + 1, self.colors)):
+                self._assign(i, c)
+                cost = sum(self._loss(v) for v in self.closes_at[i])
+                if (
+                    cost <= losses
+                    and cost + self._search(i + 1, max(used, c + 1), losses - cost + 1)
+                    == losses
+                ):
+                    losses -= cost
+                    used = max(used, c + 1)
+                    break
+                self._unassign(i)
+
+        alice = {v: self.color[i] for i, v in enumerate(self.order)}
+        self.color = [-1] * len(self.order)
+        self.classes = [0] * self.colors
+        return alice
+
+    def _local_search(self) -> int:
+        """Losses of a good coloring, to start pruning with"""
+        rng = random.Random(self.seed)
+        vertices = list(self.graph)
+        best = None
+        for _ in range(self.restarts):
+            alice = {v: rng.randrange(self.colors) for v in vertices}
+            losses = strategy_losses(self.graph, alice, self.colors)
+            improved = True
+            while improved:
+                improved = False
+                for v in vertices:
+                    original = alice[v]
+                    for c in range(self.colors):
+                        alice[v] = c
+                        changed = strategy_losses(self.graph, alice, self.colors)
+                        if changed < losses:
+                            losses, original, improved = changed, c, True
+
+                    alice[v] = original
+
+            best = losses if best is None else min(best, losses)
+
+        return best
+
+
+def _closing_order(graph: nx.Graph) -> list:
+    order = []
+    remaining = set(graph)
+    connections = {v: 0 for v in graph}
+    while remaining:
+        v = max(remaining, key=lambda v: (connections[v], graph.degree[v]))
+        order.append(v)
+        remaining.remove(v)
+        for u in graph[v]:
+            connections[u] += 1
+
+    return order
+
+
+def _bits(mask: int):
+    i = 0
+    while mask:
+        if mask & 1:
+            yield i
+        mask >>= 1
+        i += 1
+
+
+def _solve_ilp(graph: nx.Graph, colors: int, solver=None) -> ClassicalSolution:
+    import cvxpy as cp
+    import numpy as np
+
+    vertices = list(graph)
+    index = {v: i for i, v in enumerate(vertices)}
+    n = len(vertices)
+    edges = [(index[u], index[v]) for u, v in graph.edges]
+    questions = n + 2 * len(edges)
+
+    # x[v, c] is 1 if Alice answers c at v, and y the same for Bob
+    x = cp.Variable((n, colors), boolean=True)
+    y = cp.Variable((n, colors), boolean=True)
+    vertex_wins = cp.Variable(n)
+    edge_wins = cp.Variable(2 * len(edges))
+
+    constraints = [
+        cp.sum(x, axis=1) == 1,
+        cp.sum(y, axis=1) == 1,
+        vertex_wins >= 0,
+        edge_wins >= 0,
+        # Symmetry breaking: Alice answers the first color at the first vertex
+        x[0, 0] == 1,
+    ]
+    for c in range(colors):
+        # Won only if both answer c or neither does
+        constraints.append(vertex_wins <= 1 - x[:, c] + y[:, c])
+        constraints.append(vertex_wins <= 1 + x[:, c] - y[:, c])
+        for k, (u, v) in enumerate(edges):
+            # Lost if both answer c, in either order
+            constraints.append(edge_wins[2 * k] <= 2 - x[u, c] - y[v, c])
+            constraints.append(edge_wins[2 * k + 1] <= 2 - x[v, c] - y[u, c])
+
+    problem = cp.Problem(
+        cp.Maximize(cp.sum(vertex_wins) + cp.sum(edge_wins)), constraints
+    )
+    problem.solve(solver=solver)
+    if problem.status not in (cp.OPTIMAL, cp.OPTIMAL_INACCURATE):
+        raise RuntimeError(f"ILP solver finished with status {problem.status}")
+
+    alice = dict(zip(vertices, np.argmax(x.value, axis=1).tolist()))
+    bob = dict(zip(vertices, np.argmax(y.value, axis=1).tolist()))
+    return ClassicalSolution(
+        losses=questions - round(problem.value),
+        questions=questions,
+        alice=alice,
+        bob=bob,
+    )
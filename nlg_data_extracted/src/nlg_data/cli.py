@@ -0,0 +1,465 @@
+"""Command line interface, installed as the `nlg-data` script.
+
+    nlg-data build
+    nlg-data ingest --adapter rigetti --since 2024-09-27 --jobs 8
+    nlg-data plan --undecided
+    nlg-data leaderboard best_device
+    nlg-data export-submissions --submissions ../submissions
+    nlg-data validate-submissions --timings 5
+    nlg-data snapshot --list
+    nlg-data diff v1 latest
+    nlg-data serve --port 8000
+
+Running `nlg-data` without a command rebuilds the whole database.
+"""
+
+import argparse
+import asyncio
+import logging
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+
+from . import (
+    create_database,
+    sequential,
+    server,
+    submission_checks,
+    submissions,
+    versions,
+)
+from .blob_store import BlobStore
+from .leaderboard import LeaderboardViews
+from .ingest import adapter_names
+from .ingest.adapter import SourceFilter, parse_until
+from .models import NonlocalGame, validate_experiments
+
+
+def _add_common_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument(
+        "--data-folder",
+        type=Path,
+        default=create_database.data_folder,
+        help="Folder containing db.json and raw_data (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--jobs",
+        "-j",
+        type=int,
+        default=None,
+        help="Number of worker threads used to parse sources",
+    )
+    parser.add_argument("--verbose", "-v", action="store_true")
+
+
+def _add_submissions_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument(
+        "--submissions",
+        type=Path,
+        default=Path("../submissions"),
+        help="Folder of the website's submissions (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--schema",
+        type=Path,
+        default=submission_checks.schema_file,
+        help="Benchmark JSON schema (default: %(default)s)",
+    )
+
+
+def build(args: argparse.Namespace) -> int:
+    """Rebuilds the database from every registered adapter"""
+    args.adapter = None
+    args.since = args.until = args.backend = args.strategy = None
+    args.memory = args.resume = False
+    return ingest(args)
+
+
+def ingest(args: argparse.Namespace) -> int:
+    """Runs the selected adapters and upserts their results into the database"""
+    source_filter = SourceFilter(
+        since=args.since,
+        until=args.until,
+        backends=frozenset(args.backend) if args.backend else None,
+        strategies=frozenset(args.strategy) if args.strategy else None,
+    )
+
+    async def run():
+        if args.jobs is not None:
+            loop = asyncio.get_running_loop()
+            loop.set_default_executor(ThreadPoolExecutor(max_workers=args.jobs))
+
+        db = create_database.open_db(args.data_folder / "db.json", buffered=True)
+        try:
+            create_database.make_games(db, args.data_folder)
+            failures = await create_database.ingest(
+                db,
+                args.data_folder,
+                args.adapter,
+                source_filter,
+                args.memory,
+                args.resume,
+            )
+
+            # Every ingest is a version, so rebuilds can be compared with diff
+            blobs = BlobStore.open(args.data_folder)
+            version = versions.snapshot(
+                db.table("experiments"), args.data_folder, blobs
+            )
+            blobs.save()
+            print(f"Stored version {version.name}")
+            return failures
+        finally:
+            db.close()
+
+    failures = asyncio.run(run())
+    for name, error in failures.items():
+        print(f"Adapter '{name}' failed: {error!r}", file=sys.stderr)
+
+    return 1 if failures else 0
+
+
+def plan(args: argparse.Namespace) -> int:
+    """Reports which experiments are decided and how many shots the rest need"""
+    db = create_database.open_db(args.data_folder / "db.json")
+    try:
+        experiments = validate_experiments(db.table("experiments").all())
+        games = [NonlocalGame.model_validate(g) for g in db.table("games").all()]
+    finally:
+        db.close()
+
+    report = sequential.planning_report(experiments, games, delta=args.delta)
+    if args.undecided:
+        report = report[report["decision"] == sequential.UNDECIDED]
+
+    if args.output is not None:
+        report.to_csv(args.output, index=False)
+    else:
+        print(report.drop(columns=["provider", "sigma2"]).to_string())
+
+    return 0
+
+
+def leaderboard(args: argparse.Namespace) -> int:
+    """Prints a leaderboard view, e.g. the best experiment of every device"""
+    if args.rebuild:
+        db = create_database.open_db(args.data_folder / "db.json")
+        try:
+            views = LeaderboardViews.rebuild(db.table("experiments"))
+        finally:
+            db.close()
+        views.save(args.data_folder)
+    else:
+        views = LeaderboardViews.load(args.data_folder)
+
+    for row in views.rows(args.view):
+        print(
+            f"{row['provider']:<10}{row['device']:<16}{row['strategy']:<12}"
+            f"{row['date'][:10]:<12}{row['win_rate']:.4f}"
+        )
+
+    return 0
+
+
+def snapshot(args: argparse.Namespace) -> int:
+    """Stores the experiments and their counts as a new version"""
+    if args.list:
+        for version in versions.Versions.load(args.data_folder).versions:
+            print(
+                f"{version.name:<12}{version.created[:19]:<21}"
+                f"{version.experiments:>6} experiments  {version.root[:12]}"
+            )
+        return 0
+
+    db = create_database.open_db(args.data_folder / "db.json")
+    try:
+        blobs = BlobStore.open(args.data_folder)
+        version = versions.snapshot(
+            db.table("experiments"), args.data_folder, blobs, args.name
+        )
+        blobs.save()
+    except ValueError as e:
+        print(e, file=sys.stderr)
+        return 1
+    finally:
+        db.close()
+
+    print(f"Stored version {version.name}")
+    return 0
+
+
+def diff(args: argparse.Namespace) -> int:
+    """Lists the experiments added, removed or changed between two versions"""
+    saved = versions.Versions.load(args.data_folder)
+    try:
+        old, new = saved.get(args.old), saved.get(args.new)
+    except KeyError as e:
+        print(e.args[0], file=sys.stderr)
+        return 1
+
+    changes = versions.diff(BlobStore.open(args.data_folder), old.root, new.root)
+    for change in changes:
+        symbol = {"added": "+", "removed": "-", "changed": "~"}[change.status]
+        doc = change.after or change.before
+        line = f"{symbol} {change.key}"
+        if change.status != "changed":
+            line += f"  win_rate {doc['win_rate']['value']:.4f}"
+        for name, delta in change.deltas().items():
+            line += f"  {name} {delta:+.4g}"
+        if change.counts_changed:
+            line += "  counts changed"
+            if change.max_circuit_delta is not None:
+                line += f" (max circuit {change.max_circuit_delta:.4f})"
+        print(line)
+
+    statuses = [change.status for change in changes]
+    print(
+        f"{statuses.count('added')} added, {statuses.count('removed')} removed, "
+        f"{statuses.count('changed')} changed between {old.name} and {new.name}"
+    )
+    return 0
+
+
+def export_submissions(args: argparse.Namespace) -> int:
+    """Writes the benchmark.json of every device whose best experiment changed"""
+    db = create_database.open_db(args.data_folder / "db.json")
+    try:
+        result = submissions.export_submissions(
+            db, args.data_folder, args.submissions, args.schema, args.force
+        )
+    except ValueError as e:
+        print(e, file=sys.stderr)
+        return 1
+    finally:
+        db.close()
+
+    if result.conflicts and not args.force:
+        for folder, changes in result.conflicts.items():
+            print(f"{args.submissions / folder / 'benchmark.json'}:", file=sys.stderr)
+            for change in changes:
+                print(f"    {change}", file=sys.stderr)
+        print(
+            "These values were not written by the export, "
+            "rerun with --force to overwrite them",
+            file=sys.stderr,
+        )
+        return 1
+
+    for folder in result.written:
+        print(f"Wrote {args.submissions / folder / 'benchmark.json'}")
+    print(f"{len(result.written)} written, {len(result.unchanged)} up to date")
+    return 0
+
+
+def validate_submissions(args: argparse.Namespace) -> int:
+    """Checks every benchmark.json against the schema and for duplicates"""
+    report = submission_checks.validate_submissions(
+        args.submissions, args.schema, args.jobs
+    )
+    for file in report.files:
+        if file.errors or file.warnings:
+            print(f"{'ok' if file.valid else 'INVALID':<9}{file.folder}")
+        for error in file.errors:
+            print(f"    error: {error}")
+        for warning in file.warnings:
+            print(f"    warning: {warning}")
+
+    for folder, other in report.duplicates:
+        print(f"Duplicate: {folder} may duplicate {other}")
+
+    if args.timings:
+        print("Slowest files:")
+        for file in report.slowest(args.timings):
+            print(f"    {file.seconds * 1000:8.2f} ms  {file.folder}")
+
+    invalid = sum(not f.valid for f in report.files)
+    print(
+        f"{len(report.files)} submissions, {invalid} invalid, "
+        f"{len(report.duplicates)} duplicates in {report.seconds * 1000:.0f} ms"
+    )
+    return 0 if report.valid else 1
+
+
+def serve(args: argparse.Namespace) -> int:
+    """Serves the experiments and their histograms over HTTP, read-only"""
+    app = server.Server(args.data_folder, cache_bytes=args.cache_mb * 2**20)
+    try:
+        asyncio.run(app.serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+
+    return 0
+
+
+def make_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog="nlg-data", description=__doc__.splitlines()[0]
+    )
+    parser.set_defaults(
+        func=build, data_folder=create_database.data_folder, jobs=None, verbose=False
+    )
+    subparsers = parser.add_subparsers(title="commands")
+
+    build_parser = subparsers.add_parser("build", help=build.__doc__)
+    _add_common_arguments(build_parser)
+    build_parser.set_defaults(func=build)
+
+    ingest_parser = subparsers.add_parser("ingest", help=ingest.__doc__)
+    _add_common_arguments(ingest_parser)
+    ingest_parser.add_argument(
+        "--adapter",
+        "-a",
+        action="append",
+        choices=adapter_names(),
+        help="Adapter to run, may be repeated (default: all)",
+    )
+    ingest_parser.add_argument(
+        "--since",
+        type=datetime.fromisoformat,
+        help="Only keep experiments on or after this date, e.g. 2024-09-27",
+    )
+    ingest_parser.add_argument(
+        "--until",
+        type=parse_until,
+        help="Only keep experiments on or before this date, a date includes the "
+        "whole day",
+    )
+    ingest_parser.add_argument(
+        "--backend",
+        action="append",
+        help="Only keep experiments on this device, may be repeated",
+    )
+    ingest_parser.add_argument(
+        "--strategy",
+        action="append",
+        help="Only keep experiments using this strategy, may be repeated",
+    )
+    ingest_parser.add_argument(
+        "--memory",
+        action="store_true",
+        help="Also pack the per-shot memory of the IBM jobs into data/memory",
+    )
+    ingest_parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="Skip the source units an interrupted run with the same arguments "
+        "committed, see data/ingest_journal.json",
+    )
+    ingest_parser.set_defaults(func=ingest)
+
+    plan_parser = subparsers.add_parser("plan", help=plan.__doc__)
+    _add_common_arguments(plan_parser)
+    plan_parser.add_argument(
+        "--delta",
+        type=float,
+        default=0.05,
+        help="Error probability of the confidence sequence (default: %(default)s)",
+    )
+    plan_parser.add_argument(
+        "--undecided",
+        action="store_true",
+        help="Only list experiments that are not decided yet",
+    )
+    plan_parser.add_argument(
+        "--output", "-o", type=Path, help="Write the report to a CSV file"
+    )
+    plan_parser.set_defaults(func=plan)
+
+    leaderboard_parser = subparsers.add_parser("leaderboard", help=leaderboard.__doc__)
+    _add_common_arguments(leaderboard_parser)
+    leaderboard_parser.add_argument(
+        "view",
+        nargs="?",
+        default="best_device",
+        choices=["best_device", "best_strategy_year", "latest_device"],
+        help="View to print (default: %(default)s)",
+    )
+    leaderboard_parser.add_argument(
+        "--rebuild",
+        action="store_true",
+        help="Recompute the views from the database and save them",
+    )
+    leaderboard_parser.set_defaults(func=leaderboard)
+
+    snapshot_parser = subparsers.add_parser("snapshot", help=snapshot.__doc__)
+    _add_common_arguments(snapshot_parser)
+    snapshot_parser.add_argument(
+        "name", nargs="?", help="Name of the version (default: the next vN)"
+    )
+    snapshot_parser.add_argument(
+        "--list", action="store_true", help="List the stored versions instead"
+    )
+    snapshot_parser.set_defaults(func=snapshot)
+
+    diff_parser = subparsers.add_parser("diff", help=diff.__doc__)
+    _add_common_arguments(diff_parser)
+    diff_parser.add_argument("old", help="Version to compare from")
+    diff_parser.add_argument(
+        "new",
+        nargs="?",
+        default="latest",
+        help="Version to compare to (default: %(default)s)",
+    )
+    diff_parser.set_defaults(func=diff)
+
+    serve_parser = subparsers.add_parser("serve", help=serve.__doc__)
+    _add_common_arguments(serve_parser)
+    serve_parser.add_argument(
+        "--host",
+        default="127.0.0.1",
+        help="Address to listen on (default: %(default)s)",
+    )
+    serve_parser.add_argument(
+        "--port",
+        type=int,
+        default=8000,
+        help="Port to listen on (default: %(default)s)",
+    )
+    serve_parser.add_argument(
+        "--cache-mb",
+        type=int,
+        default=64,
+        help="Size of the response cache in MiB (default: %(default)s)",
+    )
+    serve_parser.set_defaults(func=serve)
+
+    export_parser = subparsers.add_parser(
+        "export-submissions", help=export_submissions.__doc__
+    )
+    _add_common_arguments(export_parser)
+    _add_submissions_arguments(export_parser)
+    export_parser.add_argument(
+        "--force",
+        action="store_true",
+        help="Overwrite hand-maintained values that differ from the database",
+    )
+    export_parser.set_defaults(func=export_submissions)
+
+    validate_parser = subparsers.add_parser(
+        "validate-submissions", help=validate_submissions.__doc__
+    )
+    _add_common_arguments(validate_parser)
+    _add_submissions_arguments(validate_parser)
+    validate_parser.add_argument(
+        "--timings",
+        type=int,
+        metavar="N",
+        help="Also print the N files that took longest to check",
+    )
+    validate_parser.set_defaults(func=validate_submissions)
+
+    return parser
+
+
+def main(argv: list[str] | None = None):
+    args = make_parser().parse_args(argv)
+    logging.basicConfig(
+        level=logging.INFO if args.verbose else logging.WARNING,
+        format="%(levelname)s %(name)s: %(message)s",
+    )
+    sys.exit(args.func(args))
+
+
+if __name__ == "__main__":
+    main()
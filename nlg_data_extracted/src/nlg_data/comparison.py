@@ -0,0 +1,228 @@
+"""Pairwise tests of whether one device wins more often than another.
+
+Devices are compared on the circuits they share, i.e. the same questions to
+the players, so that the difficulty of each circuit cancels out. For groups
+a and b, with win rates w and shots n on each shared circuit q, the test
+statistic is the mean difference over the shared circuits
+
+    d = mean_q(w_aq - w_bq),  se^2 = sum_q(w_aq(1 - w_aq) / n_aq + ...) / S^2
+
+and z = d / se is compared with a normal distribution. Experiments of the
+same group are pooled circuit by circuit before testing, adding up their
+wins and shots.
+
+Every pair is tested in one pass. The sums over shared circuits are matrix
+products of the (groups, circuits) arrays, with missing circuits masked out,
+so the cost is a couple of (groups x circuits x groups) products:
+
+    from nlg_data import comparison
+
+    result = comparison.compare_experiments(store, db.table("experiments").all())
+    result.tidy()  # one row per pair, with Holm and BH adjusted p-values
+    result.matrix("p_holm")  # groups x groups
+
+Mixing strategies in a group compares different circuits, so filter the
+experiments to one strategy, or group by device and strategy.
+"""
+
+from collections.abc import Callable, Iterable
+from dataclasses import dataclass
+from typing import TYPE_CHECKING
+
+import numpy as np
+from scipy.stats import norm
+
+from .counts_store import CountsStore
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+
+def device_label(doc: dict) -> str:
+    return f"{doc['device']['provider']}/{doc['device']['name']}"
+
+
+@dataclass(frozen=True)
+class PairwiseComparison:
+    labels: list[str]
+
+    diff: np.ndarray
+    """(groups, groups) mean win rate of the row minus the column, over their
+    shared circuits"""
+
+    z: np.ndarray
+    p: np.ndarray
+    """Two-sided p-value of each pair, NaN if they share no circuits"""
+
+    p_holm: np.ndarray
+    """p-values adjusted with Holm's method, which controls the family-wise
+    error rate"""
+
+    p_bh: np.ndarray
+    """p-values adjusted with Benjamini-Hochberg, which controls the false
+    discovery rate"""
+
+    shared: np.ndarray
+    """Number of circuits each pair shares"""
+
+    def matrix(self, field: str = "p_holm") -> "pd.DataFrame":
+        """Groups x groups table of a field, e.g. diff, z or p_bh"""
+        import pandas as pd
+
+        return pd.DataFrame(
+            getattr(self, field), index=self.labels, columns=self.labels
+        )
+
+    def tidy(self, alpha: float = 0.05) -> "pd.DataFrame":
+        """One row per pair of groups sharing circuits, a ahead of b, sorted by
+        adjusted p-value. Significant uses the Holm adjusted p-value"""
+        import pandas as pd
+
+        a, b = np.triu_indices(len(self.labels), k=1)
+        # Orient each pair so that a has the higher win rate
+        swap = self.diff[a, b] < 0
+        a, b = np.where(swap, b, a), np.where(swap, a, b)
+        df = pd.DataFrame(
+            {
+                "a": np.array(self.labels, dtype=object)[a],
+                "b": np.array(self.labels, dtype=object)[b],
+                "shared": self.shared[a, b],
+                "diff": self.diff[a, b],
+                "z": self.z[a, b],
+                "p": self.p[a, b],
+                "p_holm": self.p_holm[a, b],
+                "p_bh": self.p_bh[a, b],
+            }
+        )
+        df = df[df["shared"] > 0]
+        df["significant"] = df["p_holm"] < alpha
+        return df.sort_values(["p_holm", "p"], kind="stable").reset_index(drop=True)
+
+
+def pairwise_tests(
+    win_rates: np.ndarray, shots: np.ndarray, labels: list[str] | None = None
+) -> PairwiseComparison:
+    """Tests every pair of rows on the circuits they share.
+
+    Args:
+        win_rates: (groups, circuits) win rate of each circuit, NaN where a
+            group didn't run it.
+        shots: (groups, circuits) shots of each circuit, 0 where missing.
+        labels: Name of each group, by default its row.
+    """
+    win_rates = np.asarray(win_rates, dtype=np.float64)
+    shots = np.asarray(shots, dtype=np.float64)
+    mask = (~np.isnan(win_rates) & (shots > 0)).astype(np.float64)
+    w = np.where(mask > 0, win_rates, 0.0)
+
+    # Add half a win and half a loss to the variance estimate, so that
+    # circuits won every shot still have some
+    smoothed = (w * shots + 0.5) / (shots + 1)
+    var = np.divide(
+        smoothed * (1 - smoothed), shots, out=np.zeros_like(w), where=mask > 0
+    )
+
+    # Sums over the circuits shared by rows i and j, for every pair at once
+    shared = mask @ mask.T
+    wins = w @ mask.T
+    diff_sum = wins - wins.T
+    var_sum = var @ mask.T + mask @ var.T
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        diff = diff_sum / shared
+        z = diff_sum / np.sqrt(var_sum)
+    p = 2 * norm.sf(np.abs(z))
+    p[shared == 0] = np.nan
+    np.fill_diagonal(p, np.nan)
+
+    # Corrections apply to the family of distinct pairs
+    upper = np.triu_indices(len(w), k=1)
+    p_holm, p_bh = np.full_like(p, np.nan), np.full_like(p, np.nan)
+    p_holm[upper], p_bh[upper] = holm(p[upper]), benjamini_hochberg(p[upper])
+    p_holm, p_bh = _symmetric(p_holm), _symmetric(p_bh)
+
+    return PairwiseComparison(
+        labels=list(labels) if labels is not None else list(map(str, range(len(w)))),
+        diff=diff,
+        z=z,
+        p=p,
+        p_holm=p_holm,
+        p_bh=p_bh,
+        shared=shared.astype(np.int64),
+    )
+
+
+def compare_experiments(
+    store: CountsStore,
+    docs: Iterable[dict],
+    group: Callable[[dict], str] = device_label,
+) -> PairwiseComparison:
+    """Pairwise tests between groups of experiments, by default devices.
+
+    Args:
+        store: Counts store with the circuits of the experiments.
+        docs: Experiment documents from the table, with their doc_id.
+            Experiments missing from the store are skipped.
+        group: Label of the group of an experiment.
+    """
+    labels = {doc.doc_id: group(doc) for doc in docs}
+    doc_ids = np.array(list(labels), dtype=np.int64)
+    index = np.searchsorted(store.doc_ids, doc_ids)
+    found = index < len(store.doc_ids)
+    found[found] = store.doc_ids[index[found]] == doc_ids[found]
+    names, group_of = np.unique(
+        np.array(list(labels.values()), dtype=object)[found], return_inverse=True
+    )
+
+    # Rows of the store of every experiment, and the group of each row
+    index = index[found]
+    starts, sizes = store.offsets[index], np.diff(store.offsets)[index]
+    before = np.cumsum(sizes) - sizes
+    rows = np.repeat(starts - before, sizes) + np.arange(sizes.sum())
+    row_group = np.repeat(group_of, sizes)
+
+    # Circuits are identified by their questions
+    _, circuit = np.unique(store.queries[rows], axis=0, return_inverse=True)
+    circuit = circuit.reshape(-1)
+    row_shots = store.counts[rows].sum(axis=1)
+
+    cells = (len(names), circuit.max(initial=-1) + 1)
+    wins, shots = np.zeros(cells), np.zeros(cells)
+    np.add.at(wins, (row_group, circuit), store.win_rates[rows] * row_shots)
+    np.add.at(shots, (row_group, circuit), row_shots)
+
+    with np.errstate(invalid="ignore"):
+        win_rates = wins / shots
+    return pairwise_tests(win_rates, shots, list(names))
+
+
+def holm(p: np.ndarray) -> np.ndarray:
+    """Holm adjusted p-values. NaN p-values are left out of the family"""
+    p = np.asarray(p, dtype=np.float64)
+    adjusted = np.full_like(p, np.nan)
+    valid = np.flatnonzero(~np.isnan(p))
+    order = valid[np.argsort(p[valid], kind="stable")]
+    m = len(order)
+    steps = (m - np.arange(m)) * p[order]
+    adjusted[order] = np.minimum(np.maximum.accumulate(steps), 1)
+    return adjusted
+
+
+def benjamini_hochberg(p: np.ndarray) -> np.ndarray:
+    """Benjamini-Hochberg adjusted p-values. NaN p-values are left out of the
+    family"""
+    p = np.asarray(p, dtype=np.float64)
+    adjusted = np.full_like(p, np.nan)
+    valid = np.flatnonzero(~np.isnan(p))
+    order = valid[np.argsort(p[valid], kind="stable")]
+    m = len(order)
+    steps = m * p[order] / np.arange(1, m + 1)
+    adjusted[order] = np.minimum(np.minimum.accumulate(steps[::-1])[::-1], 1)
+    return adjusted
+
+
+def _symmetric(upper: np.ndarray) -> np.ndarray:
+    lower = np.tril_indices(len(upper), k=-1)
+    upper = upper.copy()
+    upper[lower] = upper.T[lower]
+    return upper
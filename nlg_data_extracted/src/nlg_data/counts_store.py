@@ -0,0 +1,219 @@
+"""Packed, memory-mapped store of every histogram in the database.
+
+The store lives in a generation folder under ``data/counts``, named by the
+``current`` pointer file, as a handful of ``.npy`` files. Circuits of all
+experiments are packed row by row, and ``offsets`` holds where each
+experiment starts, like a CSR matrix:
+
+    counts.npy     (circuits, outcomes) int64 histogram of each circuit
+    queries.npy    (circuits, players)  int32 question asked to each player
+    win_rates.npy  (circuits,)          float64 win rate of each circuit
+    offsets.npy    (experiments + 1,)   int64 first circuit of each experiment
+    doc_ids.npy    (experiments,)       int64 document id in the experiments table
+    meta.json      number of players and answers
+
+Outcome ``o`` of a circuit encodes the answers ``(a0, a1, ...)`` as
+``o = a0 + answers * a1 + ...``, which matches reading the measured bitstring
+as an integer.
+
+Loading only maps the files, so it takes constant time, and processes that
+load the same store share its pages through the OS page cache.
+
+A rewrite goes to a new generation folder, and ``current`` is then replaced
+atomically, so a crash at any point leaves either the old or the new store.
+"""
+
+import json
+import os
+import shutil
+import time
+from dataclasses import dataclass
+from pathlib import Path
+
+import numpy as np
+from tinydb.table import Table
+
+from .models import CircuitResult, Result
+
+store_folder = Path("counts")
+"""Location of the store relative to the data folder"""
+
+pointer_file = "current"
+"""File in the store folder holding the name of the current generation"""
+
+_arrays = ("counts", "queries", "win_rates", "offsets", "doc_ids")
+
+
+@dataclass(frozen=True)
+class ExperimentCounts:
+    """Histograms of one experiment. The arrays are views into the store"""
+
+    doc_id: int
+    queries: np.ndarray
+    counts: np.ndarray
+    win_rates: np.ndarray
+    answers: int
+
+    def to_result(self) -> Result:
+        players = self.queries.shape[1]
+        outcomes = _decode_outcomes(self.counts.shape[1], players, self.answers)
+        result = Result()
+        for query, hist, win_rate in zip(self.queries, self.counts, self.win_rates):
+            nonzero = hist.nonzero()[0]
+            result.results.append(
+                CircuitResult(
+                    circuit=query.tolist(),
+                    win_rate=win_rate,
+                    counts={tuple(outcomes[o].tolist()): int(hist[o]) for o in nonzero},
+                )
+            )
+
+        return result
+
+
+@dataclass(frozen=True)
+class CountsStore:
+    counts: np.ndarray
+    queries: np.ndarray
+    win_rates: np.ndarray
+    offsets: np.ndarray
+    doc_ids: np.ndarray
+    players: int
+    answers: int
+
+    @classmethod
+    def load(cls, data_folder: Path, mmap_mode: str | None = "r") -> "CountsStore":
+        folder = data_folder / store_folder
+        folder /= (folder / pointer_file).read_text("utf-8").strip()
+        meta = json.loads((folder / "meta.json").read_text("utf-8"))
+        arrays = {
+            name: np.load(folder / f"{name}.npy", mmap_mode=mmap_mode)
+            for name in _arrays
+        }
+        return cls(**arrays, players=meta["players"], answers=meta["answers"])
+
+    def __len__(self):
+        return len(self.doc_ids)
+
+    def index_of(self, doc_id: int) -> int:
+        """Position of an experiment in the store. Doc ids are stored sorted"""
+        i = int(np.searchsorted(self.doc_ids, doc_id))
+        if i == len(self.doc_ids) or self.doc_ids[i] != doc_id:
+            raise KeyError(f"Experiment {doc_id} has no counts in the store")
+
+        return i
+
+    def experiment(self, doc_id: int) -> ExperimentCounts:
+        i = self.index_of(doc_id)
+        rows = slice(self.offsets[i], self.offsets[i + 1])
+        return ExperimentCounts(
+            doc_id=doc_id,
+            queries=self.queries[rows],
+            counts=self.counts[rows],
+            win_rates=self.win_rates[rows],
+            answers=self.answers,
+        )
+
+    @property
+    def shots(self) -> np.ndarray:
+        """Total shots of every circuit"""
+        return self.counts.sum(axis=1)
+
+    @property
+    def outcomes(self) -> np.ndarray:
+        """(outcomes, players) array of the answers encoded by each outcome"""
+        return _decode_outcomes(self.counts.shape[1], self.players, self.answers)
+
+    def as_tensor(self) -> np.ndarray:
+        """Returns the counts as an (experiment, circuit, outcome) tensor.
+
+        This is a view without copying, so it requires every experiment to have
+        the same number of circuits.
+        """
+        sizes = np.diff(self.offsets)
+        if len(sizes) and (sizes != sizes[0]).any():
+            raise ValueError(
+                "Experiments have different numbers of circuits, use offsets instead"
+            )
+
+        circuits = sizes[0] if len(sizes) else 0
+        return self.counts.reshape(len(self), circuits, self.counts.shape[1])
+
+
+def write_counts_store(data_folder: Path, table: Table, answers: int = 4):
+    """Packs the result files of every experiment with counts into the store.
+
+    The store is written to a new generation folder first and then swapped in
+    by replacing the pointer file, so readers never see a partially written
+    store, and a crash never leaves none. Without any experiment with counts,
+    e.g. in a new data folder, an empty store with zero players is written.
+    """
+    docs = sorted(
+        (doc for doc in table.all() if doc.get("attributes", {}).get("has_counts")),
+        key=lambda doc: doc.doc_id,
+    )
+
+    queries, hists, win_rates, offsets, doc_ids = [], [], [], [0], []
+    players = 0
+    for doc in docs:
+        result_file = data_folder / doc["circuit_data"]["result_path"]
+        results = json.loads(result_file.read_text("utf-8"))["results"]
+        for circuit_result in results:
+            players = max(players, len(circuit_result["circuit"]))
+            queries.append(circuit_result["circuit"])
+            win_rates.append(circuit_result["win_rate"])
+            hists.append(
+                {
+                    tuple(map(int, key.split(","))): count
+                    for key, count in (circuit_result["counts"] or {}).items()
+                }
+            )
+
+        offsets.append(len(queries))
+        doc_ids.append(doc.doc_id)
+
+    counts = np.zeros((len(hists), answers**players), dtype=np.int64)
+    weights = answers ** np.arange(players)
+    for row, hist in enumerate(hists):
+        for answer, count in hist.items():
+            counts[row, np.dot(answer, weights[: len(answer)])] = round(count)
+
+    arrays = {
+        "counts": counts,
+        "queries": np.array(queries, dtype=np.int32).reshape(len(queries), players),
+        "win_rates": np.array(win_rates, dtype=np.float64),
+        "offsets": np.array(offsets, dtype=np.int64),
+        "doc_ids": np.array(doc_ids, dtype=np.int64),
+    }
+
+    folder = data_folder / store_folder
+    generation = f"g{time.time_ns()}"
+    new_folder = folder / generation
+    new_folder.mkdir(parents=True)
+    for name, array in arrays.items():
+        np.save(new_folder / f"{name}.npy", array)
+
+    meta = {"players": players, "answers": answers}
+    (new_folder / "meta.json").write_text(json.dumps(meta), "utf-8")
+
+    tmp_pointer = folder / f"{pointer_file}.tmp"
+    with open(tmp_pointer, "w", encoding="utf-8") as f:
+        f.write(generation)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_pointer, folder / pointer_file)
+
+    # Older generations, and the files of the flat layout stores had before.
+    # Stores already loaded keep their mapped files on POSIX
+    for path in folder.iterdir():
+        if path.name in {generation, pointer_file}:
+            continue
+        if path.is_dir():
+            shutil.rmtree(path, ignore_errors=True)
+        else:
+            path.unlink(missing_ok=True)
+
+
+def _decode_outcomes(n_outcomes: int, players: int, answers: int) -> np.ndarray:
+    o = np.arange(n_outcomes)
+    return (o[:, None] // answers ** np.arange(players)) % answers
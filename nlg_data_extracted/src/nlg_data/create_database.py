@@ -1,83 +1,375 @@
 import asyncio
+import json
+import logging
+import os
+import sys
+from dataclasses import asdict
 from pathlib import Path
 
-from tinydb import TinyDB
+from tinydb import Query, TinyDB
+from tinydb.middlewares import CachingMiddleware
+from tinydb.storages import JSONStorage
 from tinydb.table import Document, Table
 
-from . import papers, util
-from .ingest.ingest_ion_trap_data import Duke2024Adapter
-from .ingest.ingest_new_ibm_data import IbmSherbrookeAdapter
-from .ingest.ingest_old_ibm_data import Ibm2023Adapter
-from .ingest.ingest_rigetti_data import RigettiAdapter
-from .models import *
+from . import classical, counts_store, papers, util
+from .blob_store import BlobStore
+from .circuit_metrics import MetricsCache
+from .ingest import adapter_names, get_adapter
+from .ingest.adapter import SourceFilter
+from .journal import IngestJournal
+from .leaderboard import LeaderboardViews
+from .models import CircuitData, Experiment, NonlocalGame, Object, Result
+
+logger = logging.getLogger(__name__)
 
 data_folder = Path("data")
 db_file = data_folder / "db.json"
 
 
-def make_games(db: TinyDB):
+class AtomicJSONStorage(JSONStorage):
+    """JSONStorage that replaces the file instead of overwriting it in place, so
+    a crash never leaves db.json half-written"""
+
+    def __init__(self, path: str, encoding: str | None = None, **kwargs):
+        super().__init__(path, encoding=encoding, **kwargs)
+        self.path = Path(path)
+        self.encoding = encoding
+
+    def write(self, data: dict):
+        tmp_file = self.path.with_suffix(".tmp")
+        with open(tmp_file, "w", encoding=self.encoding) as f:
+            f.write(json.dumps(data, **self.kwargs))
+            f.flush()
+            os.fsync(f.fileno())
+
+        # Reads go through the handle, so it has to follow the new file
+        self._handle.close()
+        tmp_file.replace(self.path)
+        self._handle = open(self.path, mode=self._mode, encoding=self.encoding)
+
+
+class BufferedStorage(CachingMiddleware):
+    """Keeps every write in memory until it is flushed, which ingest does once
+    per source unit"""
+
+    WRITE_CACHE_SIZE = sys.maxsize
+
+    def rollback(self):
+        """Drops the writes since the last flush"""
+        self.cache = None
+        self._cache_modified_count = 0
+
+
+def open_db(db_file: Path = db_file, buffered: bool = False) -> TinyDB:
+    """Opens the database. A buffered database only writes db.json on flush or
+    close, see `ingest`"""
+    storage = BufferedStorage(AtomicJSONStorage) if buffered else AtomicJSONStorage
+    return TinyDB(
+        db_file, storage=storage, sort_keys=True, indent=4, separators=(",", ": ")
+    )
+
+
+def make_games(db: TinyDB, data_folder: Path = data_folder):
     table = db.table("games")
-    table.insert(
-        NonlocalGame(
-            name="G14",
-            optimal_classical_value=86 / 88,
-            optimal_quantum_value=1,
-            publication=papers.odditiespaper,
-            tags=["graph-coloring"],
-            objects=[
-                Object(
-                    name="graph",
-                    description="NetworkX definition of the G14 graph",
-                    path="games/g14/g14.nx",
-                )
-            ],
-        ).model_dump(mode="json")
+
+    # The game id is referenced by every experiment, so never regenerate it
+    if table.contains(Query().name == "G14"):
+        return
+
+    g14 = NonlocalGame(
+        name="G14",
+        optimal_classical_value=0,
+        optimal_quantum_value=1,
+        publication=papers.odditiespaper,
+        tags=["graph-coloring"],
+        objects=[
+            Object(
+                name="graph",
+                description="NetworkX definition of the G14 graph",
+                path="games/g14/g14.nx",
+            )
+        ],
+    )
+
+    # Solved from the graph, which gives 86 / 88
+    g14.optimal_classical_value = classical.optimal_classical_value(g14, data_folder)
+    table.insert(g14.model_dump(mode="json"))
+
+
+def experiment_key(doc: dict) -> tuple:
+    """Identifies the run a serialized experiment came from, so that re-ingesting
+    the same run replaces it instead of adding a duplicate"""
+    attributes = doc.get("attributes", {})
+    run_id = attributes.get("job_id", attributes.get("dataID", ""))
+    return (
+        doc["device"]["provider"],
+        doc["device"]["name"],
+        doc["circuit_data"]["strategy"],
+        doc["date"],
+        str(run_id),
     )
 
 
+def experiment_index(table: Table) -> dict[tuple, int]:
+    """Maps the key of every stored experiment to its document id"""
+    return {experiment_key(doc): doc.doc_id for doc in table.all()}
+
+
+def counts_file(data_folder: Path, doc_id: int) -> Path:
+    return data_folder / "experiments" / f"result_{doc_id}.json"
+
+
 def add_experiment(
     table: Table,
     data_folder: Path,
     experiment: Experiment,
     count_result: Result | None,
-):
+    *,
+    doc_id: int | None = None,
+    views: LeaderboardViews | None = None,
+    blobs: BlobStore | None = None,
+    metrics: MetricsCache | None = None,
+) -> int:
+    """Stores an experiment and its counts. If doc_id is given, that document is
+    replaced instead of inserting a new one.
+
+    The leaderboard views are updated too. Pass views to update them in memory
+    and save them once after many experiments, otherwise views.json is loaded
+    and saved here.
+
+    With blobs, the objects, QASM folder and result file of the experiment are
+    stored in the blob store and referenced by digest. The caller saves it.
+
+    With metrics, the statistics of the circuits in the QASM folder are
+    attached to the circuit data, parsing only circuits missing from the cache.
+    """
     experiment.attributes["has_counts"] = count_result is not None
-    doc_id = table.insert(experiment.model_dump(mode="json"))
+
+    qasm_folder = circuits_folder(data_folder, experiment.circuit_data)
+    if metrics is not None and qasm_folder is not None:
+        experiment.circuit_data.metrics = metrics.folder(qasm_folder)
+
+    previous = None
+    if blobs is not None:
+        previous = table.get(doc_id=doc_id) if doc_id is not None else None
+        store_artifacts(blobs, data_folder, experiment)
+
+    doc = experiment.model_dump(mode="json")
+    if doc_id is None:
+        doc_id = table.insert(doc)
+    else:
+        table.upsert(Document(doc, doc_id=doc_id))
+
+        # Drop counts left over from the previous version of this experiment
+        if count_result is None:
+            counts_file(data_folder, doc_id).unlink(missing_ok=True)
 
     if count_result is not None:
-        countsfile = data_folder / "experiments" / f"result_{doc_id}.json"
+        countsfile = counts_file(data_folder, doc_id)
         countsfile.parent.mkdir(exist_ok=True, parents=True)
-        countsfile.write_text(count_result.model_dump_json())
+        tmp_file = countsfile.with_suffix(".tmp")
+        tmp_file.write_text(count_result.model_dump_json())
+        tmp_file.replace(countsfile)
 
         # Update the document to have a path to this file
         new_data = experiment.circuit_data.model_dump(mode="json")
         new_data["result_path"] = countsfile.relative_to(data_folder).as_posix()
+        if blobs is not None:
+            new_data["result_digest"] = blobs.put(countsfile)
         table.update({"circuit_data": new_data}, doc_ids=[doc_id])
 
+    # Reference the new artifacts before releasing the replaced ones, which
+    # are often the same
+    if blobs is not None:
+        for digest in artifact_digests(table.get(doc_id=doc_id)):
+            blobs.add_ref(digest)
+        for digest in artifact_digests(previous):
+            blobs.release(digest)
 
-async def main():
-    db = TinyDB("data/db.json", sort_keys=True, indent=4, separators=(",", ": "))
-    make_games(db)
+    if views is None:
+        saved_views = LeaderboardViews.load(data_folder, table)
+        saved_views.add(doc_id, doc, table)
+        saved_views.save(data_folder)
+    else:
+        views.add(doc_id, doc, table)
+
+    return doc_id
+
+
+def store_artifacts(blobs: BlobStore, data_folder: Path, experiment: Experiment):
+    """Puts the objects and QASM folder of an experiment that exist on disk in
+    the blob store, and sets their digests. Raw data is hardlinked"""
+    for obj in experiment.objects:
+        path = data_folder / obj.path
+        if path.exists():
+            obj.digest = blobs.put(path, link=True)
 
-    g14 = util.get_game_by_name(db, "G14")
+    qasm_folder = circuits_folder(data_folder, experiment.circuit_data)
+    if qasm_folder is not None:
+        experiment.circuit_data.qasm_digest = blobs.put(qasm_folder, link=True)
+
+
+def circuits_folder(data_folder: Path, circuit_data: CircuitData) -> Path | None:
+    """QASM folder of an experiment, if it exists on disk"""
+    # Some adapters have no circuits yet and leave an empty path
+    folder = data_folder / circuit_data.qasm_path
+    if circuit_data.qasm_path != Path(".") and folder.is_dir():
+        return folder
+
+    return None
+
+
+def artifact_digests(doc: dict | None) -> list[str]:
+    """Digests of the blobs a serialized experiment references"""
+    if doc is None:
+        return []
+
+    circuit_data = doc["circuit_data"]
+    digests = [obj.get("digest") for obj in doc.get("objects", [])]
+    digests += [circuit_data.get("qasm_digest"), circuit_data.get("result_digest")]
+    return [digest for digest in digests if digest is not None]
+
+
+def upsert_experiment(
+    table: Table,
+    data_folder: Path,
+    experiment: Experiment,
+    count_result: Result | None,
+    index: dict[tuple, int],
+    views: LeaderboardViews | None = None,
+    blobs: BlobStore | None = None,
+    metrics: MetricsCache | None = None,
+) -> int:
+    """Adds an experiment, replacing the stored one if the same run was ingested
+    before. The index from experiment_index is kept up to date."""
+    key = experiment_key(experiment.model_dump(mode="json"))
+    doc_id = add_experiment(
+        table,
+        data_folder,
+        experiment,
+        count_result,
+        doc_id=index.get(key),
+        views=views,
+        blobs=blobs,
+        metrics=metrics,
+    )
+    index[key] = doc_id
+    return doc_id
+
+
+async def ingest(
+    db: TinyDB,
+    data_folder: Path,
+    adapters: list[str] | None = None,
+    source_filter: SourceFilter | None = None,
+    memory: bool = False,
+    resume: bool = False,
+) -> dict[str, Exception]:
+    """Runs the selected adapters and upserts their results into the database,
+    then repacks the counts store.
+
+    Each source unit an adapter yields is committed on its own: db.json, the
+    leaderboard views, blob store and circuit metrics cache are saved, and the
+    unit is recorded in the journal, see `journal`. Open the database with
+    buffered=True for db.json to only be written then. With resume, the units
+    an interrupted run with the same arguments committed are skipped.
+
+    With memory, adapters that have per-shot memory also pack it into
+    data/memory, see `memory_store`.
+
+    A failing adapter doesn't stop the others, and its committed units are
+    kept. Returns the exception raised by each adapter that failed.
+    """
+    source_filter = source_filter or SourceFilter()
+    names = adapters or adapter_names()
+    journal = IngestJournal.open(
+        data_folder, {"adapters": names, "filter": asdict(source_filter)}, resume
+    )
+    game = util.get_game_by_name(db, "G14")
     experiment_table = db.table("experiments")
-    data_folder = Path("data")
-    adapters = [
-        cls(g14, data_folder)
-        for cls in (
-            Ibm2023Adapter,
-            RigettiAdapter,
-            IbmSherbrookeAdapter,
-            Duke2024Adapter,
-        )
-    ]
-
-    futures = [adapter.ingest() for adapter in adapters]
-    for future in asyncio.as_completed(futures):
-        result = await future
-        for experiment, count_results in result:
-            add_experiment(experiment_table, data_folder, experiment, count_results)
+    index = experiment_index(experiment_table)
+    views = LeaderboardViews.load(data_folder, experiment_table)
+    blobs = BlobStore.open(data_folder)
+    metrics = MetricsCache.load(data_folder)
+
+    def commit(name: str, unit: str, result: list[tuple[Experiment, Result]]):
+        added = 0
+        try:
+            for experiment, count_results in result:
+                # Adapters filter what they can before parsing, this catches the rest
+                if not source_filter.accepts_experiment(experiment):
+                    continue
+
+                upsert_experiment(
+                    experiment_table,
+                    data_folder,
+                    experiment,
+                    count_results,
+                    index,
+                    views,
+                    blobs,
+                    metrics,
+                )
+                added += 1
+        except BaseException:
+            # Nothing of a unit is committed unless all of it is
+            if isinstance(db.storage, BufferedStorage):
+                db.storage.rollback()
+            raise
+
+        if isinstance(db.storage, BufferedStorage):
+            db.storage.flush()
+        views.save(data_folder)
+        blobs.save()
+        metrics.save()
+        journal.commit(name, unit)
+        return added
+
+    failures = {}
+
+    async def run(name: str):
+        adapter = get_adapter(name)(game, data_folder, source_filter, memory)
+        adapter.completed_units = journal.completed(name)
+        if adapter.completed_units:
+            logger.info(
+                "Adapter '%s' resumes after %d units",
+                name,
+                len(adapter.completed_units),
+            )
+
+        added = 0
+        units = adapter.ingest_units()
+        while True:
+            try:
+                unit, result = await anext(units)
+            except StopAsyncIteration:
+                break
+            except Exception as e:
+                logger.error("Adapter '%s' failed", name, exc_info=e)
+                failures[name] = e
+                return
 
+            # Errors storing a unit stop the whole ingest, there is no telling
+            # what state it left the database in
+            added += commit(name, unit, result)
+
+        logger.info("Adapter '%s' stored %d experiments", name, added)
+
+    async with asyncio.TaskGroup() as group:
+        for name in names:
+            group.create_task(run(name))
+
+    counts_store.write_counts_store(data_folder, experiment_table)
+    if not failures:
+        journal.finish()
+
+    return failures
+
+
+async def main():
+    db = open_db()
+    make_games(db)
+    await ingest(db, data_folder)
     db.close()
 
 
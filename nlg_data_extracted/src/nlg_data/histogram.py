@@ -0,0 +1,213 @@
+"""Sparse histograms and probabilities of measured bitstrings.
+
+A circuit on n qubits has 2^n outcomes, but a few thousand shots only ever
+see a few thousand of them. These types keep the observed outcomes only, as
+sorted int64 codes (the bitstring read as an integer, so bit q is qubit q)
+next to their counts or probabilities:
+
+    hist = SparseHistogram.from_counts({"0101": 12, "1111": 3})
+    probs = hist.probabilities()
+    probs.marginal([0, 1])  # distribution of the first two qubits
+    probs.mitigate(spam)  # readout error mitigation, still sparse
+
+Readout error mitigation solves the SPAM matrix restricted to the observed
+outcomes, like M3 [1], instead of inverting the 2^n matrix. With a
+max_distance, only outcomes within that Hamming distance are coupled, which
+keeps the matrix sparse for wide circuits.
+
+`probabilities` only builds a dense vector when 2^n is small, which is what
+the 4 qubit game circuits need.
+
+[1] Nation, Paul D., et al. "Scalable mitigation of measurement errors on
+    quantum computers." PRX Quantum 2.4 (2021): 040326.
+"""
+
+from collections.abc import Mapping, Sequence
+from dataclasses import dataclass
+
+import numpy as np
+import scipy.sparse as sp
+from scipy.sparse.linalg import spsolve
+
+dense_limit = 2**12
+"""Largest number of outcomes kept as a dense vector"""
+
+max_bits = 63
+"""Widest bitstring an int64 outcome code can hold"""
+
+
+@dataclass(frozen=True)
+class SparseHistogram:
+    outcomes: np.ndarray
+    """Sorted, distinct outcome codes"""
+
+    counts: np.ndarray
+    """Shots of each outcome"""
+
+    bits: int
+
+    @classmethod
+    def from_counts(
+        cls, counts: Mapping[str | int, int], bits: int | None = None
+    ) -> "SparseHistogram":
+        """Reads a histogram of bitstrings, or of outcome codes.
+
+        Args:
+            bits: Width of the bitstrings, by default that of the longest key,
+                or of the largest code.
+        """
+        outcomes = np.array(
+            [int(k, 2) if isinstance(k, str) else k for k in counts], dtype=np.int64
+        )
+        if bits is None:
+            widths = [
+                len(k) if isinstance(k, str) else int(k).bit_length() for k in counts
+            ]
+            bits = max(widths, default=0)
+        if bits > max_bits:
+            raise ValueError(f"Bitstrings of {bits} bits don't fit in an int64")
+
+        return cls(
+            *_merge(outcomes, np.array(list(counts.values()), dtype=np.int64)), bits
+        )
+
+    @property
+    def shots(self) -> int:
+        return int(self.counts.sum())
+
+    def marginal(self, bits: Sequence[int]) -> "SparseHistogram":
+        """Histogram of the given bits, in that order"""
+        outcomes, counts = _merge(_select_bits(self.outcomes, bits), self.counts)
+        return SparseHistogram(outcomes, counts, len(bits))
+
+    def probabilities(self) -> "SparseProbabilities":
+        return SparseProbabilities(self.outcomes, self.counts / self.shots, self.bits)
+
+    def to_dense(self) -> np.ndarray:
+        return _to_dense(self.outcomes, self.counts, self.bits)
+
+
+@dataclass(frozen=True)
+class SparseProbabilities:
+    outcomes: np.ndarray
+    """Sorted, distinct outcome codes"""
+
+    probs: np.ndarray
+    """Probability of each outcome. Quasi-probabilities after mitigation, which
+    can be negative"""
+
+    bits: int
+
+    def marginal(self, bits: Sequence[int]) -> "SparseProbabilities":
+        """Distribution of the given bits, in that order"""
+        outcomes, probs = _merge(_select_bits(self.outcomes, bits), self.probs)
+        return SparseProbabilities(outcomes, probs, len(bits))
+
+    def to_dense(self) -> np.ndarray:
+        return _to_dense(self.outcomes, self.probs, self.bits)
+
+    def mitigate(
+        self,
+        spam: np.ndarray | Sequence[np.ndarray],
+        max_distance: int | None = None,
+    ) -> "SparseProbabilities":
+        """Readout error mitigation in the subspace of the observed outcomes.
+
+        Args:
+            spam: SPAM matrix of all the bits, with the prepared state as the
+                column, or a 2x2 SPAM matrix for each bit, whose product is
+                used. The product is what wide circuits can measure.
+            max_distance: Only couple outcomes within this Hamming distance,
+                which makes the matrix sparse. By default every pair is.
+        """
+        matrix = subspace_matrix(self.outcomes, spam, self.bits, max_distance)
+        if sp.issparse(matrix):
+            probs = spsolve(matrix.tocsc(), self.probs)
+        else:
+            probs = np.linalg.solve(matrix, self.probs)
+
+        return SparseProbabilities(self.outcomes, probs, self.bits)
+
+
+def probabilities(
+    counts: Mapping[str, int], bits: int | None = None
+) -> np.ndarray | SparseProbabilities:
+    """Distribution of a histogram of bitstrings, as a dense vector if it has at
+    most dense_limit outcomes"""
+    probs = SparseHistogram.from_counts(counts, bits).probabilities()
+    if 2**probs.bits <= dense_limit:
+        return probs.to_dense()
+
+    return probs
+
+
+def subspace_matrix(
+    outcomes: np.ndarray,
+    spam: np.ndarray | Sequence[np.ndarray],
+    bits: int,
+    max_distance: int | None = None,
+) -> np.ndarray | sp.csr_array:
+    """SPAM matrix between the given outcomes, with its columns normalized so
+    that mitigated probabilities still add up to 1.
+
+    Dense, unless max_distance is given.
+    """
+    if isinstance(spam, np.ndarray) and spam.ndim == 2:
+        if spam.shape != (2**bits,) * 2:
+            raise ValueError(
+                f"SPAM matrix of shape {spam.shape} doesn't match {bits} bits"
+            )
+
+        def block(rows: np.ndarray) -> np.ndarray:
+            return spam[np.ix_(rows, outcomes)]
+
+    else:
+        if len(spam) != bits:
+            raise ValueError(f"Got {len(spam)} SPAM matrices for {bits} bits")
+        per_bit = np.stack([np.asarray(s, dtype=float) for s in spam])
+        columns = (outcomes[None, :] >> np.arange(bits)[:, None]) & 1
+
+        def block(rows: np.ndarray) -> np.ndarray:
+            matrix = np.ones((len(rows), len(outcomes)))
+            for bit, (s, column) in enumerate(zip(per_bit, columns)):
+                matrix *= s[((rows >> bit) & 1)[:, None], column[None, :]]
+            return matrix
+
+    if max_distance is None:
+        matrix = block(outcomes)
+        return matrix / matrix.sum(axis=0)
+
+    # Row chunks keep the dense intermediate small
+    size = len(outcomes)
+    chunk = max(1, 2**22 // max(size, 1))
+    pieces = []
+    for start in range(0, size, chunk):
+        rows = outcomes[start : start + chunk]
+        values = block(rows)
+        distance = np.bitwise_count(rows[:, None] ^ outcomes[None, :])
+        values[distance > max_distance] = 0
+        pieces.append(sp.csr_array(values))
+
+    matrix = sp.vstack(pieces, format="csr")
+    return matrix @ sp.diags_array(1 / matrix.sum(axis=0))
+
+
+def _merge(outcomes: np.ndarray, values: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """Sorts the outcomes, adding up the values of repeated ones"""
+    outcomes, index = np.unique(outcomes, return_inverse=True)
+    merged = np.zeros(len(outcomes), dtype=values.dtype)
+    np.add.at(merged, index, values)
+    return outcomes, merged
+
+
+def _select_bits(outcomes: np.ndarray, bits: Sequence[int]) -> np.ndarray:
+    selected = np.zeros_like(outcomes)
+    for i, bit in enumerate(bits):
+        selected |= ((outcomes >> bit) & 1) << i
+    return selected
+
+
+def _to_dense(outcomes: np.ndarray, values: np.ndarray, bits: int) -> np.ndarray:
+    dense = np.zeros(2**bits, dtype=values.dtype)
+    dense[outcomes] = values
+    return dense
@@ -0,0 +1,66 @@
+"""Registry of the data adapters.
+
+Adapters are registered by name and only imported when they are first looked
+up, so that e.g. loading the Duke data doesn't pull in the Qiskit runtime.
+Third-party packages can register more adapters through the
+``nlg_data.adapters`` entry point group.
+"""
+
+from importlib import import_module
+from importlib.metadata import entry_points
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from .adapter import Adapter
+
+ENTRY_POINT_GROUP = "nlg_data.adapters"
+
+# Maps an adapter name to either "module:attribute" or an already imported class.
+# The order here is the order adapters run in during a full rebuild.
+_registry: dict[str, "str | type[Adapter]"] = {
+    "ibm2023": "nlg_data.ingest.ingest_old_ibm_data:Ibm2023Adapter",
+    "rigetti": "nlg_data.ingest.ingest_rigetti_data:RigettiAdapter",
+    "ibm2024": "nlg_data.ingest.ingest_new_ibm_data:IbmSherbrookeAdapter",
+    "duke": "nlg_data.ingest.ingest_ion_trap_data:Duke2024Adapter",
+}
+_entry_points_loaded = False
+
+
+def register_adapter(name: str, target: "str | type[Adapter]"):
+    """Registers an adapter class, or a lazy "module:attribute" reference to one"""
+    _registry[name] = target
+
+
+def adapter_names() -> list[str]:
+    _load_entry_points()
+    return list(_registry)
+
+
+def get_adapter(name: str) -> "type[Adapter]":
+    """Looks up an adapter class by name, importing its module on first use"""
+    _load_entry_points()
+    try:
+        target = _registry[name]
+    except KeyError:
+        raise ValueError(
+            f"Unknown adapter '{name}', expected one of: {', '.join(_registry)}"
+        ) from None
+
+    if isinstance(target, str):
+        module_name, attribute = target.split(":")
+        target = getattr(import_module(module_name), attribute)
+        _registry[name] = target
+
+    return target
+
+
+def _load_entry_points():
+    # Entry points only store the "module:attribute" string, so nothing is
+    # imported until the adapter is requested
+    global _entry_points_loaded
+    if _entry_points_loaded:
+        return
+
+    _entry_points_loaded = True
+    for ep in entry_points(group=ENTRY_POINT_GROUP):
+        _registry.setdefault(ep.name, ep.value)
@@ -1,16 +1,126 @@
+import asyncio
 from abc import ABC, abstractmethod
+from collections.abc import AsyncIterator, Callable
+from dataclasses import dataclass
+from datetime import date, datetime, time
 from pathlib import Path
 
 from ..models import Experiment, NonlocalGame, Result
 
 
+def parse_until(value: str) -> datetime:
+    """Parses the end of a date range. A date without a time means the end of
+    that day, so that --until 2024-09-30 keeps the runs of September 30"""
+    try:
+        return datetime.combine(date.fromisoformat(value), time.max)
+    except ValueError:
+        return datetime.fromisoformat(value)
+
+
+@dataclass(frozen=True)
+class SourceFilter:
+    """Restricts which sources an adapter parses. Fields left as None match everything"""
+
+    since: datetime | None = None
+    """Earliest experiment date to keep (inclusive)"""
+
+    until: datetime | None = None
+    """Latest experiment date to keep (inclusive)"""
+
+    backends: frozenset[str] | None = None
+    """Device names to keep, e.g. {"ankaa-3", "sherbrooke"}"""
+
+    strategies: frozenset[str] | None = None
+    """Game strategies to keep, e.g. {"4q", "bell_pair"}"""
+
+    def accepts(
+        self,
+        *,
+        date: datetime | None = None,
+        backend: str | None = None,
+        strategy: str | None = None,
+    ) -> bool:
+        """Checks whatever is known about a source before it gets parsed.
+
+        Arguments which are None are unknown and therefore not filtered on.
+        """
+        if date is not None:
+            # Sources mix naive and aware datetimes, and day-level precision is
+            # all we need, so compare without the timezone
+            date = date.replace(tzinfo=None)
+            if self.since is not None and date < self.since.replace(tzinfo=None):
+                return False
+            if self.until is not None and date > self.until.replace(tzinfo=None):
+                return False
+
+        if backend is not None and self.backends is not None:
+            if backend.lower() not in {b.lower() for b in self.backends}:
+                return False
+
+        if strategy is not None and self.strategies is not None:
+            if strategy not in self.strategies:
+                return False
+
+        return True
+
+    def accepts_experiment(self, experiment: Experiment) -> bool:
+        return self.accepts(
+            date=experiment.date,
+            backend=experiment.device.name,
+            strategy=experiment.circuit_data.strategy,
+        )
+
+
 class Adapter(ABC):
     """Interface for a data adapter that imports data into the database"""
 
-    def __init__(self, game: NonlocalGame, data_folder: Path):
+    def __init__(
+        self,
+        game: NonlocalGame,
+        data_folder: Path,
+        source_filter: SourceFilter | None = None,
+        memory: bool = False,
+    ):
         self.data_folder = data_folder
         self.game = game
+        self.source_filter = source_filter or SourceFilter()
+        self.memory = memory
+        """Whether to also store the per-shot memory, for adapters whose raw
+        data has it"""
+
+        self.completed_units: frozenset[str] = frozenset()
+        """Source units an interrupted run already committed, which
+        ingest_units skips"""
 
     @abstractmethod
     async def ingest(self) -> list[tuple[Experiment, Result]]:
         """Ingests the data, storing it internally"""
+
+    async def ingest_units(
+        self,
+    ) -> AsyncIterator[tuple[str, list[tuple[Experiment, Result]]]]:
+        """Yields the results of each source unit, e.g. a data file, as soon as
+        it is loaded, so that ingest can commit it on its own.
+
+        By default the whole ingest is a single unit.
+        """
+        if "all" not in self.completed_units:
+            yield "all", await self.ingest()
+
+    async def _load_units(
+        self, loaders: dict[str, Callable[[], list[tuple[Experiment, Result]]]]
+    ) -> AsyncIterator[tuple[str, list[tuple[Experiment, Result]]]]:
+        """Runs the blocking loader of every unit that isn't completed in the
+        default executor, yielding the units as they finish"""
+        loop = asyncio.get_running_loop()
+
+        async def load(unit: str, loader: Callable):
+            return unit, await loop.run_in_executor(None, loader)
+
+        tasks = [
+            load(unit, loader)
+            for unit, loader in loaders.items()
+            if unit not in self.completed_units
+        ]
+        for future in asyncio.as_completed(tasks):
+            yield await future
@@ -1,9 +1,9 @@
-import asyncio
+import functools
 from datetime import datetime
-import json
 from pathlib import Path
 from dataclasses import dataclass
 import re
+from typing import Callable
 
 import numpy as np
 import pandas as pd
@@ -12,7 +12,6 @@ from tinydb import TinyDB
 from .. import util
 from ..models import (
     CircuitData,
-    CircuitResult,
     Device,
     Experiment,
     NonlocalGame,
@@ -20,6 +19,13 @@ from ..models import (
     Winrate,
 )
 from .adapter import Adapter
+from .probability_files import (
+    CircuitTable,
+    decode_circuits,
+    read_blue_data,
+    read_gold_data,
+    read_win_rates,
+)
 
 collab_folder = Path("raw_data/duke_collab")
 circuits = collab_folder / "circuits"
@@ -51,130 +57,77 @@ def get_circuit_mapping(data_folder: Path):
 
 
 def get_blue_data(game: NonlocalGame, data_folder: Path, mapping: CircuitMapping):
-    shots = 2000
-    file = data_folder / collab_folder / "Blue data.txt"
-    data: list[dict[int, float]] = eval(file.read_text())
-    count_results = Result()
-    winrates = {}
-    for idx, probs in enumerate(data):
-        w = sum(probs.get(x, 0) for x in {0, 5, 10, 15})
-
-        if idx in mapping.edge_indices:
-            w = 1 - w
-
-        winrates[idx] = w
-
-        counts = {}
-        for x_int, p in probs.items():
-            n = int(np.round(shots * p))
-            ca, cb = x_int % 4, x_int // 4
-            counts[(ca, cb)] = n
-
-        count_results.results.append(
-            CircuitResult(
-                circuit=list(mapping.map[idx]),
-                win_rate=w,
-                counts=counts,
-            )
-        )
-
-    experiment = Experiment(
-        game_id=game.id,
+    return _duke_experiment(
+        game,
+        data_folder,
+        mapping,
+        read_blue_data,
+        file=collab_folder / "Blue data.txt",
+        shots=2000,
         date=datetime(2024, 10, 9),  # fixme: need time for executions
         device=Device(type="trapped-ion", provider="duke", name="blue"),
-        win_rate=Winrate.from_circuit_winrates(game, list(winrates.values()), shots),
-        circuit_data=CircuitData(
-            strategy="bell_pair",
-            shots=shots,
-            num_circuits=len(winrates),
-            qasm_path=circuits,
-            result_path=collab_folder / "Blue data.txt",
-        ),
-        publication=None,
-        attributes={
-            "vertex_win_rate": np.mean([winrates[x] for x in mapping.vertex_indices]),
-            "edge_win_rate": np.mean([winrates[x] for x in mapping.edge_indices]),
-        },
     )
 
-    return experiment, count_results
-
 
 def get_ionq_data(game: NonlocalGame, data_folder: Path, mapping: CircuitMapping):
-    shots = 20000
-    file = data_folder / collab_folder / "ionq_winrates.json"
-    data = json.loads(file.read_text())
-    winrates = {int(k): v for k, v in data.items()}
-
-    experiment = Experiment(
-        game_id=game.id,
+    # todo: don't have histogram data for IonQ, so the result is None
+    return _duke_experiment(
+        game,
+        data_folder,
+        mapping,
+        read_win_rates,
+        file=collab_folder / "ionq_winrates.json",
+        shots=20000,
         date=datetime(2024, 11, 4),  # fixme: need time for executions
         device=Device(type="trapped-ion", provider="ionq", name="aria"),
-        win_rate=Winrate.from_circuit_winrates(game, list(winrates.values()), shots),
-        circuit_data=CircuitData(
-            strategy="bell_pair",
-            shots=shots,
-            num_circuits=len(winrates),
-            qasm_path=circuits,
-            result_path=collab_folder / "ionq_winrates.json",
-        ),
-        publication=None,
-        attributes={
-            "vertex_win_rate": np.mean([winrates[x] for x in mapping.vertex_indices]),
-            "edge_win_rate": np.mean([winrates[x] for x in mapping.edge_indices]),
-        },
     )
 
-    return experiment, None  # todo: don't have histogram data for IonQ
-
 
 def get_gold_data(game: NonlocalGame, data_folder: Path, mapping: CircuitMapping):
-    shots = 2000
-    file = data_folder / collab_folder / "Gold data.json"
-    data: dict[str, dict[str, float]] = json.loads(file.read_text())
-    winrates = {}
-    count_results = Result(results=[])
-    for idx_str, probs in data.items():
-        idx = int(idx_str)
-
-        counts = {}
-        for bitstring, p in probs.items():
-            n = int(np.round(p * shots))
-            ca, cb = int(bitstring[-2:], 2), int(bitstring[:2], 2)
-            counts[(ca, cb)] = n
-
-        probs = {int(k, 2): v for k, v in probs.items()}
-        w = sum(probs.get(x, 0) for x in {0, 5, 10, 15})
-
-        if idx in mapping.edge_indices:
-            w = 1 - w
-
-        winrates[idx] = w
-
-        count_results.results.append(
-            CircuitResult(
-                circuit=list(mapping.map[idx]),
-                win_rate=w,
-                counts=counts,
-            )
-        )
+    return _duke_experiment(
+        game,
+        data_folder,
+        mapping,
+        read_gold_data,
+        file=collab_folder / "Gold data.json",
+        shots=2000,
+        date=datetime(2024, 11, 18),  # fixme: need time for executions
+        device=Device(type="trapped-ion", provider="duke", name="gold"),
+    )
 
+
+def _duke_experiment(
+    game: NonlocalGame,
+    data_folder: Path,
+    mapping: CircuitMapping,
+    reader: Callable[[Path], CircuitTable],
+    *,
+    file: Path,
+    shots: int,
+    date: datetime,
+    device: Device,
+) -> tuple[Experiment, Result | None]:
+    table = reader(data_folder / file)
+    winrates, count_results = decode_circuits(table, mapping.map, shots)
+
+    vertex = np.isin(table.index, list(mapping.vertex_indices))
+    edge = np.isin(table.index, list(mapping.edge_indices))
     experiment = Experiment(
         game_id=game.id,
-        date=datetime(2024, 11, 18),  # fixme: need time for executions
-        device=Device(type="trapped-ion", provider="duke", name="gold"),
-        win_rate=Winrate.from_circuit_winrates(game, list(winrates.values()), shots),
+        date=date,
+        device=device,
+        win_rate=Winrate.from_circuit_winrates(game, winrates.tolist(), shots),
         circuit_data=CircuitData(
             strategy="bell_pair",
             shots=shots,
             num_circuits=len(winrates),
             qasm_path=circuits,
-            result_path=collab_folder / "Gold data.json",
+            result_path=file,
         ),
         publication=None,
         attributes={
-            "vertex_win_rate": np.mean([winrates[x] for x in mapping.vertex_indices]),
-            "edge_win_rate": np.mean([winrates[x] for x in mapping.edge_indices]),
+            "vertex_win_rate": np.mean(winrates[vertex]),
+            "edge_win_rate": np.mean(winrates[edge]),
         },
     )
 
@@ -210,17 +163,43 @@ def get_silver_data(game: NonlocalGame, data_folder: Path, mapping: CircuitMappi
     return experiment, None  # todo: find the raw files that anton put the counts in
 
 
+# Loader for each device. All of them ran the bell_pair strategy.
+loaders = {
+    "silver": get_silver_data,
+    "gold": get_gold_data,
+    "blue": get_blue_data,
+    "aria": get_ionq_data,
+}
+
+
 class Duke2024Adapter(Adapter):
     async def ingest(self) -> list[tuple[Experiment, Result]]:
+        return [r async for _, results in self.ingest_units() for r in results]
+
+    async def ingest_units(self):
+        if not self.source_filter.accepts(strategy="bell_pair"):
+            return
+
+        # Each device has one data file, which is a source unit
         mapping = get_circuit_mapping(self.data_folder)
-        loop = asyncio.get_running_loop()
-        futures = [
-            loop.run_in_executor(None, func, self.game, self.data_folder, mapping)
-            for func in (get_silver_data, get_gold_data, get_blue_data, get_ionq_data)
-        ]
-
-        results = await asyncio.gather(*futures)
-        return results
+        units = {
+            device: functools.partial(
+                self._load_blocking, func, self.game, self.data_folder, mapping
+            )
+            for device, func in loaders.items()
+            if self.source_filter.accepts(backend=device)
+        }
+        async for unit in self._load_units(units):
+            yield unit
+
+    def _load_blocking(self, func: Callable, *args) -> list[tuple[Experiment, Result]]:
+        experiment, counts = func(*args)
+
+        # The dates are only known once the files are loaded
+        if not self.source_filter.accepts(date=experiment.date):
+            return []
+
+        return [(experiment, counts)]
 
 
 def ingest_ion_trap_data(db: TinyDB, table: TinyDB, data_folder: Path):
@@ -1,16 +1,16 @@
-import asyncio
+import functools
+import logging
 import shutil
 from datetime import datetime
 from pathlib import Path
-import itertools
 
 import numpy as np
 import pandas as pd
-import pytz
 from qiskit_ibm_runtime import QiskitRuntimeService
 from tinydb import TinyDB
 
 from .. import papers, util
+from ..memory_store import write_job_memory
 from ..models import (
     CircuitData,
     CircuitResult,
@@ -21,12 +21,18 @@ from ..models import (
     Winrate,
 )
 from .adapter import Adapter
+from .new_ibm_data.calibration import CalibrationStore
 from .new_ibm_data.experiments import get_experiments
-from .new_ibm_data.game_result import GameResult
+from .new_ibm_data.game_result import GameResult, measured_qubits
+
+logger = logging.getLogger(__name__)
 
 
 class IbmSherbrookeAdapter(Adapter):
     async def ingest(self):
+        return [r async for _, results in self.ingest_units() for r in results]
+
+    async def ingest_units(self):
         service = QiskitRuntimeService()
         data_dir = self.data_folder / "raw_data" / "ibm_2024"
         experiments = get_experiments(data_dir, service, real_only=True)
@@ -35,21 +41,44 @@ class IbmSherbrookeAdapter(Adapter):
         mask = (experiments.status == "DONE") & experiments.downloaded
         submitted_times = pd.to_datetime(experiments["submitted"])
         mask &= submitted_times >= pd.Timestamp(datetime(2024, 9, 27))
+
+        # Apply the source filter before unpacking any archives
+        mask &= [
+            self._accepts_source(submitted, backend, strategies)
+            for submitted, backend, strategies in zip(
+                submitted_times, experiments.backend, experiments.strategies
+            )
+        ]
         experiments = experiments.loc[mask]
 
-        loop = asyncio.get_running_loop()
-        futures = []
-        for _, experiment in experiments.iterrows():
-            future = loop.run_in_executor(
-                None, self._load_experiment_blocking, experiment, data_dir
+        # Calibration is read from the job folders before they are cleaned up,
+        # and kept next to the database
+        calibration = CalibrationStore.open(self.data_folder)
+
+        # Each experiment is a source unit
+        loaders = {
+            experiment["id"]: functools.partial(
+                self._load_experiment_blocking, experiment, data_dir, calibration
             )
-            futures.append(future)
+            for _, experiment in experiments.iterrows()
+        }
+        async for unit in self._load_units(loaders):
+            yield unit
 
-        results: list[list[tuple[Experiment, Result]]] = await asyncio.gather(*futures)
-        return list(itertools.chain.from_iterable(results))
+    def _accepts_source(
+        self, submitted: datetime, backend: str, strategies: list[str]
+    ) -> bool:
+        source_filter = self.source_filter
+        if not source_filter.accepts(date=submitted, backend=backend.split("_", 1)[-1]):
+            return False
+
+        # A batch can contain several strategies, keep it if any of them match
+        return source_filter.strategies is None or any(
+            source_filter.accepts(strategy=strategy) for strategy in strategies
+        )
 
     def _load_experiment_blocking(
-        self, experiment: pd.Series, data_dir: Path
+        self, experiment: pd.Series, data_dir: Path, calibration: CalibrationStore
     ) -> list[tuple[Experiment, Result]]:
         service = QiskitRuntimeService()
         zipfile = data_dir / experiment["id"] / "raw.zip"
@@ -58,12 +87,35 @@ class IbmSherbrookeAdapter(Adapter):
         return_results: list[tuple[Experiment, Result]] = []
 
         for job_folder in tmpdir.iterdir():
-            result = GameResult.load_from_folder(job_folder)
-            record = result.to_record()
+            # Each job runs a single strategy, which is cheap to check before parsing
+            strategy = next((job_folder / "game").iterdir()).stem
+            if not self.source_filter.accepts(strategy=strategy):
+                continue
+
+            result = GameResult.load_from_folder(job_folder, calibration)
+            if self.memory:
+                self._store_memory(job_folder, result)
+
+            job = service.job(result.job_id)
+            result.layout = _job_layout(job)
+            with_metrics = result.layout is not None and result.job_id in calibration
+            record = result.to_record(include_qubit_metrics=with_metrics)
             attributes = {
                 k: record[k] for k in {"job_id", "vertex_win_rate", "edge_win_rate"}
             }
 
+            # Calibration averaged over the qubits the job ran on
+            attributes.update(
+                {
+                    k: v
+                    for k, v in record.items()
+                    if k.startswith("mean_") and not np.isnan(v)
+                }
+            )
+            if result.layout is not None:
+                # Attributes are scalars, so store it like the Rigetti layouts
+                attributes["layout"] = ", ".join(map(str, result.layout))
+
             winrate_A = result.get_adjacency_matrix()
             winrates = winrate_A.flat
             winrates = winrates[~np.isnan(winrates)]
@@ -78,7 +130,7 @@ class IbmSherbrookeAdapter(Adapter):
             shots = unique_shots.pop()
             data = Experiment(
                 game_id=self.game.id,
-                date=service.job(result.job_id).creation_date,
+                date=job.creation_date,
                 device=Device(
                     type="superconducting",
                     provider="ibm",
@@ -121,10 +173,26 @@ class IbmSherbrookeAdapter(Adapter):
 
             return_results.append((data, circuit_result))
 
-        # Cleanup the extracted data
+        # Cleanup the extracted data, the calibration was read already
         shutil.rmtree(tmpdir)
+        calibration.save()
         return return_results
 
+    def _store_memory(self, job_folder: Path, result: GameResult):
+        """Packs the per-shot memory of the game circuits into data/memory"""
+        circuit_folders = {}
+        for circuit_folder in (job_folder / "game" / result.strategy).iterdir():
+            if circuit_folder.is_dir():
+                *_, va, vb = circuit_folder.name.split("_")
+                circuit_folders[(int(va), int(vb))] = circuit_folder
+
+        shots = {q: _counts_to_shots(counts) for q, counts in result.counts.items()}
+        bits = max(len(b) for counts in result.counts.values() for b in counts)
+        if not write_job_memory(
+            self.data_folder, result.job_id, circuit_folders, shots, bits
+        ):
+            logger.warning("Job %s has no per-shot memory", result.job_id)
+
 
 def ingest_new_ibm_data(db: TinyDB, table: TinyDB, data_folder: Path):
     service = QiskitRuntimeService()
@@ -190,5 +258,19 @@ def ingest_new_ibm_data(db: TinyDB, table: TinyDB, data_folder: Path):
         shutil.rmtree(tmpdir)
 
 
+def _job_layout(job) -> list[int] | None:
+    """Physical qubits of a job, read from the transpiled circuits it was
+    submitted with, or None if the service can't return them"""
+    try:
+        pubs = job.inputs["pubs"]
+    except Exception as e:
+        logger.warning("Job %s has no retrievable circuits: %r", job.job_id(), e)
+        return None
+
+    # Pubs are either SamplerPub objects or (circuit, ...) tuples
+    circuits = [pub.circuit if hasattr(pub, "circuit") else pub[0] for pub in pubs]
+    return measured_qubits(circuits) or None
+
+
 def _counts_to_shots(counts: dict[str, int]):
     return sum(counts.values())
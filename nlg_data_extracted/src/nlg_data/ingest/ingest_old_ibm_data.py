@@ -12,6 +12,11 @@ from ..models import CircuitData, Device, Experiment, Winrate, CircuitResult, Re
 class Ibm2023Adapter(Adapter):
     async def ingest(self) -> list[tuple[Experiment, Result]]:
         final_results = []
+
+        # Every 2023 run used the same strategy
+        if not self.source_filter.accepts(strategy="4q"):
+            return final_results
+
         processed_csv = self.data_folder / "raw_data" / "ibm_2023" / "ibm_processed.csv"
         raw_csv = self.data_folder / "raw_data" / "ibm_2023" / "ibm_results.csv"
 
@@ -28,6 +33,9 @@ class Ibm2023Adapter(Adapter):
             )
             date = datetime.fromisoformat(first_row.time)
 
+            if not self.source_filter.accepts(date=date, backend=device.name):
+                continue
+
             winrate = Winrate.from_circuit_winrates(self.game, gdf.q_winrate, shots)
             winrates_by_type = gdf.groupby("qtype").q_winrate.mean()
 
@@ -1,7 +1,6 @@
 from datetime import datetime
-import itertools
+import functools
 from pathlib import Path
-import asyncio
 
 import numpy as np
 import pandas as pd
@@ -23,29 +22,34 @@ from .adapter import Adapter
 
 class RigettiAdapter(Adapter):
     async def ingest(self):
+        return [r async for _, results in self.ingest_units() for r in results]
+
+    async def ingest_units(self):
         data_dir = self.data_folder / "raw_data" / "rigetti_2024"
 
-        futures = []
-        loop = asyncio.get_running_loop()
+        # Each backend folder is a source unit
+        loaders = {}
         for strategy in ("4q", "bell_pair"):
+            if not self.source_filter.accepts(strategy=strategy):
+                continue
+
             old_strategy_name, file_prefix = strategy_mapping.get(
                 strategy, (strategy, strategy)
             )
             folder = data_dir / old_strategy_name
 
             for backend_folder in folder.glob("ankaa*"):
-                future = loop.run_in_executor(
-                    None,
+                unit = backend_folder.relative_to(self.data_folder).as_posix()
+                loaders[unit] = functools.partial(
                     self.load_blocking,
                     self.data_folder,
                     strategy,
                     backend_folder,
                     file_prefix,
                 )
-                futures.append(future)
 
-        results = await asyncio.gather(*futures)
-        return list(itertools.chain.from_iterable(results))
+        async for unit in self._load_units(loaders):
+            yield unit
 
     def load_blocking(
         self, data_folder: Path, strategy: str, backend_folder: Path, file_prefix: str
@@ -84,6 +88,9 @@ class RigettiAdapter(Adapter):
             if date < datetime(2024, 9, 27):
                 continue
 
+            if not self.source_filter.accepts(date=date, backend=backend):
+                continue
+
             # Calculate the win rate
             winrates_overview = gdf.groupby("question")["win_rate"].mean()
             winrate = Winrate.from_circuit_winrates(
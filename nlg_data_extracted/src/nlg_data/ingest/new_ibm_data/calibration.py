@@ -0,0 +1,296 @@
+"""Compact store of the backend calibration data saved with each IBM job.
+
+Each job folder has a calibration_data.json in the BackendProperties format.
+Instead of building a BackendProperties object per job, the store keeps only
+the per-qubit and per-gate numbers we use, as numpy columns. Jobs that ran
+against the same calibration (same backend and last_update_date) share one
+snapshot, which is only parsed for the first of them.
+
+Job folders are unpacked from the raw archives and removed after ingest, so
+calibration files are read as soon as a job is added. A store opened on the
+data folder persists its snapshots in ``data/calibration``:
+
+    index.json       calibration of each job, and the file of each snapshot
+    <digest>.npz     columns of a snapshot, written once
+
+    store = CalibrationStore.open(data_folder)
+    store.add(job_id, job_folder / "calibration_data.json")
+    store.save()
+    store.qubit_metrics(job_id, layout=[12, 13, 14, 15])
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import re
+import threading
+from dataclasses import dataclass, field
+from datetime import datetime
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+import numpy as np
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+store_folder = Path("calibration")
+"""Location of the persisted store relative to the data folder"""
+
+_columns = ("qubit", "t1", "t2", "readout_error", "gate", "gate_qubits", "gate_error")
+
+# Conversion of the time units used by IBM to microseconds
+_to_microseconds = {"s": 1e6, "ms": 1e3, "us": 1.0, "µs": 1.0, "ns": 1e-3}
+
+# Fields needed to identify a snapshot, which can be found without parsing the
+# rest of the file
+_header_patterns = {
+    key: re.compile(rf'"{key}"\s*:\s*"([^"]*)"')
+    for key in ("backend_name", "last_update_date")
+}
+
+
+@dataclass(frozen=True)
+class CalibrationSnapshot:
+    """Calibration of a backend at one point in time, stored as columns"""
+
+    backend: str
+    timestamp: datetime
+
+    qubit: np.ndarray
+    """Physical qubit index of each row of the qubit columns"""
+    t1: np.ndarray
+    """T1 of each qubit in microseconds"""
+    t2: np.ndarray
+    """T2 of each qubit in microseconds"""
+    readout_error: np.ndarray
+
+    gate: np.ndarray
+    """Name of the gate, e.g. sx or ecr, for each row of the gate columns"""
+    gate_qubits: np.ndarray
+    """(gates, 2) array of the qubits each gate acts on, -1 if single-qubit"""
+    gate_error: np.ndarray
+
+    @classmethod
+    def from_dict(cls, data: dict) -> CalibrationSnapshot:
+        qubits = data.get("qubits", [])
+        n = len(qubits)
+        t1, t2, readout_error = np.full((3, n), np.nan)
+        for q, properties in enumerate(qubits):
+            for prop in properties:
+                match prop["name"]:
+                    case "T1":
+                        t1[q] = _microseconds(prop)
+                    case "T2":
+                        t2[q] = _microseconds(prop)
+                    case "readout_error":
+                        readout_error[q] = prop["value"]
+
+        gates = data.get("gates", [])
+        gate_qubits = np.full((len(gates), 2), -1, dtype=np.int32)
+        gate_error = np.full(len(gates), np.nan)
+        for i, gate in enumerate(gates):
+            gate_qubits[i, : len(gate["qubits"][:2])] = gate["qubits"][:2]
+            for param in gate.get("parameters", []):
+                if param["name"] == "gate_error":
+                    gate_error[i] = param["value"]
+
+        return cls(
+            backend=data["backend_name"],
+            timestamp=_parse_date(data["last_update_date"]),
+            qubit=np.arange(n),
+            t1=t1,
+            t2=t2,
+            readout_error=readout_error,
+            gate=np.array([gate["gate"] for gate in gates], dtype=str),
+            gate_qubits=gate_qubits,
+            gate_error=gate_error,
+        )
+
+    def save(self, file: Path):
+        tmp_file = file.with_name(file.name + ".tmp")
+        with open(tmp_file, "wb") as f:
+            np.savez(f, **{name: getattr(self, name) for name in _columns})
+        tmp_file.replace(file)
+
+    @classmethod
+    def load(cls, file: Path, backend: str, timestamp: str) -> CalibrationSnapshot:
+        with np.load(file) as columns:
+            return cls(
+                backend=backend,
+                timestamp=_parse_date(timestamp),
+                **{name: columns[name] for name in _columns},
+            )
+
+    def qubit_metrics(self, layout: list[int]) -> dict[str, float]:
+        """Averages the calibration over the physical qubits of a layout"""
+        layout = np.asarray(layout)
+        on_layout = np.isin(self.qubit, layout)
+
+        # Single-qubit gates on a layout qubit, two-qubit gates between them
+        single = (self.gate_qubits[:, 1] < 0) & np.isin(self.gate_qubits[:, 0], layout)
+        double = np.isin(self.gate_qubits, layout).all(axis=1)
+
+        return {
+            "t1": _nanmean(self.t1[on_layout]),
+            "t2": _nanmean(self.t2[on_layout]),
+            "readout_error": _nanmean(self.readout_error[on_layout]),
+            "single_qubit_gate_error": _nanmean(self.gate_error[single]),
+            "two_qubit_gate_error": _nanmean(self.gate_error[double]),
+        }
+
+    def to_frame(self) -> pd.DataFrame:
+        """One row per gate, joined with the properties of its first qubit"""
+        import pandas as pd
+
+        qubit = self.gate_qubits[:, 0]
+        valid = (qubit >= 0) & (qubit < len(self.qubit))
+        lookup = np.where(valid, qubit, 0)
+        return pd.DataFrame(
+            {
+                "timestamp": self.timestamp,
+                "qubit": qubit,
+                "qubit2": self.gate_qubits[:, 1],
+                "gate": self.gate,
+                "t1": np.where(valid, self.t1[lookup], np.nan),
+                "t2": np.where(valid, self.t2[lookup], np.nan),
+                "readout_error": np.where(valid, self.readout_error[lookup], np.nan),
+                "gate_error": self.gate_error,
+            }
+        )
+
+
+@dataclass
+class CalibrationStore:
+    """Calibration snapshots of many jobs, deduplicated by calibration time.
+
+    Calibration files are parsed when their job is added. A store opened on a
+    folder keeps the snapshots there when saved, and loads them back when
+    first needed.
+    """
+
+    folder: Path | None = None
+    """Where the store is persisted, None to keep it in memory"""
+
+    snapshots: dict[tuple[str, str], CalibrationSnapshot] = field(default_factory=dict)
+    """Snapshots by (backend, last_update_date), loaded so far"""
+
+    _job_keys: dict[str, tuple[str, str]] = field(default_factory=dict)
+    _saved: set[tuple[str, str]] = field(default_factory=set)
+    """Snapshots with a file in the folder"""
+
+    _lock: threading.RLock = field(default_factory=threading.RLock)
+
+    @classmethod
+    def open(cls, data_folder: Path) -> CalibrationStore:
+        folder = data_folder / store_folder
+        try:
+            index = json.loads((folder / "index.json").read_text("utf-8"))
+        except FileNotFoundError:
+            return cls(folder)
+
+        return cls(
+            folder,
+            _job_keys={job: tuple(key) for job, key in index["jobs"].items()},
+            _saved={tuple(key) for key in index["snapshots"]},
+        )
+
+    def save(self):
+        """Writes the new snapshots and the index to the folder"""
+        if self.folder is None:
+            raise ValueError("The store has no folder to save to")
+
+        with self._lock:
+            self.folder.mkdir(parents=True, exist_ok=True)
+            for key, snapshot in self.snapshots.items():
+                if key not in self._saved:
+                    snapshot.save(self._file(key))
+                    self._saved.add(key)
+
+            index = {
+                "jobs": {job: list(key) for job, key in self._job_keys.items()},
+                "snapshots": sorted(map(list, self._saved)),
+            }
+            tmp_file = self.folder / "index.json.tmp"
+            tmp_file.write_text(json.dumps(index, indent=1, sort_keys=True), "utf-8")
+            tmp_file.replace(self.folder / "index.json")
+
+    def add(self, job_id: str, calibration_file: Path) -> CalibrationSnapshot:
+        """Reads the calibration of a job, parsing the file only if its
+        calibration isn't in the store yet"""
+        text = Path(calibration_file).read_text("utf-8")
+
+        # The header is enough to recognize a calibration we already have
+        key = tuple(_header_patterns[k].search(text) for k in _header_patterns)
+        key = tuple(m.group(1) for m in key) if all(key) else None
+
+        with self._lock:
+            if key is None or not self._has(key):
+                data = json.loads(text)
+                key = (data["backend_name"], data["last_update_date"])
+                if not self._has(key):
+                    self.snapshots[key] = CalibrationSnapshot.from_dict(data)
+
+            self._job_keys[job_id] = key
+            return self._snapshot(key)
+
+    def __contains__(self, job_id: str):
+        return job_id in self._job_keys
+
+    def snapshot(self, job_id: str) -> CalibrationSnapshot:
+        with self._lock:
+            try:
+                key = self._job_keys[job_id]
+            except KeyError:
+                raise KeyError(f"No calibration data for job {job_id}") from None
+
+            return self._snapshot(key)
+
+    def qubit_metrics(self, job_id: str, layout: list[int]) -> dict[str, float]:
+        return self.snapshot(job_id).qubit_metrics(layout)
+
+    def table(self) -> pd.DataFrame:
+        """Calibration of every job as one long table with a job column"""
+        import pandas as pd
+
+        with self._lock:
+            frames = {key: self._snapshot(key).to_frame() for key in self.keys()}
+            jobs = [
+                frames[key].assign(job=job_id) for job_id, key in self._job_keys.items()
+            ]
+        return pd.concat(jobs, ignore_index=True) if jobs else pd.DataFrame()
+
+    def keys(self) -> set[tuple[str, str]]:
+        return set(self._job_keys.values())
+
+    def _has(self, key: tuple[str, str]) -> bool:
+        return key in self.snapshots or key in self._saved
+
+    def _snapshot(self, key: tuple[str, str]) -> CalibrationSnapshot:
+        snapshot = self.snapshots.get(key)
+        if snapshot is None:
+            snapshot = CalibrationSnapshot.load(self._file(key), *key)
+            self.snapshots[key] = snapshot
+        return snapshot
+
+    def _file(self, key: tuple[str, str]) -> Path:
+        digest = hashlib.sha256("/".join(key).encode()).hexdigest()[:16]
+        return self.folder / f"{digest}.npz"
+
+
+default_store = CalibrationStore()
+"""In-memory store of the GameResults loaded without one, e.g. in notebooks"""
+
+
+def _microseconds(prop: dict) -> float:
+    return prop["value"] * _to_microseconds.get(prop.get("unit", "us"), 1.0)
+
+
+def _parse_date(value: str) -> datetime:
+    return datetime.fromisoformat(value.removesuffix("Z"))
+
+
+def _nanmean(values: np.ndarray) -> float:
+    values = values[~np.isnan(values)]
+    return float(values.mean()) if len(values) else np.nan
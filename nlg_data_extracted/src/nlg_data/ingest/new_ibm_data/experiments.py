@@ -1,73 +1,169 @@
+from __future__ import annotations
+
 import json
+import os
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from pathlib import Path
+from typing import TYPE_CHECKING
 
-import pandas as pd
-from qiskit_ibm_runtime import QiskitRuntimeService
-from qiskit_ibm_runtime.runtime_job_v2 import RuntimeJobV2
+if TYPE_CHECKING:
+    import pandas as pd
+    from qiskit_ibm_runtime import QiskitRuntimeService
 
+index_file_name = "index.json"
+"""Metadata index kept in the data directory, next to the experiment folders"""
 
-def get_experiments(data_dir: Path, service: QiskitRuntimeService, *, real_only=False):
-    experiments = []
-    for experiment_folder in data_dir.iterdir():
-        if not experiment_folder.is_dir():
-            continue
+_indexed_files = ("metadata.json", "raw.zip", "status.txt")
+"""Files of an experiment folder that its index entry is parsed from"""
 
-        metadata = json.loads((experiment_folder / "metadata.json").read_text("utf-8"))
 
-        # Convert the submitted time (which is ns since epoch) to
-        # datetime object
-        submitted = datetime.fromtimestamp(metadata["submitted"] / 1e9)
+def get_experiments(
+    data_dir: Path,
+    service: QiskitRuntimeService,
+    *,
+    real_only=False,
+    max_workers: int | None = None,
+) -> pd.DataFrame:
+    """Lists the experiments in data_dir with their status.
 
-        # Obtain all the strategies run in this Batch
-        strategies = set()
-        for circuit_name in metadata["circuits"]:
-            if circuit_name.startswith("game"):
-                strategies.add(circuit_name.split(".")[1])
+    The parsed metadata of every folder is kept in an index file, which is only
+    refreshed for folders that changed since the last call. When many folders
+    are new (e.g. on the first call), they're parsed in parallel.
+    """
+    import pandas as pd
 
-        strategies = list(strategies)
+    index = _update_index(data_dir, max_workers)
 
+    experiments = []
+    for folder_name, entry in index.items():
         # Determine the job status
-        if "fake" in metadata["backend"]:
+        if "fake" in entry["backend"]:
             status = "DONE"
 
             # Skip if we're ignoring simulators
             if real_only:
                 continue
         else:
-            # Caching: store a terminal status in a status.txt file
-            # in the experiment directory
-            statuses = set()
-            cache_file = experiment_folder / "status.txt"
-            if cache_file.exists():
-                statuses.add(cache_file.read_text("utf-8").strip())
-
-            else:
-                for job_id in metadata["job_id"]:
-                    job = service.job(job_id)
-                    statuses.add(job.status())
-
-            if any(s not in RuntimeJobV2.JOB_FINAL_STATES for s in statuses):
-                status = "PENDING"
-            else:
-                status = statuses.pop()
-
-                # Store in the cache if it's a terminal state
-                if not cache_file.exists():
-                    cache_file.write_text(status)
+            status = entry.get("status") or _fetch_status(
+                data_dir / folder_name, entry, service
+            )
 
         experiments.append(
             {
-                "id": metadata["experiment_id"],
-                "backend": metadata["backend"],
+                "id": entry["id"],
+                "backend": entry["backend"],
                 "status": status,
-                "submitted": submitted,
-                "downloaded": (experiment_folder / "raw.zip").exists(),
-                "jobs": metadata["job_id"],
-                "strategies": strategies,
+                # Convert the submitted time (which is ns since epoch) to
+                # datetime object
+                "submitted": datetime.fromtimestamp(entry["submitted"] / 1e9),
+                "downloaded": entry["downloaded"],
+                "jobs": entry["jobs"],
+                "strategies": entry["strategies"],
             }
         )
 
+    # Terminal statuses found above are cached in the index too
+    _save_index(data_dir, index)
+
     df = pd.DataFrame.from_records(experiments)
     df.sort_values("submitted", inplace=True, ignore_index=True)
     return df
+
+
+def _update_index(data_dir: Path, max_workers: int | None) -> dict[str, dict]:
+    index_file = data_dir / index_file_name
+    try:
+        index = json.loads(index_file.read_text("utf-8"))
+    except (FileNotFoundError, json.JSONDecodeError):
+        index = {}
+
+    # A folder needs reparsing if one of the files its entry comes from was
+    # added, removed or modified. The folder's own mtime isn't used, since
+    # ingest unpacks raw/ into it and removes it again
+    current = {}
+    with os.scandir(data_dir) as entries:
+        for entry in entries:
+            if entry.is_dir():
+                current[entry.name] = _file_stats(Path(entry.path))
+
+    stale = [
+        name
+        for name, stats in current.items()
+        if index.get(name, {}).get("stats") != stats
+    ]
+    with ThreadPoolExecutor(max_workers) as pool:
+        parsed = pool.map(lambda name: _parse_folder(data_dir / name), stale)
+        for name, entry in zip(stale, parsed):
+            index[name] = entry | {"stats": current[name]}
+
+    # Forget folders that were removed
+    return {name: index[name] for name in sorted(current)}
+
+
+def _file_stats(experiment_folder: Path) -> list[list[int] | None]:
+    """Modification time and size of each indexed file, None if it's missing"""
+    stats = []
+    for name in _indexed_files:
+        try:
+            stat = (experiment_folder / name).stat()
+        except FileNotFoundError:
+            stats.append(None)
+        else:
+            stats.append([stat.st_mtime_ns, stat.st_size])
+    return stats
+
+
+def _parse_folder(experiment_folder: Path) -> dict:
+    metadata = json.loads((experiment_folder / "metadata.json").read_text("utf-8"))
+
+    # Obtain all the strategies run in this Batch
+    strategies = set()
+    for circuit_name in metadata["circuits"]:
+        if circuit_name.startswith("game"):
+            strategies.add(circuit_name.split(".")[1])
+
+    # Caching: a terminal status is stored in a status.txt file in the
+    # experiment directory
+    cache_file = experiment_folder / "status.txt"
+    status = cache_file.read_text("utf-8").strip() if cache_file.exists() else None
+
+    return {
+        "id": metadata["experiment_id"],
+        "backend": metadata["backend"],
+        "submitted": metadata["submitted"],
+        "downloaded": (experiment_folder / "raw.zip").exists(),
+        "jobs": metadata["job_id"],
+        "strategies": sorted(strategies),
+        "status": status,
+    }
+
+
+def _fetch_status(
+    experiment_folder: Path, entry: dict, service: QiskitRuntimeService
+) -> str:
+    from qiskit_ibm_runtime.runtime_job_v2 import RuntimeJobV2
+
+    statuses = set()
+    for job_id in entry["jobs"]:
+        job = service.job(job_id)
+        statuses.add(job.status())
+
+    if any(s not in RuntimeJobV2.JOB_FINAL_STATES for s in statuses):
+        return "PENDING"
+
+    # Store in the cache if it's a terminal state. Record the new stats of
+    # status.txt to avoid reparsing next time.
+    status = statuses.pop()
+    (experiment_folder / "status.txt").write_text(status)
+    entry["status"] = status
+    entry["stats"] = _file_stats(experiment_folder)
+    return status
+
+
+def _save_index(data_dir: Path, index: dict[str, dict]):
+    # Write to a temporary file first so a crash never leaves a truncated index
+    index_file = data_dir / index_file_name
+    tmp_file = index_file.with_suffix(".tmp")
+    tmp_file.write_text(json.dumps(index), "utf-8")
+    tmp_file.replace(index_file)
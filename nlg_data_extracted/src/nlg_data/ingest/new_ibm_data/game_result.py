@@ -1,12 +1,19 @@
+from __future__ import annotations
+
 import json
 from dataclasses import dataclass, field
-from datetime import datetime
 from pathlib import Path
-from typing import Dict, Tuple
+from typing import TYPE_CHECKING, Dict, Iterable, Tuple
 
 import numpy as np
-import rustworkx as rx
-from qiskit_ibm_runtime.ibm_backend import BackendProperties
+
+from ...histogram import SparseProbabilities, probabilities
+from .calibration import CalibrationSnapshot, CalibrationStore, default_store
+
+if TYPE_CHECKING:
+    # Slow to import, so it's only imported where it's used
+    import rustworkx as rx
+    from qiskit import QuantumCircuit
 
 
 @dataclass
@@ -38,11 +45,23 @@ class GameResult:
     mirror_counts: Dict[int, int] = field(default_factory=dict)
     """Counts for the mirror state preparation circuit"""
 
-    calibration_data: BackendProperties = None
-    """Most recent calibration data for the backend at the time the circuits were executed"""
+    calibration_store: CalibrationStore = field(
+        default_factory=lambda: default_store, repr=False
+    )
+    """Store holding the calibration data of this job, read when it was loaded"""
+
+    layout: list[int] | None = None
+    """Physical qubits the game circuits were mapped to, if known. The job
+    folder doesn't record it, see `measured_qubits`"""
 
     # Todo: Extend this to include bell pair prep circuits.
 
+    @property
+    def calibration(self) -> CalibrationSnapshot:
+        """Most recent calibration data for the backend at the time the circuits
+        were executed"""
+        return self.calibration_store.snapshot(self.job_id)
+
     @property
     def questions(self):
         return self.counts.keys()
@@ -56,6 +75,7 @@ class GameResult:
         Args:
             G: The graph to use. If not provided, the win rate graph will be used.
         """
+        import rustworkx as rx
 
         G = G or self.win_rate
         A = rx.adjacency_matrix(G, weight_fn=lambda x: x, null_value=np.nan)
@@ -112,7 +132,16 @@ class GameResult:
         # Compute the distance from the original spam matrix
         return np.linalg.norm(S - S_prime, ord="fro")
 
-    def to_record(self, *, include_qubit_metrics=False) -> dict:
+    def to_record(
+        self, *, include_qubit_metrics=False, layout: list[int] | None = None
+    ) -> dict:
+        """Summarizes the job as a flat record.
+
+        Args:
+            include_qubit_metrics: Whether to add the calibration data averaged
+                over the physical qubits the circuits ran on.
+            layout: Physical qubits of the circuits, defaults to self.layout.
+        """
         A = self.get_adjacency_matrix()
         vertex_win_rate = A.trace() / A.shape[0]
 
@@ -129,15 +158,20 @@ class GameResult:
             mean_fidelity = matrix.trace() / matrix.shape[0]
             spam_data[f"{basis}_spam_fidelity"] = mean_fidelity
 
-        # Add qubit metrics if requested, which involves loading the layout of the
-        # circuits from qiskit cloud, then looking through the calibration data.
-        # Todo: Add this
+        # Add qubit metrics if requested, which is a lookup of the layout's qubits
+        # in the job's calibration snapshot
+        qubit_data = {}
         if include_qubit_metrics:
-            # I actually don't know what properties in the qiskit Job object
-            # allow us to retrieve the circuit. It stands to reason that they
-            # stored it since if you visit the job page, you can see it display
-            # the circuit.
-            raise NotImplementedError()
+            layout = layout if layout is not None else self.layout
+            if layout is None:
+                # The layout isn't saved in the job folder, it comes from the
+                # circuits of the job, see measured_qubits
+                raise ValueError(
+                    f"Job {self.job_id} has no layout, pass it to to_record"
+                )
+
+            metrics = self.calibration.qubit_metrics(layout)
+            qubit_data = {f"mean_{k}": v for k, v in metrics.items()}
 
         return {
             "job_id": self.job_id,
@@ -148,14 +182,22 @@ class GameResult:
             **spam_data,
             "mirror_fidelity": self.mirror_fidelity,
             "crosstalk": self.crosstalk(),
+            **qubit_data,
         }
 
     @classmethod
-    def load_from_folder(cls, job_folder: str | Path):
+    def load_from_folder(
+        cls, job_folder: str | Path, calibration_store: CalibrationStore | None = None
+    ):
         """Loads the results from a folder.
 
         Note we assume the folder is named /path/to/data/<experiment_id>/raw/<job_id>,
         so we extract the job id from the path
+
+        Args:
+            calibration_store: Store to add the job's calibration data to,
+                default_store if not given. The file is parsed right away, so
+                the folder can be removed afterwards.
         """
 
         # Get job id
@@ -181,7 +223,10 @@ class GameResult:
 
         # Fetch more noise results
         mirror_counts = cls._get_mirror_counts(job_folder, strategy)
-        calibration_data = cls._import_calibration_data(job_folder)
+        calibration_store = calibration_store or default_store
+        calibration_file = job_folder / "calibration_data.json"
+        if calibration_file.exists():
+            calibration_store.add(job_id, calibration_file)
 
         return cls(
             job_id,
@@ -192,7 +237,7 @@ class GameResult:
             spam_matrices,
             counts_per_question,
             mirror_counts,
-            calibration_data,
+            calibration_store,
         )
 
     @staticmethod
@@ -251,6 +296,7 @@ class GameResult:
             spam_matrix: A SPAM matrix in the Z basis. If provided, this will be used
                 to perform readout-error mitigation
         """
+        import rustworkx as rx
 
         # Scan the folder and get the number of vertices
         game_folder = Path(game_folder)
@@ -286,21 +332,17 @@ class GameResult:
             # at QCUF.
             counts = json.loads((circuit_folder / "counts.json").read_text("utf-8"))
             counts_per_question[(va, vb)] = counts
-            probs = _counts_to_probability(counts)
+            probs = probabilities(counts)
 
-            # Perform readout-error mitigation if necessary
+            # Perform readout-error mitigation if necessary. Sparse
+            # distributions are mitigated in the subspace of observed outcomes
             if spam_matrix is not None:
-                probs = np.linalg.inv(spam_matrix) @ probs
-
-            # Number of possible colors is the square root of dim(probs). Calculate
-            # the integer indices which correspond to matching colors. For a game
-            # with 4 colors, this would be 0, 5, 10, 15.
-            dim = probs.shape[0]
-            colors = int(np.sqrt(dim))
-            bits = int(np.log2(dim))
-            c = np.arange(colors)
-            idx = c + c * 2 ** (bits // 2)
-            vertex_win_rate = probs[idx].sum().item()
+                if isinstance(probs, SparseProbabilities):
+                    probs = probs.mitigate(spam_matrix)
+                else:
+                    probs = np.linalg.solve(spam_matrix, probs)
+
+            vertex_win_rate = _same_answer_probability(probs)
             edge_win_rate = 1 - vertex_win_rate
 
             if is_vertex_question:
@@ -319,40 +361,29 @@ class GameResult:
 
         return counts
 
-    @staticmethod
-    def _import_calibration_data(job_folder: str | Path) -> BackendProperties:
-        # Import the calibration data
-        job_folder = Path(job_folder)
-        calibration_data = json.loads(
-            (job_folder / "calibration_data.json").read_text("utf-8")
-        )
-
-        # Replace date strings with datetime objects (which was necessary to
-        # serialize in the first place)
-        def replace_date_strings(d):
-            if isinstance(d, list):
-                for item in d:
-                    replace_date_strings(item)
-            elif isinstance(d, dict):
-                for key, value in d.items():
-                    if "date" in key and isinstance(value, str):
-                        d[key] = datetime.fromisoformat(value.removesuffix("Z"))
-                    else:
-                        replace_date_strings(value)
-
-        replace_date_strings(calibration_data)
-        return BackendProperties.from_dict(calibration_data)
 
+def measured_qubits(circuits: Iterable[QuantumCircuit]) -> list[int]:
+    """Physical qubits measured by transpiled circuits, e.g. the inputs of a
+    job. ISA circuits span the whole device, so qubit indices are physical"""
+    qubits = set()
+    for circuit in circuits:
+        for instruction in circuit.data:
+            if instruction.operation.name == "measure":
+                qubits.update(circuit.find_bit(q).index for q in instruction.qubits)
 
-def _counts_to_probability(counts: Dict[str, int]) -> np.ndarray:
-    max_bitstring = int(max(counts.keys()), 2)
-    n = int(np.ceil(np.log2(max_bitstring + 1)))
-    probs = np.zeros(2**n)
+    return sorted(qubits)
 
-    for bitstring, count in counts.items():
-        outcome = int(bitstring, 2)
-        probs[outcome] = count
 
-    probs /= probs.sum()
+def _same_answer_probability(probs: np.ndarray | SparseProbabilities) -> float:
+    """Probability that both players answer the same color. Alice's answer is
+    the first half of the bits and Bob's the second, so for a game with 4
+    colors these are the outcomes 0, 5, 10 and 15."""
+    if isinstance(probs, SparseProbabilities):
+        outcomes, bits = probs.outcomes, probs.bits
+        probs = probs.probs
+    else:
+        outcomes, bits = np.arange(len(probs)), int(np.log2(len(probs)))
 
-    return probs
+    half = bits // 2
+    same = (outcomes & ((1 << half) - 1)) == (outcomes >> half)
+    return probs[same].sum().item()
@@ -0,0 +1,182 @@
+"""Readers for the outcome probability files of the Duke and IonQ devices.
+
+Each reader returns a CircuitTable, with the circuits as rows, and
+decode_circuits turns any of them into win rates and a histogram Result:
+
+    Blue data.txt        Python literal list of {outcome: probability}, one
+                         dict per circuit, e.g. [{0: 0.48, 5: 0.01}, ...]
+    Gold data.json       {circuit: {bitstring: probability}}, where the first
+                         two bits are the answer of the second player
+    ionq_winrates.json   {circuit: win rate}, without probabilities
+
+Outcomes are encoded as ``a0 + 4 * a1``, so a bitstring read as an integer is
+the outcome of that circuit.
+
+The Blue file is read in chunks of whole records instead of being evaluated as
+Python source. Each chunk is checked against the grammar of the format (dicts
+of integer keys and float values, as written by repr) and then, since that is
+JSON once the braces and colons are swapped for brackets and commas, parsed
+with the json module. All readers build the probability array from the flat
+[key, value, key, value, ...] list of each circuit in one go.
+"""
+
+import json
+import re
+from dataclasses import dataclass
+from pathlib import Path
+
+import numpy as np
+
+from ..models import CircuitResult, Result
+
+answers = 4
+"""Number of answers of each player"""
+
+outcomes = answers**2
+
+# Outcomes where both players give the same answer
+_same_answer = np.arange(answers) * (answers + 1)
+
+# Numbers as written by repr and accepted by JSON
+_number = r"-?\d+(?:\.\d+)?(?:[eE][-+]?\d+)?"
+_record = rf"\{{(?:\s*\d+\s*:\s*{_number}(?:\s*,\s*\d+\s*:\s*{_number})*+)?+\s*\}}"
+_first_records = re.compile(rf"\s*{_record}(?:\s*,\s*{_record})*+")
+_next_records = re.compile(rf"(?:\s*,\s*{_record})*+")
+_list_end = re.compile(r"\s*,?\s*\]\s*")
+_to_json = str.maketrans("{}:", "[],")
+
+_chunk_size = 1 << 20
+
+
+@dataclass(frozen=True)
+class CircuitTable:
+    """Results of the circuits of one experiment, one row per circuit"""
+
+    index: np.ndarray
+    """Number of the circuit, which identifies its query in the mapping"""
+
+    probs: np.ndarray | None = None
+    """(circuits, outcomes) probabilities, NaN for outcomes not in the file"""
+
+    win_rates: np.ndarray | None = None
+    """Win rates given by the file, when there are no probabilities"""
+
+
+def read_blue_data(file: Path) -> CircuitTable:
+    """Reads a list of {outcome: probability} dicts written as a Python literal"""
+    records = []
+    with open(file, encoding="utf-8") as f:
+        buffer = ""
+        opened = False
+        while chunk := f.read(_chunk_size):
+            buffer += chunk
+            if not opened:
+                buffer = buffer.lstrip()
+                if not buffer:
+                    continue
+                if buffer[0] != "[":
+                    raise ValueError(f"{file} is not a list of records")
+
+                buffer = buffer[1:]
+                opened = True
+
+            # Parse up to the end of the last complete record
+            end = buffer.rfind("}") + 1
+            if end:
+                records.extend(_parse_records(buffer[:end], not records, file))
+                buffer = buffer[end:]
+
+    # A trailing comma is allowed after the last record
+    if not opened or not _list_end.fullmatch(buffer) or (not records and "," in buffer):
+        raise ValueError(f"Unexpected end of {file}")
+
+    return _table(np.arange(len(records)), records)
+
+
+def read_gold_data(file: Path) -> CircuitTable:
+    """Reads {circuit: {bitstring: probability}} from JSON"""
+    data: dict[str, dict[str, float]] = json.loads(file.read_text("utf-8"))
+    records = [
+        [x for bitstring, p in probs.items() for x in (int(bitstring, 2), p)]
+        for probs in data.values()
+    ]
+    index = np.fromiter(map(int, data), dtype=np.int64, count=len(data))
+    return _table(index, records)
+
+
+def read_win_rates(file: Path) -> CircuitTable:
+    """Reads {circuit: win rate} from JSON"""
+    data: dict[str, float] = json.loads(file.read_text("utf-8"))
+    return CircuitTable(
+        index=np.fromiter(map(int, data), dtype=np.int64, count=len(data)),
+        win_rates=np.fromiter(data.values(), dtype=np.float64, count=len(data)),
+    )
+
+
+def decode_circuits(
+    table: CircuitTable,
+    queries: dict[int, tuple[int, int]],
+    shots: int,
+) -> tuple[np.ndarray, Result | None]:
+    """Computes the win rate of every circuit and the histograms, if available.
+
+    The probabilities give the chance of both players answering the same,
+    which is the win rate for vertex queries (va == vb), while the players
+    win edge queries by answering differently.
+
+    Returns:
+        The win rates in the order of the table, and the histograms with the
+        counts rounded from the probabilities, or None if the table has no
+        probabilities.
+    """
+    if table.probs is None:
+        return table.win_rates, None
+
+    circuits = np.array([queries[i] for i in table.index]).reshape(-1, 2)
+    edge = circuits[:, 0] != circuits[:, 1]
+    same = np.nansum(table.probs[:, _same_answer], axis=1)
+    win_rates = np.where(edge, 1 - same, same)
+
+    # Outcome o is answer o % 4 of the first player and o // 4 of the second
+    counts = np.round(shots * table.probs)
+    outcome_answers = [(o % answers, o // answers) for o in range(outcomes)]
+    result = Result()
+    for circuit, row, w in zip(circuits.tolist(), counts, win_rates.tolist()):
+        present = np.flatnonzero(~np.isnan(row))
+        result.results.append(
+            CircuitResult(
+                circuit=circuit,
+                win_rate=w,
+                counts={outcome_answers[o]: int(row[o]) for o in present},
+            )
+        )
+
+    return win_rates, result
+
+
+def _parse_records(text: str, first: bool, file: Path) -> list[list[float]]:
+    """Parses consecutive records, which follow earlier ones unless first"""
+    if not (_first_records if first else _next_records).fullmatch(text):
+        raise ValueError(f"Invalid records in {file}")
+
+    if not first:
+        text = text.lstrip()[1:]
+
+    return json.loads("[" + text.translate(_to_json) + "]")
+
+
+def _table(index: np.ndarray, records: list[list[float]]) -> CircuitTable:
+    """Builds the probabilities from the flat [key, value, ...] of each circuit"""
+    pairs = np.fromiter(map(len, records), dtype=np.intp, count=len(records)) // 2
+    flat = np.fromiter(
+        (x for record in records for x in record),
+        dtype=np.float64,
+        count=2 * pairs.sum(),
+    )
+    keys, values = flat[0::2], flat[1::2]
+    if ((keys < 0) | (keys >= outcomes) | (keys % 1 != 0)).any():
+        raise ValueError(f"Outcomes must be integers below {outcomes}")
+
+    probs = np.full((len(index), outcomes), np.nan)
+    probs[np.repeat(np.arange(len(records)), pairs), keys.astype(np.intp)] = values
+    return CircuitTable(index=index, probs=probs)
@@ -0,0 +1,83 @@
+"""Journal of the source units an ingest has committed, so a run that dies
+halfway can resume instead of starting over.
+
+Adapters yield their results one source unit at a time: an IBM experiment, a
+Rigetti backend folder or a Duke data file. Ingest applies a unit to the
+buffered database, then commits it in this order:
+
+    1. db.json, replaced atomically with everything written since the last unit
+    2. the leaderboard views, blob store refs and circuit metrics cache
+    3. the unit, appended to data/ingest_journal.json
+
+Counts files are written atomically as the unit is applied. A crash before 1
+loses the unit, and one between 1 and 3 leaves it stored but not journaled.
+Either way, resuming runs the unit again, and since ingest upserts by run,
+that replaces what was stored rather than duplicating it.
+
+    nlg-data ingest --adapter ibm2024 --resume
+
+A journal only resumes the run it was started for, i.e. the same adapters
+and source filter. It is removed once a run finishes without failures.
+"""
+
+import hashlib
+import json
+from dataclasses import dataclass, field
+from pathlib import Path
+
+journal_file = Path("ingest_journal.json")
+"""Location of the journal relative to the data folder"""
+
+_version = 1
+
+
+@dataclass
+class IngestJournal:
+    file: Path
+    run: str
+    """Hash of the adapters and source filter of the run"""
+
+    units: dict[str, list[str]] = field(default_factory=dict)
+    """Committed units of each adapter"""
+
+    @classmethod
+    def open(cls, data_folder: Path, run: dict, resume: bool = True) -> "IngestJournal":
+        """Journal of a run, with the units committed so far if resuming it"""
+        file = data_folder / journal_file
+        key = hashlib.sha256(
+            json.dumps(run, sort_keys=True, default=str).encode()
+        ).hexdigest()
+        try:
+            journal = json.loads(file.read_text("utf-8"))
+        except FileNotFoundError:
+            journal = None
+
+        if (
+            resume
+            and journal is not None
+            and journal.get("version") == _version
+            and journal["run"] == key
+        ):
+            return cls(file, key, journal["units"])
+
+        return cls(file, key)
+
+    def completed(self, adapter: str) -> frozenset[str]:
+        return frozenset(self.units.get(adapter, ()))
+
+    def commit(self, adapter: str, unit: str):
+        units = self.units.setdefault(adapter, [])
+        if unit not in units:
+            units.append(unit)
+        self._save()
+
+    def finish(self):
+        """Ends the run, there is nothing left to resume"""
+        self.units.clear()
+        self.file.unlink(missing_ok=True)
+
+    def _save(self):
+        journal = {"version": _version, "run": self.run, "units": self.units}
+        tmp_file = self.file.with_suffix(".tmp")
+        tmp_file.write_text(json.dumps(journal, indent=4), "utf-8")
+        tmp_file.replace(self.file)
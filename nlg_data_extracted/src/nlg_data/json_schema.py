@@ -0,0 +1,238 @@
+"""Compiles a JSON schema into a plain Python validator.
+
+Only the draft-07 keywords used by ``schemas/benchmark-schema.json`` are
+supported, and any other keyword that constrains values raises a ValueError
+when compiling, rather than being ignored silently. The schema is walked once,
+so validating a document only runs the checks it needs:
+
+    validate = compile_schema(json.loads(schema_file.read_text()))
+    validate({"algorithmName": "G14"})  # ["root: missing 'device'", ...]
+
+Like ajv, every error is reported rather than the first one only.
+"""
+
+import re
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Callable
+from urllib.parse import urlparse
+
+Validator = Callable[[Any], list[str]]
+"""Returns the errors of a document, empty if it is valid"""
+
+_Check = Callable[[Any, str, list[str]], None]
+
+# Keywords that only describe the schema
+_annotations = {"$schema", "$id", "$comment", "title", "description", "default"}
+
+# Python types of every JSON type. bool isn't a number, though it is an int
+_types: dict[str, tuple[type, ...]] = {
+    "object": (dict,),
+    "array": (list,),
+    "string": (str,),
+    "boolean": (bool,),
+    "null": (type(None),),
+    "number": (int, float),
+    "integer": (int,),
+}
+
+
+def _is_uri(value: str) -> bool:
+    parsed = urlparse(value)
+    return bool(parsed.scheme) and " " not in value
+
+
+def _is_date_time(value: str) -> bool:
+    # RFC 3339 needs the time and an offset, which fromisoformat doesn't
+    if not _date_time.fullmatch(value):
+        return False
+    try:
+        datetime.fromisoformat(value.upper().replace("Z", "+00:00"))
+    except ValueError:
+        return False
+    return True
+
+
+_date_time = re.compile(
+    r"\d{4}-\d{2}-\d{2}[Tt ]\d{2}:\d{2}:\d{2}(\.\d+)?([Zz]|[+-]\d{2}:\d{2})"
+)
+
+_formats: dict[str, Callable[[str], bool]] = {
+    "uri": _is_uri,
+    "date-time": _is_date_time,
+}
+
+
+def compile_schema(schema: dict) -> Validator:
+    check = _compile(schema)
+
+    def validate(document: Any) -> list[str]:
+        errors = []
+        check(document, "root", errors)
+        return errors
+
+    return validate
+
+
+def _compile(schema: dict | bool) -> _Check:
+    if schema is True:
+        return lambda value, path, errors: None
+    if schema is False:
+        return lambda value, path, errors: errors.append(f"{path}: not allowed")
+
+    checks: list[_Check] = []
+    constraints: dict[type, list[_Constraint]] = {}
+    for keyword, argument in schema.items():
+        if keyword in _annotations or keyword == "type":
+            continue
+        if keyword not in _keywords:
+            raise ValueError(f"Unsupported schema keyword '{keyword}'")
+
+        check = _keywords[keyword](argument, schema)
+        if isinstance(check, _Constraint):
+            for t in _types[check.type_name]:
+                constraints.setdefault(t, []).append(check)
+        elif check is not None:
+            checks.append(check)
+
+    if "type" in schema or constraints:
+        checks.insert(0, _value_check(schema.get("type"), constraints))
+
+    if len(checks) == 1:
+        return checks[0]
+
+    def check_all(value, path, errors):
+        for check in checks:
+            check(value, path, errors)
+
+    return check_all
+
+
+def _value_check(
+    type_names: str | list[str] | None, constraints: dict[type, list["_Constraint"]]
+) -> _Check:
+    """Checks the type and the constraints of its type with one lookup"""
+    if isinstance(type_names, str):
+        type_names = [type_names]
+
+    allowed = None
+    if type_names is not None:
+        allowed = frozenset(t for name in type_names for t in _types[name])
+    # Like in JavaScript, 1.0 is an integer
+    integer = type_names is not None and "integer" in type_names
+
+    def check(value, path, errors):
+        value_type = type(value)
+        if allowed is not None and value_type not in allowed:
+            if not (integer and value_type is float and value.is_integer()):
+                errors.append(f"{path}: must be {' or '.join(type_names)}")
+                return
+
+        for constraint in constraints.get(value_type, ()):
+            if not constraint.test(value):
+                errors.append(f"{path}: {constraint.message}")
+
+    return check
+
+
+@dataclass(frozen=True)
+class _Constraint:
+    """A keyword that, like every keyword except type, ignores other types"""
+
+    type_name: str
+    test: Callable[[Any], bool]
+    message: str
+
+
+def _required(argument, schema) -> _Check:
+    def check(value, path, errors):
+        if isinstance(value, dict):
+            errors.extend(f"{path}: missing '{k}'" for k in argument if k not in value)
+
+    return check
+
+
+def _properties(argument, schema) -> _Check:
+    properties = {name: _compile(s) for name, s in argument.items()}
+
+    def check(value, path, errors):
+        if type(value) is not dict:
+            return
+        for name, check_property in properties.items():
+            if name in value:
+                check_property(value[name], f"{path}.{name}", errors)
+
+    return check
+
+
+def _additional_properties(argument, schema) -> _Check | None:
+    if argument is True:
+        return None
+
+    known = set(schema.get("properties", {}))
+    check_extra = _compile(argument)
+
+    def check(value, path, errors):
+        if not isinstance(value, dict):
+            return
+        for name in value.keys() - known:
+            check_extra(value[name], f"{path}.{name}", errors)
+
+    return check
+
+
+def _items(argument, schema) -> _Check:
+    check_item = _compile(argument)
+
+    def check(value, path, errors):
+        if isinstance(value, list):
+            for i, item in enumerate(value):
+                check_item(item, f"{path}[{i}]", errors)
+
+    return check
+
+
+def _pattern(argument, schema) -> _Constraint:
+    pattern = re.compile(argument)
+    return _Constraint("string", pattern.search, f"must match '{argument}'")
+
+
+def _format(argument, schema) -> _Constraint:
+    if argument not in _formats:
+        raise ValueError(f"Unsupported schema format '{argument}'")
+
+    return _Constraint("string", _formats[argument], f"must be a {argument}")
+
+
+def _enum(argument, schema) -> _Check:
+    def check(value, path, errors):
+        if value not in argument:
+            errors.append(f"{path}: must be one of {argument}")
+
+    return check
+
+
+# Besides type, which _compile checks together with the constraints
+_keywords: dict[str, Callable[[Any, dict], _Check | _Constraint | None]] = {
+    "required": _required,
+    "properties": _properties,
+    "additionalProperties": _additional_properties,
+    "items": _items,
+    "pattern": _pattern,
+    "format": _format,
+    "enum": _enum,
+    "minimum": lambda a, s: _Constraint("number", lambda v: v >= a, f"must be >= {a}"),
+    "maximum": lambda a, s: _Constraint("number", lambda v: v <= a, f"must be <= {a}"),
+    "minLength": lambda a, s: _Constraint(
+        "string", lambda v: len(v) >= a, f"must have at least {a} characters"
+    ),
+    "maxLength": lambda a, s: _Constraint(
+        "string", lambda v: len(v) <= a, f"must have at most {a} characters"
+    ),
+    "minItems": lambda a, s: _Constraint(
+        "array", lambda v: len(v) >= a, f"must have at least {a} items"
+    ),
+    "maxItems": lambda a, s: _Constraint(
+        "array", lambda v: len(v) <= a, f"must have at most {a} items"
+    ),
+}
@@ -0,0 +1,160 @@
+"""Leaderboard views of the experiments, kept up to date as they are stored.
+
+The views live in ``data/views.json`` next to the database. Each view maps a
+group to the one experiment that represents it:
+
+    best_device         "provider/device" -> highest win rate
+    best_strategy_year  "strategy/year"   -> highest win rate
+    latest_device       "provider/device" -> most recent experiment
+
+`create_database.add_experiment` updates the views with every experiment it
+stores, so reading them is a lookup rather than a groupby over the table:
+
+    views = LeaderboardViews.load(data_folder)
+    views.lookup("best_device", "ibm", "sherbrooke")["win_rate"]
+    views.rows("latest_device")  # records for a DataFrame
+
+Ties go to the experiment stored first, like ``argmax`` over the table. If the
+file is missing, it is rebuilt from the table when one is given.
+"""
+
+import json
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Callable
+
+from tinydb.table import Table
+
+views_file = Path("views.json")
+"""Location of the views relative to the data folder"""
+
+
+def _device(entry: dict) -> tuple:
+    return entry["provider"], entry["device"]
+
+
+def _strategy_year(entry: dict) -> tuple:
+    return entry["strategy"], entry["date"][:4]
+
+
+def _best(entry: dict) -> tuple:
+    return entry["win_rate"], -entry["doc_id"]
+
+
+def _latest(entry: dict) -> tuple:
+    return entry["date"], entry["doc_id"]
+
+
+_views: dict[str, tuple[Callable[[dict], tuple], Callable[[dict], tuple]]] = {
+    "best_device": (_device, _best),
+    "best_strategy_year": (_strategy_year, _best),
+    "latest_device": (_device, _latest),
+}
+"""Group and rank of each view. The entry with the highest rank is kept"""
+
+
+@dataclass
+class LeaderboardViews:
+    views: dict[str, dict[str, dict]] = field(
+        default_factory=lambda: {name: {} for name in _views}
+    )
+
+    @classmethod
+    def load(cls, data_folder: Path, table: Table | None = None) -> "LeaderboardViews":
+        file = data_folder / views_file
+        if file.exists():
+            return cls(json.loads(file.read_text("utf-8")))
+        if table is not None:
+            return cls.rebuild(table)
+
+        return cls()
+
+    @classmethod
+    def rebuild(cls, table: Table) -> "LeaderboardViews":
+        views = cls()
+        for doc in table.all():
+            views.add(doc.doc_id, doc)
+
+        return views
+
+    def save(self, data_folder: Path):
+        file = data_folder / views_file
+        tmp_file = file.with_suffix(".tmp")
+        tmp_file.write_text(json.dumps(self.views, indent=4, sort_keys=True), "utf-8")
+        tmp_file.replace(file)
+
+    def add(self, doc_id: int, doc: dict, table: Table | None = None):
+        """Updates the views with a stored experiment.
+
+        Args:
+            table: Experiments table, needed when the experiment replaces one
+                that leads a group, since the group may then have a new leader.
+        """
+        entry = _entry(doc_id, doc)
+        for name, (group, rank) in _views.items():
+            view = self.views[name]
+            key = _key(group(entry))
+
+            # A replaced experiment that leads a group it may no longer win
+            stale = [
+                k
+                for k, e in view.items()
+                if e["doc_id"] == doc_id and (k != key or rank(entry) < rank(e))
+            ]
+            if stale and table is None:
+                raise ValueError(f"Replacing experiment {doc_id} needs the table")
+
+            for k in stale:
+                del view[k]
+
+            # The leader is also refreshed when it is replaced by itself
+            current = view.get(key)
+            if (
+                current is None
+                or current["doc_id"] == doc_id
+                or rank(entry) > rank(current)
+            ):
+                view[key] = entry
+
+            for k in stale:
+                self._recompute(name, k, table)
+
+    def lookup(self, view: str, *group) -> dict | None:
+        """Entry of a group, e.g. lookup("best_strategy_year", "4q", 2024)"""
+        return self.views[view].get(_key(group))
+
+    def rows(self, view: str) -> list[dict]:
+        """Entries of a view, sorted by group"""
+        return [self.views[view][key] for key in sorted(self.views[view])]
+
+    def _recompute(self, name: str, key: str, table: Table):
+        group, rank = _views[name]
+        entries = [_entry(doc.doc_id, doc) for doc in table.all()]
+        entries = [e for e in entries if _key(group(e)) == key]
+        if entries:
+            self.views[name][key] = max(entries, key=rank)
+        else:
+            self.views[name].pop(key, None)
+
+
+def _key(group: tuple) -> str:
+    return "/".join(str(g) for g in group)
+
+
+def _entry(doc_id: int, doc: dict) -> dict:
+    # Dates are compared as UTC strings, so normalize their offset
+    date = datetime.fromisoformat(doc["date"])
+    if date.tzinfo is None:
+        date = date.replace(tzinfo=timezone.utc)
+
+    return {
+        "doc_id": doc_id,
+        "provider": doc["device"]["provider"],
+        "device": doc["device"]["name"],
+        "type": doc["device"]["type"],
+        "strategy": doc["circuit_data"]["strategy"],
+        "date": date.astimezone(timezone.utc).isoformat(),
+        "win_rate": doc["win_rate"]["value"],
+        "ci95": doc["win_rate"]["ci95"],
+    }
@@ -0,0 +1,201 @@
+"""Bit-packed store of the per-shot memory of the IBM jobs.
+
+The raw archives of the 2024 IBM runs hold, for each circuit, the outcome of
+every shot in the order it was measured. Counts lose that order, so drift
+within a job is invisible in them. Ingest with ``--memory`` keeps it in
+``data/memory``, next to the counts store, as two files per job:
+
+    <job_id>.npy   (shots, ceil(bits / 8)) uint8, one np.packbits row per shot
+    <job_id>.json  width of the bitstrings, question of each circuit, and
+                   offsets of its first shot, like the counts store
+
+The memory files are parsed in chunks and written into a memory-mapped array,
+so no more than a chunk of shots is ever held as text:
+
+    memory = JobMemory.load(data_folder, job_id)
+    memory.outcomes(0)  # outcome code of every shot of the first circuit
+    memory.window_win_rates(window=1000)  # (circuits, windows) drift
+
+Rows keep the characters of the bitstring in order, so the outcome code is
+the bitstring read as an integer, as in the counts.
+"""
+
+import json
+import re
+from collections.abc import Iterator
+from dataclasses import dataclass
+from pathlib import Path
+
+import numpy as np
+
+store_folder = Path("memory")
+"""Location of the store relative to the data folder"""
+
+memory_file = "memory.json"
+"""JSON list of the shots of a circuit, next to its counts.json"""
+
+_chunk_bytes = 1 << 20
+
+_hex_shot = re.compile(rb'"0x([0-9a-fA-F]+)"')
+
+
+@dataclass(frozen=True)
+class JobMemory:
+    job_id: str
+    bits: int
+    packed: np.ndarray
+    """(shots, ceil(bits / 8)) packed shots of every circuit, in order"""
+
+    questions: np.ndarray
+    """(circuits, 2) question of each circuit"""
+
+    offsets: np.ndarray
+    """(circuits + 1,) first shot of each circuit"""
+
+    @classmethod
+    def load(
+        cls, data_folder: Path, job_id: str, mmap_mode: str | None = "r"
+    ) -> "JobMemory":
+        folder = data_folder / store_folder
+        meta = json.loads((folder / f"{job_id}.json").read_text("utf-8"))
+        return cls(
+            job_id=job_id,
+            bits=meta["bits"],
+            packed=np.load(folder / f"{job_id}.npy", mmap_mode=mmap_mode),
+            questions=np.array(meta["questions"], dtype=np.int32).reshape(-1, 2),
+            offsets=np.array(meta["offsets"], dtype=np.int64),
+        )
+
+    def __len__(self):
+        return len(self.questions)
+
+    def outcomes(self, circuit: int | None = None) -> np.ndarray:
+        """Outcome code of every shot of a circuit, or of the whole job"""
+        rows = self.packed
+        if circuit is not None:
+            rows = rows[self.offsets[circuit] : self.offsets[circuit + 1]]
+
+        bits = np.unpackbits(rows, axis=1, count=self.bits)
+        return bits.astype(np.int64) @ (1 << np.arange(self.bits - 1, -1, -1))
+
+    def window_counts(self, circuit: int, window: int = 1000) -> np.ndarray:
+        """(windows, 2^bits) histogram of each run of window shots of a circuit.
+        The last window holds the remaining shots"""
+        outcomes = self.outcomes(circuit)
+        n = 2**self.bits
+        windows = -(-len(outcomes) // window)
+        cell = np.arange(len(outcomes)) // window * n + outcomes
+        return np.bincount(cell, minlength=windows * n).reshape(windows, n)
+
+    def window_win_rates(self, window: int = 1000) -> np.ndarray:
+        """(circuits, windows) win rate of each run of window shots of every
+        circuit, NaN past the end of shorter circuits"""
+        outcomes = self.outcomes()
+        circuit = np.repeat(np.arange(len(self)), np.diff(self.offsets))
+        windows = (np.arange(len(outcomes)) - self.offsets[circuit]) // window
+
+        # Alice answers the first half of the bits and Bob the second
+        half = self.bits // 2
+        same = (outcomes & ((1 << half) - 1)) == (outcomes >> half)
+        vertex = self.questions[:, 0] == self.questions[:, 1]
+        wins = same == vertex[circuit]
+
+        columns = windows.max(initial=-1) + 1
+        cell = circuit * columns + windows
+        shots = np.bincount(cell, minlength=len(self) * columns)
+        won = np.bincount(cell, weights=wins, minlength=len(self) * columns)
+        with np.errstate(invalid="ignore"):
+            return (won / shots).reshape(len(self), columns)
+
+
+def write_job_memory(
+    data_folder: Path,
+    job_id: str,
+    circuit_folders: dict[tuple[int, int], Path],
+    shots: dict[tuple[int, int], int],
+    bits: int,
+) -> bool:
+    """Packs the memory of every circuit of a job into the store.
+
+    Args:
+        circuit_folders: Folder of each question, holding its memory.json.
+        shots: Shots of each question, from its counts.
+        bits: Width of the bitstrings.
+
+    Returns False, writing nothing, if a circuit has no memory file.
+    """
+    questions = sorted(circuit_folders)
+    if not all((circuit_folders[q] / memory_file).exists() for q in questions):
+        return False
+
+    offsets = np.concatenate([[0], np.cumsum([shots[q] for q in questions])])
+    folder = data_folder / store_folder
+    folder.mkdir(parents=True, exist_ok=True)
+    file = folder / f"{job_id}.npy"
+    tmp_file = file.with_suffix(".tmp.npy")
+    packed = np.lib.format.open_memmap(
+        tmp_file, mode="w+", dtype=np.uint8, shape=(int(offsets[-1]), (bits + 7) // 8)
+    )
+    try:
+        for question, start, end in zip(questions, offsets, offsets[1:]):
+            read = 0
+            for chunk in read_memory(circuit_folders[question] / memory_file, bits):
+                rows = slice(start + read, start + read + len(chunk))
+                if rows.stop <= end:
+                    packed[rows] = np.packbits(chunk, axis=1)
+                read += len(chunk)
+
+            if read != end - start:
+                raise ValueError(
+                    f"Memory of circuit {question} of job {job_id} doesn't match "
+                    f"its {end - start} shots, it has {read}"
+                )
+
+        packed.flush()
+    except Exception:
+        del packed
+        tmp_file.unlink()
+        raise
+
+    del packed
+    tmp_file.replace(file)
+
+    meta = {"bits": bits, "questions": questions, "offsets": offsets.tolist()}
+    meta_file = file.with_suffix(".json")
+    tmp_meta = meta_file.with_suffix(".tmp")
+    tmp_meta.write_text(json.dumps(meta), "utf-8")
+    tmp_meta.replace(meta_file)
+    return True
+
+
+def read_memory(file: Path, bits: int) -> Iterator[np.ndarray]:
+    """Yields the shots of a memory file as (shots, bits) arrays of 0 and 1, a
+    chunk of the file at a time.
+
+    Shots are either bitstrings, whose digits are read straight from the bytes
+    of the file, or hexadecimal "0x..." strings as in raw Qiskit results.
+    """
+    weights = np.arange(bits - 1, -1, -1)
+    rest = b""
+    with open(file, "rb") as f:
+        while block := f.read(_chunk_bytes):
+            data = rest + block
+            if b"0x" in data:
+                # Only complete strings are converted, the last one may be cut
+                matches = list(_hex_shot.finditer(data))
+                rest = data[matches[-1].end() :] if matches else data
+                codes = np.array([int(m.group(1), 16) for m in matches], dtype=np.int64)
+                if len(codes):
+                    yield ((codes[:, None] >> weights) & 1).astype(np.uint8)
+                continue
+
+            # Everything but the shots is brackets, commas, quotes and spaces
+            digits = np.frombuffer(data, dtype=np.uint8)
+            digits = digits[(digits == ord("0")) | (digits == ord("1"))] - ord("0")
+            complete = len(digits) // bits * bits
+            rest = (digits[complete:] + ord("0")).tobytes()
+            if complete:
+                yield digits[:complete].reshape(-1, bits)
+
+    if rest.strip(b" \t\r\n,]"):
+        raise ValueError(f"{file} ends with an incomplete shot")
@@ -1,23 +1,28 @@
 import ast
+import contextlib
+import functools
+import gc
 import uuid
 from datetime import datetime
 from pathlib import Path
-from typing import Annotated, Any, Dict, Tuple
+from typing import TYPE_CHECKING, Annotated, Any, Dict, Iterable, Tuple
 
 import numpy as np
-import pandas as pd
 from pydantic import (
     UUID4,
-    AfterValidator,
     BaseModel,
     BeforeValidator,
     Field,
     HttpUrl,
+    TypeAdapter,
     field_serializer,
 )
 
 from . import uncertainty
 
+if TYPE_CHECKING:
+    import pandas as pd
+
 
 def validate_tuple_keys(v: Dict[str, Any]) -> Dict[Tuple[int, ...], Any]:
     """
@@ -30,6 +35,18 @@ def validate_tuple_keys(v: Dict[str, Any]) -> Dict[Tuple[int, ...], Any]:
 
     new_dict = {}
     for key_str, value in v.items():
+        # Keys built in Python (rather than loaded from JSON) are already tuples
+        if isinstance(key_str, tuple):
+            new_dict[key_str] = value
+            continue
+
+        # Fast path for the "0,1" format pydantic serializes tuple keys to
+        try:
+            new_dict[tuple(map(int, key_str.split(",")))] = value
+            continue
+        except ValueError:
+            pass
+
         try:
             # Safely evaluate the string as a Python literal (e.g., tuple, int, float, list, dict, string, bool, None)
             evaluated_key = ast.literal_eval(key_str)
@@ -60,7 +77,10 @@ TupleKeyIntDict = Annotated[
 class Object(BaseModel):
     name: str
     description: str
-    path: Path | Annotated[str, AfterValidator(lambda x: Path(x))]
+    path: Path
+
+    digest: str | None = None
+    """SHA-256 of the file or folder in the blob store, once stored"""
 
     @field_serializer("path")
     def serialize_path(self, path: Path, _info):
@@ -78,16 +98,47 @@ class Device(BaseModel):
     name: str
 
 
+class CircuitMetrics(BaseModel):
+    """Gate and depth statistics over the QASM circuits of a strategy.
+
+    Counts only include the qubits a circuit uses. Means are per circuit.
+    """
+
+    num_circuits: int
+    qubits: int
+    gates: float
+    max_gates: int
+    single_qubit_gates: float
+    two_qubit_gates: float
+    max_two_qubit_gates: int
+    depth: float
+    max_depth: int
+    two_qubit_depth: float
+    """Mean number of layers of two-qubit gates"""
+
+    gate_counts: dict[str, int] = Field(default_factory=dict)
+    """Total count of each gate over all circuits"""
+
+
 class CircuitData(BaseModel):
     strategy: str
     shots: int
     num_circuits: int
-    qasm_path: Path | Annotated[str, AfterValidator(lambda x: Path(x))]
+    qasm_path: Path
     """Folder to QASM files for each circuit"""
 
-    result_path: Path | Annotated[str, AfterValidator(lambda x: Path(x))]
+    result_path: Path
     """Json file containing a list of CircuitResult objects"""
 
+    qasm_digest: str | None = None
+    """Digest of the QASM folder in the blob store, once stored"""
+
+    result_digest: str | None = None
+    """Digest of the result file in the blob store, once stored"""
+
+    metrics: CircuitMetrics | None = None
+    """Statistics of the circuits in qasm_path, if they are available"""
+
     @field_serializer("qasm_path", "result_path")
     def serialize_path(self, path: Path, _info):
         return path.as_posix()
@@ -97,7 +148,10 @@ class Result(BaseModel):
     results: list["CircuitResult"] = Field(default_factory=list)
 
     @property
-    def df(self) -> pd.DataFrame:
+    def df(self) -> "pd.DataFrame":
+        # pandas is slow to import and only needed here, so defer it
+        import pandas as pd
+
         records = []
         for circuit_result in self.results:
             query = {f"x{i}": v for i, v in enumerate(circuit_result.circuit)}
@@ -162,12 +216,127 @@ class Winrate(BaseModel):
         return f"{winrate}({err:d})"
 
 
+class WinrateMoments(BaseModel):
+    """Running count, mean and sum of squared deviations of circuit win rates"""
+
+    count: int = 0
+    mean: float = 0.0
+    m2: float = 0.0
+
+    def add(self, winrate: float):
+        # Welford's update
+        winrate = float(winrate)
+        self.count += 1
+        delta = winrate - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (winrate - self.mean)
+
+    def add_many(self, winrates: Iterable[float]):
+        wr = np.asarray(list(winrates), dtype=np.float64)
+        if len(wr):
+            batch = WinrateMoments(
+                count=len(wr),
+                mean=float(wr.mean()),
+                m2=float(((wr - wr.mean()) ** 2).sum()),
+            )
+            self.merge_from(batch)
+
+    def merge_from(self, other: "WinrateMoments"):
+        # Chan et al.'s update for combining the moments of two sets
+        count = self.count + other.count
+        if count == 0:
+            return
+
+        delta = other.mean - self.mean
+        self.m2 += other.m2 + delta**2 * self.count * other.count / count
+        self.mean += delta * other.count / count
+        self.count = count
+
+    @property
+    def sigma2(self) -> float:
+        """Mean of wr * (1 - wr), used by the confidence bounds"""
+        if self.count == 0:
+            return np.nan
+
+        return self.mean - self.mean**2 - self.m2 / self.count
+
+
+class WinrateAccumulator(BaseModel):
+    """Builds a Winrate from circuit win rates as they come in.
+
+    Each update is O(1), and accumulators of disjoint sets of circuits (e.g.
+    the jobs of a batch) can be merged. The state is a pydantic model, so it
+    can be stored with a partial experiment and updated when more jobs finish.
+
+        acc = WinrateAccumulator(shots=1000)
+        acc.add_results(first_job.results)
+        acc.add_results(second_job.results)
+        experiment.win_rate = acc.to_winrate(game)
+    """
+
+    shots: int
+    total: WinrateMoments = Field(default_factory=WinrateMoments)
+    questions: dict[str, WinrateMoments] = Field(default_factory=dict)
+    """Moments per question type, e.g. vertex and edge"""
+
+    def add(self, winrate: float, question: str | None = None):
+        self.total.add(winrate)
+        if question is not None:
+            self.questions.setdefault(question, WinrateMoments()).add(winrate)
+
+    def add_many(self, winrates: Iterable[float], question: str | None = None):
+        winrates = list(winrates)
+        self.total.add_many(winrates)
+        if question is not None:
+            self.questions.setdefault(question, WinrateMoments()).add_many(winrates)
+
+    def add_results(self, results: Iterable[CircuitResult]):
+        """Adds circuits, split into vertex (same query) and edge questions"""
+        by_question: dict[str, list[float]] = {}
+        for r in results:
+            question = "vertex" if len(set(r.circuit)) == 1 else "edge"
+            by_question.setdefault(question, []).append(r.win_rate)
+
+        for question, winrates in by_question.items():
+            self.add_many(winrates, question)
+
+    def merge(self, other: "WinrateAccumulator") -> "WinrateAccumulator":
+        if other.shots != self.shots:
+            raise ValueError(
+                f"Can't merge win rates with {self.shots} and {other.shots} shots"
+            )
+
+        merged = self.model_copy(deep=True)
+        merged.total.merge_from(other.total)
+        for question, moments in other.questions.items():
+            merged.questions.setdefault(question, WinrateMoments()).merge_from(moments)
+
+        return merged
+
+    def question_win_rates(self) -> dict[str, float]:
+        """Mean win rate per question type, e.g. {"vertex_win_rate": 0.98}"""
+        return {f"{q}_win_rate": m.mean for q, m in self.questions.items()}
+
+    def to_winrate(self, game: "NonlocalGame") -> Winrate:
+        """Same as Winrate.from_circuit_winrates with all circuits added so far"""
+        if self.total.count == 0:
+            raise ValueError("No circuit win rates were added")
+
+        m, mean, sigma2 = self.total.count, self.total.mean, self.total.sigma2
+        return Winrate(
+            value=mean,
+            ci95=uncertainty.ci_from_moments(m, sigma2, self.shots, d=0.05),
+            p_value=uncertainty.p_value_from_moments(
+                m, mean, sigma2, self.shots, game.optimal_classical_value
+            ),
+            var=sigma2,
+        )
+
+
 class NonlocalGame(BaseModel):
     """Abstractly represents a nonlocal game to be cross-referenced by data"""
 
-    id: UUID4 | Annotated[str, AfterValidator(lambda x: uuid.UUID(x, version=4))] = (
-        Field(default_factory=uuid.uuid4)
-    )
+    id: UUID4 = Field(default_factory=uuid.uuid4)
 
     name: str
     """Name of the nonlocal game"""
@@ -186,7 +355,7 @@ class NonlocalGame(BaseModel):
 
 
 class Experiment(BaseModel):
-    game_id: UUID4 | Annotated[str, AfterValidator(lambda x: uuid.UUID(x, version=4))]
+    game_id: UUID4
     """Game this experiment implemented"""
 
     date: datetime
@@ -207,3 +376,94 @@ class Experiment(BaseModel):
 
     objects: list[Object] = Field(default_factory=list)
     """Any extra associated files"""
+
+
+# Validating a whole table through one TypeAdapter runs in pydantic-core,
+# without building a validator per document
+_experiment_list = TypeAdapter(list[Experiment])
+
+
+@contextlib.contextmanager
+def _gc_paused():
+    # Bulk loads allocate many long-lived objects, which otherwise trigger
+    # repeated garbage collections that scan the whole table being built
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if enabled:
+            gc.enable()
+
+
+def validate_experiments(docs: Iterable[dict]) -> list[Experiment]:
+    """Validates a list of serialized experiments in one pass"""
+    with _gc_paused():
+        return _experiment_list.validate_python(list(docs))
+
+
+def validate_experiments_json(data: str | bytes) -> list[Experiment]:
+    """Validates a json array of experiments without parsing it to dicts first"""
+    with _gc_paused():
+        return _experiment_list.validate_json(data)
+
+
+def dump_experiments(experiments: list[Experiment]) -> list[dict]:
+    """Serializes experiments in one pass, same as model_dump(mode="json") on each"""
+    with _gc_paused():
+        return _experiment_list.dump_python(experiments, mode="json")
+
+
+def construct_experiments(docs: Iterable[dict]) -> list[Experiment]:
+    """Builds experiments from serialized data without validating it.
+
+    Only use this for trusted data read back from our own database, since
+    nothing is checked. Every model is built with ``model_construct``, and the
+    fields pydantic would coerce (uuid, dates, paths, urls) are converted.
+    Building the models runs in Python, so for whole tables
+    `validate_experiments` is as fast, see benchmarks/validation.py.
+    """
+    with _gc_paused():
+        return [_construct_experiment(doc) for doc in docs]
+
+
+def _construct_experiment(doc: dict) -> Experiment:
+    circuit_data = dict(doc["circuit_data"])
+    circuit_data["qasm_path"] = _path(circuit_data["qasm_path"])
+    circuit_data["result_path"] = _path(circuit_data["result_path"])
+    if circuit_data.get("metrics") is not None:
+        circuit_data["metrics"] = CircuitMetrics.model_construct(
+            **circuit_data["metrics"]
+        )
+
+    publication = doc.get("publication")
+    if publication is not None:
+        publication = Publication.model_construct(
+            citation=publication["citation"], url=_url(publication["url"])
+        )
+
+    return Experiment.model_construct(
+        game_id=uuid.UUID(doc["game_id"]),
+        date=datetime.fromisoformat(doc["date"]),
+        device=Device.model_construct(**doc["device"]),
+        win_rate=Winrate.model_construct(**doc["win_rate"]),
+        circuit_data=CircuitData.model_construct(**circuit_data),
+        publication=publication,
+        attributes=dict(doc.get("attributes", {})),
+        objects=[
+            Object.model_construct(**{**o, "path": _path(o["path"])})
+            for o in doc.get("objects", [])
+        ],
+    )
+
+
+# Paths and urls are immutable and heavily repeated across experiments, so
+# the same objects can be shared
+@functools.lru_cache(maxsize=4096)
+def _path(path: str) -> Path:
+    return Path(path)
+
+
+@functools.lru_cache(maxsize=256)
+def _url(url: str) -> HttpUrl:
+    return HttpUrl(url)
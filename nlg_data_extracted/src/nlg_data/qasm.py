@@ -0,0 +1,343 @@
+"""Minimal reader for the OpenQASM circuits of the games.
+
+Only the subset used by the game circuits is supported: qubit and bit
+registers, the standard gates with numeric parameters (including expressions
+of pi), barriers and measurements, in either OpenQASM 2 or 3 syntax. The
+physical qubits of OpenQASM 3, ``$0``, ``$1``..., which Qiskit exports
+transpiled circuits with, are qubits 0, 1... of the circuit. Custom gate
+definitions and classical control raise a ValueError.
+
+    circuit = load_qasm(Path("data/games/g14/circuits/4q/game_0_1.qasm"))
+    circuit.compact()  # only the qubits that are used, e.g. after transpiling
+
+Gate matrices use the order of the gate's arguments, the first argument being
+the most significant qubit, e.g. cx's control is the first.
+"""
+
+import ast
+import cmath
+import math
+import operator
+import re
+from dataclasses import dataclass, field
+from pathlib import Path
+
+import numpy as np
+
+
+@dataclass(frozen=True)
+class Instruction:
+    name: str
+    qubits: tuple[int, ...]
+    params: tuple[float, ...] = ()
+    clbits: tuple[int, ...] = ()
+
+
+@dataclass(frozen=True)
+class Circuit:
+    num_qubits: int
+    num_clbits: int
+    instructions: tuple[Instruction, ...] = field(default_factory=tuple)
+
+    @property
+    def gates(self) -> list[Instruction]:
+        return [i for i in self.instructions if i.name not in _non_gates]
+
+    @property
+    def measurements(self) -> dict[int, int]:
+        """Bit that each measured qubit is stored in"""
+        return {
+            i.qubits[0]: i.clbits[0] for i in self.instructions if i.name == "measure"
+        }
+
+    @property
+    def used_qubits(self) -> list[int]:
+        return sorted({q for i in self.instructions for q in i.qubits})
+
+    def compact(self) -> "Circuit":
+        """The same circuit on only the qubits that are used.
+
+        Transpiled circuits are defined on every qubit of the device, most of
+        which are idle.
+        """
+        index = {q: i for i, q in enumerate(self.used_qubits)}
+        return Circuit(
+            num_qubits=len(index),
+            num_clbits=self.num_clbits,
+            instructions=tuple(
+                Instruction(
+                    i.name, tuple(index[q] for q in i.qubits), i.params, i.clbits
+                )
+                for i in self.instructions
+            ),
+        )
+
+
+def load_qasm(file: Path) -> Circuit:
+    return parse_qasm(Path(file).read_text("utf-8"))
+
+
+def parse_qasm(text: str) -> Circuit:
+    text = re.sub(r"//[^\n]*", "", text)
+    text = re.sub(r"/\*.*?\*/", "", text, flags=re.S)
+
+    qregs: dict[str, tuple[int, int]] = {}
+    cregs: dict[str, tuple[int, int]] = {}
+    num_qubits = num_clbits = 0
+    physical = False
+    instructions = []
+
+    def qubit_operand(text: str) -> list[int]:
+        nonlocal num_qubits, physical
+        m = _physical.fullmatch(text.strip())
+        if m is None:
+            return _operand(text, qregs)
+        if qregs:
+            raise ValueError(f"Physical qubit used with registers in '{text}'")
+
+        # Physical qubits aren't declared, the circuit spans the largest one
+        physical = True
+        num_qubits = max(num_qubits, int(m[1]) + 1)
+        return [int(m[1])]
+
+    for statement in text.split(";"):
+        statement = " ".join(statement.split())
+        if not statement or statement.startswith(_skipped):
+            continue
+
+        if m := _register.fullmatch(statement):
+            kind, name, size = m[1], m[2], int(m[3])
+        elif m := _register3.fullmatch(statement):
+            kind, name, size = m[1], m[3], int(m[2] or 1)
+        else:
+            kind = None
+
+        if kind is not None:
+            if kind in ("qreg", "qubit"):
+                if physical:
+                    raise ValueError(
+                        f"Register declared after physical qubits in '{statement}'"
+                    )
+                qregs[name] = (num_qubits, size)
+                num_qubits += size
+            else:
+                cregs[name] = (num_clbits, size)
+                num_clbits += size
+            continue
+
+        if m := _measure.fullmatch(statement):
+            qubits, clbits = qubit_operand(m[1]), _operand(m[2], cregs)
+        elif m := _measure3.fullmatch(statement):
+            qubits, clbits = qubit_operand(m[2]), _operand(m[1], cregs)
+        else:
+            qubits = clbits = None
+
+        if qubits is not None:
+            if len(qubits) != len(clbits):
+                raise ValueError(f"Mismatched registers in '{statement}'")
+            instructions.extend(
+                Instruction("measure", (q,), clbits=(c,))
+                for q, c in zip(qubits, clbits)
+            )
+            continue
+
+        m = _gate.fullmatch(statement)
+        if m is None or m["name"] in ("gate", "if", "opaque", "def"):
+            raise ValueError(f"Unsupported statement '{statement}'")
+
+        name = m["name"].lower()
+        params = tuple(_evaluate(p) for p in _split_params(m["params"] or ""))
+        operands = [qubit_operand(arg) for arg in m["args"].split(",")]
+        if name == "barrier" or name == "reset":
+            instructions.append(
+                Instruction(name, tuple(q for o in operands for q in o))
+            )
+            continue
+
+        # Fail early on unknown gates
+        gate_matrix(name, params)
+
+        # A gate on whole registers is applied to each of their qubits
+        width = max(len(o) for o in operands)
+        for k in range(width):
+            qubits = tuple(o[k] if len(o) > 1 else o[0] for o in operands)
+            instructions.append(Instruction(name, qubits, params))
+
+    return Circuit(num_qubits, num_clbits, tuple(instructions))
+
+
+def gate_matrix(name: str, params: tuple[float, ...] = ()) -> np.ndarray:
+    """Unitary of a gate, with its first qubit the most significant"""
+    if name in _fixed_gates:
+        return _fixed_gates[name]
+    if name in _parametric_gates:
+        return _parametric_gates[name](*params)
+
+    raise ValueError(f"Unsupported gate '{name}'")
+
+
+_non_gates = ("measure", "barrier", "reset")
+_skipped = ("OPENQASM", "include")
+
+_register = re.compile(r"(qreg|creg) (\w+) ?\[ ?(\d+) ?\]")
+_register3 = re.compile(r"(qubit|bit) ?(?:\[ ?(\d+) ?\])? (\w+)")
+_measure = re.compile(r"measure (.+?) ?-> ?(.+)")
+_measure3 = re.compile(r"(.+?) ?= ?measure (.+)")
+_gate = re.compile(
+    r"(?P<name>\w+) ?(?:\((?P<params>(?:[^()]|\([^()]*\))*)\))? ?(?P<args>.+)"
+)
+_operand_pattern = re.compile(r"(\w+) ?(?:\[ ?(\d+) ?\])?")
+_physical = re.compile(r"\$(\d+)")
+
+
+def _operand(text: str, registers: dict[str, tuple[int, int]]) -> list[int]:
+    m = _operand_pattern.fullmatch(text.strip())
+    if m is None or m[1] not in registers:
+        raise ValueError(f"Unknown register in '{text}'")
+
+    start, size = registers[m[1]]
+    if m[2] is None:
+        return list(range(start, start + size))
+
+    index = int(m[2])
+    if index >= size:
+        raise ValueError(f"Index out of range in '{text}'")
+    return [start + index]
+
+
+def _split_params(text: str) -> list[str]:
+    params, depth, current = [], 0, ""
+    for char in text:
+        if char == "," and depth == 0:
+            params.append(current)
+            current = ""
+            continue
+        depth += {"(": 1, ")": -1}.get(char, 0)
+        current += char
+
+    return params + [current] if current.strip() else params
+
+
+_operators = {
+    ast.Add: operator.add,
+    ast.Sub: operator.sub,
+    ast.Mult: operator.mul,
+    ast.Div: operator.truediv,
+    ast.Pow: operator.pow,
+    ast.USub: operator.neg,
+    ast.UAdd: operator.pos,
+}
+_constants = {"pi": math.pi, "π": math.pi, "tau": math.tau, "euler": math.e}
+_functions = {"sin": math.sin, "cos": math.cos, "tan": math.tan, "sqrt": math.sqrt}
+
+
+def _evaluate(expression: str) -> float:
+    """Evaluates a numeric parameter such as -pi/2 without eval"""
+
+    def visit(node):
+        match node:
+            case ast.Expression(body=body):
+                return visit(body)
+            case ast.Constant(value=int() | float() as value):
+                return value
+            case ast.Name(id=name) if name in _constants:
+                return _constants[name]
+            case ast.BinOp(left=left, op=op, right=right) if type(op) in _operators:
+                return _operators[type(op)](visit(left), visit(right))
+            case ast.UnaryOp(op=op, operand=operand) if type(op) in _operators:
+                return _operators[type(op)](visit(operand))
+            case ast.Call(func=ast.Name(id=name), args=[arg]) if name in _functions:
+                return _functions[name](visit(arg))
+
+        raise ValueError(f"Unsupported parameter '{expression}'")
+
+    return float(visit(ast.parse(expression.strip(), mode="eval")))
+
+
+_i = np.eye(2, dtype=complex)
+_x = np.array([[0, 1], [1, 0]], dtype=complex)
+_y = np.array([[0, -1j], [1j, 0]], dtype=complex)
+_z = np.diag([1, -1]).astype(complex)
+_h = np.array([[1, 1], [1, -1]], dtype=complex) / math.sqrt(2)
+_sx = np.array([[1 + 1j, 1 - 1j], [1 - 1j, 1 + 1j]]) / 2
+
+
+def _controlled(u: np.ndarray) -> np.ndarray:
+    matrix = np.eye(4, dtype=complex)
+    matrix[2:, 2:] = u
+    return matrix
+
+
+def _rx(theta):
+    c, s = math.cos(theta / 2), math.sin(theta / 2)
+    return np.array([[c, -1j * s], [-1j * s, c]])
+
+
+def _ry(theta):
+    c, s = math.cos(theta / 2), math.sin(theta / 2)
+    return np.array([[c, -s], [s, c]], dtype=complex)
+
+
+def _rz(phi):
+    return np.diag([cmath.exp(-0.5j * phi), cmath.exp(0.5j * phi)])
+
+
+def _phase(lam):
+    return np.diag([1, cmath.exp(1j * lam)])
+
+
+def _u(theta, phi, lam):
+    c, s = math.cos(theta / 2), math.sin(theta / 2)
+    return np.array(
+        [
+            [c, -cmath.exp(1j * lam) * s],
+            [cmath.exp(1j * phi) * s, cmath.exp(1j * (phi + lam)) * c],
+        ]
+    )
+
+
+def _rzz(theta):
+    return np.diag(np.exp(-0.5j * theta * np.array([1, -1, -1, 1])))
+
+
+_fixed_gates = {
+    "id": _i,
+    "x": _x,
+    "y": _y,
+    "z": _z,
+    "h": _h,
+    "s": np.diag([1, 1j]),
+    "sdg": np.diag([1, -1j]),
+    "t": _phase(math.pi / 4),
+    "tdg": _phase(-math.pi / 4),
+    "sx": _sx,
+    "sxdg": _sx.conj().T,
+    "cx": _controlled(_x),
+    "cnot": _controlled(_x),
+    "cy": _controlled(_y),
+    "cz": _controlled(_z),
+    "ch": _controlled(_h),
+    "swap": np.eye(4, dtype=complex)[[0, 2, 1, 3]],
+    "iswap": np.array(
+        [[1, 0, 0, 0], [0, 0, 1j, 0], [0, 1j, 0, 0], [0, 0, 0, 1]], dtype=complex
+    ),
+    # Qiskit's (IX - XY) / sqrt(2) with its first qubit the least significant
+    "ecr": (np.kron(_x, _i) - np.kron(_y, _x)) / math.sqrt(2),
+}
+
+_parametric_gates = {
+    "rx": _rx,
+    "ry": _ry,
+    "rz": _rz,
+    "p": _phase,
+    "u1": _phase,
+    "u2": lambda phi, lam: _u(math.pi / 2, phi, lam),
+    "u3": _u,
+    "u": _u,
+    "crx": lambda theta: _controlled(_rx(theta)),
+    "cry": lambda theta: _controlled(_ry(theta)),
+    "crz": lambda phi: _controlled(_rz(phi)),
+    "cp": lambda lam: _controlled(_phase(lam)),
+    "cu1": lambda lam: _controlled(_phase(lam)),
+    "rzz": _rzz,
+}
@@ -0,0 +1,511 @@
+"""Upper bounds on the quantum value of graph coloring games from the NPA hierarchy.
+
+A quantum strategy for the coloring game of a graph (see `classical`) is a
+shared state and, for each vertex v, a projective measurement {E_va} of
+Alice and {F_vb} of Bob, with the colors as outcomes. The moment matrix of a
+strategy holds <w_i^† w_j> for a list of words w in these projectors, and is
+positive semidefinite. Relaxing a strategy to any PSD matrix with the same
+linear structure gives a semidefinite program whose value bounds the quantum
+value from above:
+
+    level 1     words 1, E_va and F_vb
+    level 1+AB  also E_va F_wb for every question (v, w) the referee asks
+
+Both drop the last color of each measurement, which is 1 minus the others.
+Products are only added for the questions of the game rather than all pairs
+of vertices, which is where the objective lives and keeps the matrix at
+1 + 2n(c-1) + |questions|(c-1)^2 rows.
+
+The program is kept small in three ways:
+
+* Entries equal as moments share one variable, e.g. <E_va E_va'> = 0 and
+  <E_va E_va> = <E_va>, and the matrix is taken real.
+* The game is invariant under the automorphisms of the graph, relabeling the
+  colors other than the last and swapping the players, so an optimal moment
+  matrix can be averaged over these. Moments in the same orbit then share one
+  variable.
+* Such a matrix commutes with every symmetry, so a basis adapted to a set of
+  commuting involutions among them splits it into blocks, and each block is
+  constrained PSD on its own. The basis vectors are sparse ±1 sums, so the
+  blocks stay sparse in the variables.
+
+    graph = load_graph(game, data_folder)
+    bound = quantum_bound(graph, colors=4, level="1+AB")
+    bound.value  # >= the quantum value
+    optimal_quantum_bound(game, data_folder)  # cached in data/quantum_bounds.json
+
+The SDP is solved with cvxpy's bundled open-source solvers (Clarabel or SCS),
+so the bound is only as tight as the solver's tolerance.
+"""
+
+import hashlib
+import itertools
+import json
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+import networkx as nx
+import numpy as np
+import scipy.sparse as sp
+from networkx.algorithms.isomorphism import GraphMatcher
+from scipy.sparse.csgraph import connected_components
+
+from .classical import load_graph
+
+if TYPE_CHECKING:
+    from .models import NonlocalGame
+
+levels = ("1", "1+AB")
+
+cache_file = Path("quantum_bounds.json")
+"""Location of the cached bounds relative to the data folder"""
+
+_version = 1
+"""Bumped when the relaxation changes, which invalidates the cache"""
+
+_none = -1
+"""Operator code of an empty slot in a word"""
+
+
+@dataclass(frozen=True)
+class QuantumBound:
+    value: float
+    """Upper bound on the winning probability"""
+
+    level: str
+
+    size: int
+    """Rows of the moment matrix"""
+
+    variables: int
+    """Free moments after the symmetry reduction"""
+
+    blocks: list[int] = field(default_factory=list)
+    """Sizes of the PSD blocks the moment matrix is split into"""
+
+
+def game_hash(graph: nx.Graph, colors: int, level: str) -> str:
+    """Identifies the SDP of a game, whatever the file or names it was read from"""
+    edges = sorted(tuple(sorted(map(str, e))) for e in graph.edges)
+    key = {
+        "nodes": sorted(map(str, graph)),
+        "edges": edges,
+        "colors": colors,
+        "level": level,
+        "version": _version,
+    }
+    return hashlib.sha256(json.dumps(key, sort_keys=True).encode()).hexdigest()
+
+
+def optimal_quantum_bound(
+    game: "NonlocalGame",
+    data_folder: Path,
+    colors: int = 4,
+    level: str = "1+AB",
+    **kwargs,
+) -> float:
+    """Bound on the quantum value of a graph coloring game, read from its graph
+    object. Bounds are cached by game hash in data/quantum_bounds.json"""
+    graph = load_graph(game, data_folder)
+    key = game_hash(graph, colors, level)
+    file = data_folder / cache_file
+    try:
+        cache = json.loads(file.read_text("utf-8"))
+    except FileNotFoundError:
+        cache = {}
+
+    if key not in cache:
+        bound = quantum_bound(graph, colors, level, **kwargs)
+        cache[key] = {"game": game.name, "colors": colors, **asdict(bound)}
+        tmp_file = file.with_suffix(".tmp")
+        tmp_file.write_text(json.dumps(cache, indent=4, sort_keys=True), "utf-8")
+        tmp_file.replace(file)
+
+    return cache[key]["value"]
+
+
+def quantum_bound(
+    graph: nx.Graph,
+    colors: int = 4,
+    level: str = "1+AB",
+    symmetric: bool = True,
+    max_automorphisms: int = 1000,
+    solver=None,
+    **kwargs,
+) -> QuantumBound:
+    """Solves the NPA relaxation of the coloring game of a graph.
+
+    Args:
+        colors: Number of colors, i.e. answers, of each player.
+        level: "1" or "1+AB".
+        symmetric: Reduce the program with the symmetries of the game.
+        max_automorphisms: Graph automorphisms used at most. Fewer only give
+            a smaller reduction, never a wrong bound.
+        solver: cvxpy solver, by default the one cvxpy picks.
+        **kwargs: Passed to cvxpy's solve.
+    """
+    import cvxpy as cp
+
+    sdp = build_sdp(graph, colors, level, symmetric, max_automorphisms)
+    y = cp.Variable(sdp.variables)
+    constraints = [y[sdp.identity] == 1]
+    for size, coefficients in sdp.blocks:
+        matrix = cp.reshape(coefficients @ y, (size, size), order="C")
+        # The blocks are symmetric by construction, this only tells cvxpy
+        constraints.append((matrix + matrix.T) / 2 >> 0)
+
+    problem = cp.Problem(cp.Maximize(sdp.objective @ y), constraints)
+    problem.solve(solver=solver, **kwargs)
+    if problem.status not in (cp.OPTIMAL, cp.OPTIMAL_INACCURATE):
+        raise RuntimeError(f"SDP solver finished with status {problem.status}")
+
+    return QuantumBound(
+        value=float(problem.value),
+        level=level,
+        size=sdp.size,
+        variables=sdp.variables,
+        blocks=[size for size, _ in sdp.blocks],
+    )
+
+
+@dataclass
+class SDP:
+    """Maximize objective @ y, with y[identity] = 1 and every block PSD"""
+
+    size: int
+    """Rows of the moment matrix"""
+
+    variables: int
+
+    identity: int
+    """Variable of the moment <1>"""
+
+    objective: np.ndarray
+
+    blocks: list[tuple[int, sp.csr_array]]
+    """Size of each block and the map from y to its entries, row by row"""
+
+
+def build_sdp(
+    graph: nx.Graph,
+    colors: int = 4,
+    level: str = "1+AB",
+    symmetric: bool = True,
+    max_automorphisms: int = 1000,
+) -> SDP:
+    """The NPA relaxation of the coloring game of a graph, without solving it"""
+    if level not in levels:
+        raise ValueError(f"Unknown level {level!r}, expected one of {levels}")
+    if colors < 2:
+        raise ValueError("The game needs at least 2 colors")
+
+    moments = _Moments(graph, colors, level)
+    if symmetric:
+        symmetries = _symmetries(graph, colors, max_automorphisms)
+        involutions = _commuting_involutions(graph, colors, symmetries)
+    else:
+        symmetries = involutions = []
+
+    # Moments in the same orbit share one variable
+    variable = moments.orbits([moments.label_action(s) for s in symmetries])
+    variables = variable.max() + 1
+    objective = np.zeros(variables)
+    np.add.at(objective, variable[moments.objective_labels], moments.objective)
+    blocks = [
+        (len(words), _block_coefficients(moments, variable, variables, words, *rest))
+        for words, *rest in _adapted_basis(
+            [moments.word_action(s) for s in involutions], moments.size
+        )
+    ]
+
+    return SDP(
+        size=moments.size,
+        variables=int(variables),
+        identity=int(variable[moments.identity]),
+        objective=objective,
+        blocks=blocks,
+    )
+
+
+class _Moments:
+    """Words of the moment matrix and the moment each entry is equal to.
+
+    A projector E_va or F_va is coded as v * (colors - 1) + a. A word is one
+    Alice and one Bob slot, and a moment two of each, since Alice's and Bob's
+    operators commute: <w_i^† w_j> = <(a_i^† a_j)(b_i^† b_j)>.
+    """
+
+    def __init__(self, graph: nx.Graph, colors: int, level: str):
+        self.vertices = list(graph)
+        index = {v: i for i, v in enumerate(self.vertices)}
+        n = len(self.vertices)
+        self.answers = colors - 1
+        self.base = n * self.answers + 1
+
+        projectors = np.arange(n * self.answers)
+        none = np.full_like(projectors, _none)
+        alice = [np.array([_none]), projectors, none]
+        bob = [np.array([_none]), none, projectors]
+        self.questions = [(index[v], index[v]) for v in graph] + [
+            q
+            for u, v in graph.edges
+            for q in ((index[u], index[v]), (index[v], index[u]))
+        ]
+        if level == "1+AB":
+            a, b = np.meshgrid(np.arange(self.answers), np.arange(self.answers))
+            for v, w in self.questions:
+                alice.append(v * self.answers + a.ravel())
+                bob.append(w * self.answers + b.ravel())
+
+        self.alice = np.concatenate(alice)
+        self.bob = np.concatenate(bob)
+        self.size = len(self.alice)
+
+        # The moment of every entry, -1 where the product is 0
+        i, j = np.triu_indices(self.size)
+        a1, a2, a_zero = self._product(self.alice[i], self.alice[j])
+        b1, b2, b_zero = self._product(self.bob[i], self.bob[j])
+        keys = self._key(a1, a2, b1, b2)
+        nonzero = ~(a_zero | b_zero)
+        self.keys, label = np.unique(keys[nonzero], return_inverse=True)
+        self.labels = np.full((self.size, self.size), -1, dtype=np.int64)
+        self.labels[i[nonzero], j[nonzero]] = label
+        self.labels[j[nonzero], i[nonzero]] = label
+        self.identity = self._find(self._key(*[np.array([_none])] * 4))[0]
+
+        self.objective_labels, self.objective = self._objective()
+
+    def _product(self, x: np.ndarray, y: np.ndarray):
+        """Reduces the word x^† y of one player to at most two projectors"""
+        first = np.where(x == _none, y, x)
+        second = np.where((x == _none) | (x == y), _none, y)
+        # Different answers to the same question are orthogonal
+        zero = (second != _none) & (first // self.answers == second // self.answers)
+        return first, second, zero
+
+    def _key(self, a1, a2, b1, b2) -> np.ndarray:
+        """Integer code of a moment, the same for a word and its adjoint"""
+
+        def code(a1, a2, b1, b2):
+            alice = (a1 + 1) * self.base + a2 + 1
+            bob = (b1 + 1) * self.base + b2 + 1
+            return alice * self.base**2 + bob
+
+        # The adjoint reverses the words of a pair of projectors
+        a_rev = np.where(a2 == _none, a1, a2), np.where(a2 == _none, a2, a1)
+        b_rev = np.where(b2 == _none, b1, b2), np.where(b2 == _none, b2, b1)
+        return np.minimum(code(a1, a2, b1, b2), code(*a_rev, *b_rev))
+
+    def _decode(self, keys: np.ndarray):
+        alice, bob = np.divmod(keys, self.base**2)
+        a1, a2 = np.divmod(alice, self.base)
+        b1, b2 = np.divmod(bob, self.base)
+        return a1 - 1, a2 - 1, b1 - 1, b2 - 1
+
+    def _find(self, keys: np.ndarray) -> np.ndarray:
+        index = np.searchsorted(self.keys, keys)
+        if np.any(index >= len(self.keys)) or np.any(self.keys[index] != keys):
+            raise ValueError("Moment missing from the moment matrix")
+        return index
+
+    def _objective(self) -> tuple[np.ndarray, np.ndarray]:
+        """Winning probability as coefficients of moments"""
+        m = self.answers
+        terms: dict[tuple, float] = {}
+
+        def add(alice: int, bob: int, coefficient: float):
+            key = (alice, _none, bob, _none)
+            terms[key] = terms.get(key, 0.0) + coefficient
+
+        # Each question adds sum_a p(a, a | v, w) if it's a vertex, or 1 minus
+        # it if it's an edge. The last color is 1 minus the others, so
+        # p(last, last) = 1 - <E_v> - <F_w> + <E_v F_w> summed over the others
+        for v, w in self.questions:
+            sign = 1.0 if v == w else -1.0
+            if v != w:
+                add(_none, _none, 1.0)
+            add(_none, _none, sign)
+            for a in range(m):
+                add(v * m + a, w * m + a, sign)
+                add(v * m + a, _none, -sign)
+                add(_none, w * m + a, -sign)
+                for b in range(m):
+                    add(v * m + a, w * m + b, sign)
+
+        keys = np.array([self._key(*map(np.array, key)) for key in terms]).ravel()
+        coefficients = np.array(list(terms.values())) / len(self.questions)
+        return self._find(keys), coefficients
+
+    def label_action(self, symmetry: tuple) -> np.ndarray:
+        """Moment each moment is mapped to by a symmetry"""
+        a1, a2, b1, b2 = self._decode(self.keys)
+        operators = _operator_map(symmetry, len(self.vertices), self.answers)
+        a1, a2, b1, b2 = (
+            np.where(o == _none, _none, operators[o]) for o in (a1, a2, b1, b2)
+        )
+        if symmetry[2]:
+            a1, a2, b1, b2 = b1, b2, a1, a2
+        return self._find(self._key(a1, a2, b1, b2))
+
+    def word_action(self, symmetry: tuple) -> np.ndarray:
+        """Word each word is mapped to by a symmetry, as a permutation"""
+        operators = _operator_map(symmetry, len(self.vertices), self.answers)
+        alice = np.where(self.alice == _none, _none, operators[self.alice])
+        bob = np.where(self.bob == _none, _none, operators[self.bob])
+        if symmetry[2]:
+            alice, bob = bob, alice
+
+        words = (self.alice + 1) * self.base + self.bob + 1
+        order = np.argsort(words)
+        index = np.searchsorted(words, (alice + 1) * self.base + bob + 1, sorter=order)
+        return order[index]
+
+    def orbits(self, actions: list[np.ndarray]) -> np.ndarray:
+        """Variable of every moment, one per orbit of the symmetries"""
+        count = len(self.keys)
+        if not actions:
+            return np.arange(count)
+
+        rows = np.tile(np.arange(count), len(actions))
+        cols = np.concatenate(actions)
+        adjacency = sp.coo_array(
+            (np.ones(len(rows)), (rows, cols)), shape=(count, count)
+        )
+        _, orbit = connected_components(adjacency, directed=False)
+        return orbit
+
+
+def _operator_map(symmetry: tuple, n: int, answers: int) -> np.ndarray:
+    vertices, colors, _ = symmetry
+    v, a = np.divmod(np.arange(n * answers), answers)
+    return np.asarray(vertices)[v] * answers + np.asarray(colors)[a]
+
+
+def _symmetries(graph: nx.Graph, colors: int, max_automorphisms: int) -> list:
+    """Generators of the symmetries as (vertex permutation, color permutation,
+    swap players). The last color is fixed, since it's not a variable"""
+    index = {v: i for i, v in enumerate(graph)}
+    n, answers = len(index), colors - 1
+    identity_vertices = list(range(n))
+    identity_colors = list(range(answers))
+
+    symmetries = [(identity_vertices, identity_colors, True)]
+    if answers >= 2:
+        transposition = [1, 0] + identity_colors[2:]
+        cycle = identity_colors[1:] + [0]
+        symmetries += [
+            (identity_vertices, transposition, False),
+            (identity_vertices, cycle, False),
+        ]
+
+    for automorphism in itertools.islice(
+        GraphMatcher(graph, graph).isomorphisms_iter(), max_automorphisms
+    ):
+        permutation = [index[automorphism[v]] for v in graph]
+        if permutation != identity_vertices:
+            symmetries.append((permutation, identity_colors, False))
+
+    return symmetries
+
+
+def _commuting_involutions(graph: nx.Graph, colors: int, symmetries: list) -> list:
+    """Independent symmetries of order 2 that commute with each other"""
+    n, answers = len(graph), colors - 1
+    identity_vertices = list(range(n))
+    identity_colors = list(range(answers))
+
+    # Swapping the players and disjoint color transpositions commute with all
+    involutions = [(identity_vertices, identity_colors, True)]
+    for a in range(0, answers - 1, 2):
+        transposition = list(identity_colors)
+        transposition[a], transposition[a + 1] = a + 1, a
+        involutions.append((identity_vertices, transposition, False))
+
+    # Graph automorphisms that commute with the ones already chosen
+    group = {tuple(identity_vertices)}
+    chosen = []
+    for vertices, _, _ in symmetries:
+        p = np.array(vertices)
+        if tuple(p) in group or not np.array_equal(p[p], np.arange(n)):
+            continue
+        if all(np.array_equal(p[q], q[p]) for q in chosen):
+            chosen.append(p)
+            group |= {tuple(p[np.array(g)]) for g in group}
+            involutions.append((vertices, identity_colors, False))
+
+    return involutions
+
+
+def _adapted_basis(generators: list[np.ndarray], size: int):
+    """Splits the words into blocks with a basis adapted to a group of
+    commuting involutions, given as permutations of the words.
+
+    Every element h of the group is a product of generators, coded as a
+    bitmask, and so is every character chi, with chi(h) = (-1)^|chi & h|. For
+    each orbit of words, sum_h chi(h) e_{h w} is a basis vector of block chi
+    unless it cancels, which happens when chi isn't 1 on the stabilizer of w.
+
+    Yields, for each block, the representative word of each basis vector, the
+    character, the permutation of every element and the stabilizer size.
+    """
+    m = len(generators)
+    elements = [np.arange(size)]
+    for generator in generators:
+        elements += [generator[e] for e in elements]
+
+    # Orbit of every word, represented by its smallest word
+    images = np.stack(elements)
+    representative = images.min(axis=0)
+    words = np.flatnonzero(representative == np.arange(size))
+    stabilizers = [np.flatnonzero(images[:, w] == w) for w in words]
+
+    parity = np.array(
+        [[bin(c & h).count("1") % 2 for h in range(2**m)] for c in range(2**m)]
+    )
+    for character in range(2**m):
+        block = [
+            (w, len(s))
+            for w, s in zip(words, stabilizers)
+            if not parity[character, s].any()
+        ]
+        if block:
+            yield (
+                np.array([w for w, _ in block]),
+                1 - 2 * parity[character],
+                images,
+                np.array([s for _, s in block]),
+            )
+
+
+def _block_coefficients(
+    moments: _Moments,
+    variable: np.ndarray,
+    variables: int,
+    words: np.ndarray,
+    signs: np.ndarray,
+    images: np.ndarray,
+    stabilizers: np.ndarray,
+) -> sp.csr_array:
+    """Map from the variables to the entries of a block, row by row.
+
+    With v_p = sum_h chi(h) e_{h w_p} normalized, and the moment matrix M
+    invariant under the group, entry (p, q) of the block is
+    sum_h chi(h) M[w_p, h w_q] / sqrt(|stab p| |stab q|).
+    """
+    size = len(words)
+    scale = 1 / np.sqrt(np.outer(stabilizers, stabilizers)).ravel()
+    entries = np.arange(size * size)
+    rows, cols, data = [], [], []
+    for sign, image in zip(signs, images):
+        labels = moments.labels[words[:, None], image[words][None, :]].ravel()
+        nonzero = labels >= 0
+        rows.append(entries[nonzero])
+        cols.append(variable[labels[nonzero]])
+        data.append(sign * scale[nonzero])
+
+    # Duplicate entries are summed
+    return sp.csr_array(
+        (np.concatenate(data), (np.concatenate(rows), np.concatenate(cols))),
+        shape=(size * size, variables),
+    )
@@ -0,0 +1,196 @@
+"""Anytime-valid tests of quantum advantage, to decide when to stop taking shots.
+
+`uncertainty.calculate_p_value` is only valid for a sample size fixed in
+advance. Checking it after every job and stopping once it is small enough
+inflates the error rate. Here, the Bernstein interval of `calculate_ci` is
+spent over time instead. After t shots in total, the interval uses
+delta_t = delta / (t * (t + 1)). These sum to delta over all t, so the
+intervals hold simultaneously for every t with probability 1 - delta. The
+win rate can then be checked as often as we like, and sampling can stop as
+soon as the interval excludes the classical value.
+
+All functions take arrays, one element per experiment, so the whole database
+can be evaluated at once:
+
+    from nlg_data import sequential
+
+    report = sequential.planning_report(experiments, games)
+    report[report.decision == "undecided"]
+
+An experiment that is still running can be planned from its accumulator:
+
+    sequential.plan(acc.total.mean, acc.total.sigma2, acc.total.count,
+                    acc.shots, game.optimal_classical_value)
+"""
+
+from typing import TYPE_CHECKING, Iterable
+
+import numpy as np
+
+from . import uncertainty
+from .models import Experiment, NonlocalGame
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+ADVANTAGE = "advantage"
+"""The win rate is above the classical value"""
+
+NO_ADVANTAGE = "no advantage"
+"""The win rate is below the classical value"""
+
+UNDECIDED = "undecided"
+
+max_shots = 10**9
+"""Largest number of shots per circuit considered when planning"""
+
+max_repetitions = 10**6
+"""Largest number of repetitions of the circuits considered when planning"""
+
+
+def radius(circuits, shots, sigma2, delta: float = 0.05) -> np.ndarray:
+    """Half-width of the confidence sequence after circuits * shots shots"""
+    circuits = np.asarray(circuits, dtype=np.float64)
+    shots = np.asarray(shots, dtype=np.float64)
+    t = circuits * shots
+    return uncertainty.ci_from_moments(circuits, sigma2, shots, d=delta / (t * (t + 1)))
+
+
+def confidence_sequence(
+    mean, sigma2, circuits, shots, delta: float = 0.05
+) -> tuple[np.ndarray, np.ndarray]:
+    """Lower and upper bounds on the win rate, valid at any stopping time"""
+    r = radius(circuits, shots, sigma2, delta)
+    return np.asarray(mean) - r, np.asarray(mean) + r
+
+
+def decide(mean, sigma2, circuits, shots, omega_c, delta: float = 0.05) -> np.ndarray:
+    """Whether each experiment shows an advantage, shows none, or is undecided"""
+    lower, upper = confidence_sequence(mean, sigma2, circuits, shots, delta)
+    return np.select(
+        [lower > omega_c, upper < omega_c], [ADVANTAGE, NO_ADVANTAGE], UNDECIDED
+    )
+
+
+def shots_needed(mean, sigma2, circuits, shots, omega_c, delta=0.05) -> np.ndarray:
+    """Shots per circuit after which the current estimates would be decided.
+
+    Assumes the mean and sigma2 stay as they are. Returns inf when more than
+    max_shots would be needed, e.g. when the mean equals the classical value.
+    """
+    mean, sigma2, circuits, shots, omega_c = np.broadcast_arrays(
+        *(
+            np.asarray(x, dtype=np.float64)
+            for x in (mean, sigma2, circuits, shots, omega_c)
+        )
+    )
+    gap = np.abs(mean - omega_c)
+
+    def decided(n):
+        return radius(circuits, n, sigma2, delta) < gap
+
+    # The radius decreases with the shots, so bisect on the smallest decided n
+    lo = np.maximum(shots, 1.0)
+    hi = np.full_like(lo, max_shots)
+    done = decided(lo)
+    feasible = decided(hi)
+    lo = np.where(done | ~feasible, hi, lo)
+    while (todo := hi - lo > 1).any():
+        mid = np.floor((lo + hi) / 2)
+        ok = decided(mid)
+        hi = np.where(todo & ok, mid, hi)
+        lo = np.where(todo & ~ok, mid, lo)
+
+    return np.select([done, feasible], [shots, hi], np.inf)
+
+
+def repetitions_needed(
+    mean, sigma2, circuits, shots, omega_c, delta=0.05
+) -> np.ndarray:
+    """Times the circuits must be run in total, at the same shots, to decide.
+
+    Repeating circuits doesn't reduce the 1 / shots term of the radius, so
+    some experiments can't be decided this way and get inf.
+    """
+    mean, sigma2, circuits, shots, omega_c = np.broadcast_arrays(
+        *(
+            np.asarray(x, dtype=np.float64)
+            for x in (mean, sigma2, circuits, shots, omega_c)
+        )
+    )
+    gap = np.abs(mean - omega_c)
+
+    def decided(r):
+        return radius(r * circuits, shots, sigma2, delta) < gap
+
+    # The radius first decreases with the repetitions and then grows slowly
+    # through delta_t, so look for the first decided point on a geometric grid
+    # and bisect between it and the grid point before
+    grid = np.unique(np.round(np.geomspace(1, max_repetitions, 400)))
+    ok = decided(grid[:, None])
+    feasible = ok.any(axis=0)
+    first = ok.argmax(axis=0)
+    hi = grid[first]
+    lo = np.where(feasible & (first > 0), grid[first - 1], hi)
+    while (todo := hi - lo > 1).any():
+        mid = np.floor((lo + hi) / 2)
+        ok = decided(mid)
+        hi = np.where(todo & ok, mid, hi)
+        lo = np.where(todo & ~ok, mid, lo)
+
+    return np.where(feasible, hi, np.inf)
+
+
+def plan(mean, sigma2, circuits, shots, omega_c, delta=0.05) -> dict[str, np.ndarray]:
+    """Decision and the remaining effort for each experiment"""
+    lower, upper = confidence_sequence(mean, sigma2, circuits, shots, delta)
+    needed = shots_needed(mean, sigma2, circuits, shots, omega_c, delta)
+    return {
+        "lower": lower,
+        "upper": upper,
+        "decision": decide(mean, sigma2, circuits, shots, omega_c, delta),
+        "shots_needed": needed,
+        "additional_shots": np.asarray(circuits) * (needed - np.asarray(shots)),
+        "repetitions_needed": repetitions_needed(
+            mean, sigma2, circuits, shots, omega_c, delta
+        ),
+    }
+
+
+def planning_report(
+    experiments: Iterable[Experiment],
+    games: Iterable[NonlocalGame],
+    delta: float = 0.05,
+) -> "pd.DataFrame":
+    """Plans every experiment from the win rates stored in the database.
+
+    Uses the mean and the var (mean of wr * (1 - wr)) of each experiment's
+    win rate, so the histograms aren't needed. Shots needed is per circuit,
+    and additional shots is the total over the circuits.
+    """
+    import pandas as pd
+
+    omega_c = {game.id: game.optimal_classical_value for game in games}
+    experiments = list(experiments)
+    df = pd.DataFrame(
+        {
+            "provider": [e.device.provider for e in experiments],
+            "device": [e.device.name for e in experiments],
+            "strategy": [e.circuit_data.strategy for e in experiments],
+            "date": [e.date for e in experiments],
+            "circuits": [e.circuit_data.num_circuits for e in experiments],
+            "shots": [e.circuit_data.shots for e in experiments],
+            "win_rate": [e.win_rate.value for e in experiments],
+            "sigma2": [e.win_rate.var for e in experiments],
+            "omega_c": [omega_c[e.game_id] for e in experiments],
+        }
+    )
+    planned = plan(
+        df["win_rate"].to_numpy(),
+        df["sigma2"].to_numpy(),
+        df["circuits"].to_numpy(),
+        df["shots"].to_numpy(),
+        df["omega_c"].to_numpy(),
+        delta,
+    )
+    return df.assign(**planned)
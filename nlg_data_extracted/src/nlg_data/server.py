@@ -0,0 +1,476 @@
+"""Local, read-only HTTP server over the database, for dashboards and notebooks.
+
+    nlg-data serve --port 8000
+
+    GET /experiments?device=sherbrooke&strategy=4q&sort=-win_rate&limit=50
+    GET /experiments/12
+    GET /experiments/12/histograms?offset=40&limit=20
+    GET /summary?group_by=device&since=2024-01-01
+    GET /leaderboard/best_device
+
+Listings and the summary take the filters of `SourceFilter` (since, until,
+device and strategy, which may be repeated) plus provider and min_win_rate.
+Listings and histograms are paginated with offset and limit, and reply with
+the total so clients know how many pages there are.
+
+Responses are JSON, gzipped when the client accepts it, and carry an ETag
+that If-None-Match revalidates. Rendered responses are kept in an LRU cache
+keyed by the request and the state of db.json, the counts store and the
+leaderboard views, so a repeated query is served from memory, and rebuilding
+the database invalidates the cache. The table is reloaded when it changes.
+
+The server only uses asyncio streams from the standard library, and speaks
+enough HTTP/1.1 for browsers and notebooks on the same machine. It is not
+meant to face the internet.
+"""
+
+import asyncio
+import gzip
+import hashlib
+import json
+import logging
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from datetime import datetime
+from http import HTTPStatus
+from pathlib import Path
+from urllib.parse import parse_qs, urlsplit
+
+from tinydb import TinyDB
+
+from .counts_store import CountsStore, pointer_file
+from .counts_store import store_folder as counts_folder
+from .create_database import counts_file
+from .ingest.adapter import SourceFilter, parse_until
+from .leaderboard import LeaderboardViews, views_file
+
+logger = logging.getLogger(__name__)
+
+default_limit = 100
+max_limit = 1000
+"""Largest page a client can ask for"""
+
+gzip_min_bytes = 1024
+"""Smaller responses aren't worth compressing"""
+
+_groups = {
+    "provider": lambda doc: doc["device"]["provider"],
+    "device": lambda doc: f"{doc['device']['provider']}/{doc['device']['name']}",
+    "strategy": lambda doc: doc["circuit_data"]["strategy"],
+    "year": lambda doc: doc["date"][:4],
+}
+"""Groups of the summary endpoint"""
+
+_sort_keys = {
+    "date": lambda doc: doc["date"],
+    "win_rate": lambda doc: doc["win_rate"]["value"],
+    "shots": lambda doc: doc["circuit_data"]["shots"],
+    "id": lambda doc: doc["id"],
+}
+
+
+class HttpError(Exception):
+    def __init__(self, status: HTTPStatus, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+@dataclass(frozen=True)
+class Request:
+    method: str
+    path: str
+    query: dict[str, list[str]]
+    headers: dict[str, str]
+    """Header values by lowercase name"""
+
+    @property
+    def keep_alive(self) -> bool:
+        return self.headers.get("connection", "").lower() != "close"
+
+    def accepts_gzip(self) -> bool:
+        encodings = self.headers.get("accept-encoding", "")
+        return "gzip" in {e.split(";")[0].strip() for e in encodings.split(",")}
+
+    def param(self, name: str, default: str | None = None) -> str | None:
+        values = self.query.get(name)
+        return values[-1] if values else default
+
+    def int_param(self, name: str, default: int, maximum: int | None = None) -> int:
+        value = self.param(name)
+        try:
+            value = default if value is None else int(value)
+        except ValueError:
+            raise HttpError(HTTPStatus.BAD_REQUEST, f"{name} must be an integer")
+
+        if value < 0:
+            raise HttpError(HTTPStatus.BAD_REQUEST, f"{name} must not be negative")
+        return value if maximum is None else min(value, maximum)
+
+
+@dataclass
+class CachedResponse:
+    body: bytes
+    etag: str
+    gzipped: bytes | None = None
+    """Compressed body, made the first time a client accepts it"""
+
+    @classmethod
+    def render(cls, data) -> "CachedResponse":
+        body = json.dumps(data, separators=(",", ":")).encode()
+        # Weak, since the same tag is sent for the gzipped body
+        return cls(body, f'W/"{hashlib.sha256(body).hexdigest()[:32]}"')
+
+    @property
+    def size(self) -> int:
+        return len(self.body) + len(self.gzipped or b"")
+
+    def encoded(self, use_gzip: bool) -> tuple[bytes, str | None]:
+        if not use_gzip or len(self.body) < gzip_min_bytes:
+            return self.body, None
+
+        if self.gzipped is None:
+            self.gzipped = gzip.compress(self.body, compresslevel=6, mtime=0)
+        return self.gzipped, "gzip"
+
+
+@dataclass
+class ResponseCache:
+    """LRU cache of rendered responses, bounded by their total size"""
+
+    max_bytes: int = 64 * 2**20
+    entries: OrderedDict[tuple, CachedResponse] = field(default_factory=OrderedDict)
+    size: int = 0
+    hits: int = 0
+    misses: int = 0
+
+    def get(self, key: tuple) -> CachedResponse | None:
+        response = self.entries.get(key)
+        if response is None:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        self.entries.move_to_end(key)
+        return response
+
+    def put(self, key: tuple, response: CachedResponse):
+        if key in self.entries:
+            self.size -= self.entries.pop(key).size
+        self.entries[key] = response
+        self.size += response.size
+        self.evict()
+
+    def evict(self):
+        """Drops the least recently used responses until the cache fits. Called
+        again when a cached body gets gzipped, which grows it"""
+        while self.size > self.max_bytes and len(self.entries) > 1:
+            _, response = self.entries.popitem(last=False)
+            self.size -= response.size
+
+    def clear(self):
+        self.entries.clear()
+        self.size = 0
+
+
+@dataclass
+class Store:
+    """Read-only view of the experiments table and their histograms, reloaded
+    when db.json, the counts store or the leaderboard views change"""
+
+    data_folder: Path
+    state: tuple = ()
+    experiments: list[dict] = field(default_factory=list)
+    by_id: dict[int, dict] = field(default_factory=dict)
+    counts: CountsStore | None = None
+    views: LeaderboardViews = field(default_factory=LeaderboardViews)
+
+    def refresh(self) -> bool:
+        """Reloads if the files changed since the last load, in which case it
+        returns True. Checking costs a couple of stat calls"""
+        state = tuple(
+            _file_state(self.data_folder / file)
+            for file in ("db.json", counts_folder / pointer_file, views_file)
+        )
+        if state == self.state:
+            return False
+
+        db = TinyDB(self.data_folder / "db.json", access_mode="r")
+        try:
+            table = db.table("experiments")
+            self.experiments = [{"id": doc.doc_id, **doc} for doc in table.all()]
+            # views.json is derived and may be missing, e.g. on a fresh
+            # checkout, in which case the views are built from the table
+            self.views = LeaderboardViews.load(self.data_folder, table)
+        finally:
+            db.close()
+
+        self.by_id = {doc["id"]: doc for doc in self.experiments}
+        self.counts = CountsStore.load(self.data_folder) if state[1] else None
+        self.state = state
+        logger.info("Loaded %d experiments", len(self.experiments))
+        return True
+
+    def histograms(self, doc_id: int) -> list[dict]:
+        """Circuit results of an experiment, as stored in its counts file"""
+        if self.counts is not None:
+            try:
+                experiment = self.counts.experiment(doc_id)
+            except KeyError:
+                pass
+            else:
+                # Same layout as the counts files, which pydantic serializes
+                # tuple keys into
+                return json.loads(experiment.to_result().model_dump_json())["results"]
+
+        file = counts_file(self.data_folder, doc_id)
+        if not file.exists():
+            raise HttpError(HTTPStatus.NOT_FOUND, f"Experiment {doc_id} has no counts")
+        return json.loads(file.read_text("utf-8"))["results"]
+
+
+class Server:
+    def __init__(self, data_folder: Path, cache_bytes: int = 64 * 2**20):
+        self.store = Store(data_folder)
+        self.cache = ResponseCache(cache_bytes)
+        self.routes = {
+            "experiments": self.experiments,
+            "summary": self.summary,
+            "leaderboard": self.leaderboard,
+        }
+
+    async def serve(self, host: str = "127.0.0.1", port: int = 8000):
+        self.store.refresh()
+        server = await asyncio.start_server(self.handle, host, port)
+        logger.info("Serving %s on http://%s:%d", self.store.data_folder, host, port)
+        async with server:
+            await server.serve_forever()
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while (request := await _read_request(reader)) is not None:
+                writer.write(self.respond(request))
+                await writer.drain()
+                if not request.keep_alive:
+                    break
+        except (
+            ConnectionError,
+            asyncio.IncompleteReadError,
+            asyncio.LimitOverrunError,
+        ):
+            pass
+        finally:
+            writer.close()
+
+    def respond(self, request: Request) -> bytes:
+        """Full HTTP response to a request"""
+        try:
+            if request.method not in {"GET", "HEAD"}:
+                raise HttpError(
+                    HTTPStatus.METHOD_NOT_ALLOWED, "The server is read-only"
+                )
+
+            response = self.cached(request)
+        except HttpError as e:
+            return _error(e.status, str(e))
+        except Exception as e:
+            logger.error("Failed to answer %s", request.path, exc_info=e)
+            return _error(HTTPStatus.INTERNAL_SERVER_ERROR, repr(e))
+
+        headers = {
+            "Content-Type": "application/json",
+            "ETag": response.etag,
+            "Cache-Control": "no-cache",
+            "Vary": "Accept-Encoding",
+        }
+        etags = _etags(request.headers.get("if-none-match", ""))
+        if response.etag in etags or "*" in etags:
+            return _format(HTTPStatus.NOT_MODIFIED, headers, b"")
+
+        before = response.size
+        body, encoding = response.encoded(request.accepts_gzip())
+        if response.size != before:
+            self.cache.size += response.size - before
+            self.cache.evict()
+        if encoding is not None:
+            headers["Content-Encoding"] = encoding
+
+        headers["Content-Length"] = str(len(body))
+        return _format(
+            HTTPStatus.OK, headers, b"" if request.method == "HEAD" else body
+        )
+
+    def cached(self, request: Request) -> CachedResponse:
+        if self.store.refresh():
+            self.cache.clear()
+
+        query = tuple(sorted((k, tuple(v)) for k, v in request.query.items()))
+        key = self.store.state, request.path, query
+        response = self.cache.get(key)
+        if response is None:
+            response = CachedResponse.render(self.route(request))
+            self.cache.put(key, response)
+
+        return response
+
+    def route(self, request: Request):
+        parts = [part for part in request.path.split("/") if part]
+        if not parts or parts[0] not in self.routes:
+            raise HttpError(HTTPStatus.NOT_FOUND, f"No resource at {request.path}")
+
+        return self.routes[parts[0]](request, *parts[1:])
+
+    def experiments(self, request: Request, doc_id: str | None = None, *rest: str):
+        if doc_id is None:
+            docs = self.filtered(request)
+            sort = request.param("sort", "id")
+            if sort.lstrip("-") not in _sort_keys:
+                raise HttpError(HTTPStatus.BAD_REQUEST, f"Can't sort by {sort}")
+            docs = sorted(
+                docs, key=_sort_keys[sort.lstrip("-")], reverse=sort.startswith("-")
+            )
+            return _page(request, docs)
+
+        try:
+            doc = self.store.by_id[int(doc_id)]
+        except (ValueError, KeyError):
+            raise HttpError(HTTPStatus.NOT_FOUND, f"No experiment {doc_id}")
+
+        if not rest:
+            return doc
+        if rest == ("histograms",):
+            return _page(request, self.store.histograms(doc["id"]))
+
+        raise HttpError(HTTPStatus.NOT_FOUND, f"No resource at {request.path}")
+
+    def summary(self, request: Request):
+        """Statistics of the filtered experiments in each group"""
+        group_by = request.param("group_by", "device")
+        if group_by not in _groups:
+            raise HttpError(HTTPStatus.BAD_REQUEST, f"Can't group by {group_by}")
+
+        groups: dict[str, list[dict]] = {}
+        for doc in self.filtered(request):
+            groups.setdefault(_groups[group_by](doc), []).append(doc)
+
+        rows = []
+        for group, docs in sorted(groups.items()):
+            win_rates = [doc["win_rate"]["value"] for doc in docs]
+            best = max(docs, key=lambda doc: (doc["win_rate"]["value"], -doc["id"]))
+            rows.append(
+                {
+                    group_by: group,
+                    "experiments": len(docs),
+                    "shots": sum(
+                        doc["circuit_data"]["shots"]
+                        * doc["circuit_data"]["num_circuits"]
+                        for doc in docs
+                    ),
+                    "mean_win_rate": sum(win_rates) / len(win_rates),
+                    "best_win_rate": best["win_rate"]["value"],
+                    "best_id": best["id"],
+                    "first": min(doc["date"] for doc in docs),
+                    "last": max(doc["date"] for doc in docs),
+                }
+            )
+
+        return {"group_by": group_by, "groups": rows}
+
+    def leaderboard(self, request: Request, view: str = "best_device"):
+        if view not in self.store.views.views:
+            raise HttpError(HTTPStatus.NOT_FOUND, f"No leaderboard view {view}")
+        return self.store.views.rows(view)
+
+    def filtered(self, request: Request) -> list[dict]:
+        try:
+            source_filter = SourceFilter(
+                since=_date(request.param("since")),
+                until=_date(request.param("until"), parse_until),
+                backends=_values(request, "device"),
+                strategies=_values(request, "strategy"),
+            )
+            min_win_rate = float(request.param("min_win_rate", "-inf"))
+        except ValueError as e:
+            raise HttpError(HTTPStatus.BAD_REQUEST, str(e))
+
+        providers = _values(request, "provider")
+        return [
+            doc
+            for doc in self.store.experiments
+            if source_filter.accepts(
+                date=datetime.fromisoformat(doc["date"]),
+                backend=doc["device"]["name"],
+                strategy=doc["circuit_data"]["strategy"],
+            )
+            and (providers is None or doc["device"]["provider"] in providers)
+            and doc["win_rate"]["value"] >= min_win_rate
+        ]
+
+
+async def _read_request(reader: asyncio.StreamReader) -> Request | None:
+    line = await reader.readline()
+    if not line.strip():
+        return None
+
+    try:
+        method, target, _ = line.decode("latin-1").split()
+    except ValueError:
+        raise ConnectionError("Malformed request line")
+
+    headers = {}
+    while (line := await reader.readline()) not in {b"\r\n", b"\n", b""}:
+        name, _, value = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+
+    # Requests are never expected to have a body, skip it to find the next one
+    if length := int(headers.get("content-length", 0) or 0):
+        await reader.readexactly(length)
+
+    url = urlsplit(target)
+    return Request(method, url.path, parse_qs(url.query), headers)
+
+
+def _format(status: HTTPStatus, headers: dict[str, str], body: bytes) -> bytes:
+    headers = {"Access-Control-Allow-Origin": "*", **headers}
+    if "Content-Length" not in headers:
+        headers["Content-Length"] = str(len(body))
+
+    lines = [f"HTTP/1.1 {status.value} {status.phrase}"]
+    lines += [f"{name}: {value}" for name, value in headers.items()]
+    return ("\r\n".join(lines) + "\r\n\r\n").encode("latin-1") + body
+
+
+def _error(status: HTTPStatus, message: str) -> bytes:
+    body = json.dumps({"error": message}).encode()
+    return _format(status, {"Content-Type": "application/json"}, body)
+
+
+def _page(request: Request, items: list) -> dict:
+    offset = request.int_param("offset", 0)
+    limit = request.int_param("limit", default_limit, max_limit)
+    return {
+        "total": len(items),
+        "offset": offset,
+        "limit": limit,
+        "items": items[offset : offset + limit],
+    }
+
+
+def _etags(header: str) -> set[str]:
+    return {tag.strip() for tag in header.split(",") if tag.strip()}
+
+
+def _values(request: Request, name: str) -> frozenset[str] | None:
+    values = request.query.get(name)
+    return frozenset(values) if values else None
+
+
+def _date(value: str | None, parse=datetime.fromisoformat) -> datetime | None:
+    return None if value is None else parse(value)
+
+
+def _file_state(file: Path) -> tuple[int, int] | None:
+    try:
+        stat = file.stat()
+    except FileNotFoundError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
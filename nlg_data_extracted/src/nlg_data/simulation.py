@@ -0,0 +1,396 @@
+"""Noisy simulation of the game circuits, to compare devices with a baseline.
+
+The circuits of a strategy, e.g. ``games/g14/circuits/4q``, are simulated as
+density matrices for a whole batch of noise points at once. Each point has
+its own
+
+* p1, p2: depolarizing probability after each one and two qubit gate,
+* zz: angle of a coherent ZZ rotation after each two qubit gate,
+* readout: weight of the measured SPAM matrix S, from 0 (perfect readout) to
+  1 (readout errors as measured),
+* crosstalk: how correlated the readout errors are, from 0 (the product of
+  the single qubit marginals of S, as in `GameResult.crosstalk`) to 1 (S).
+
+The readout of a point is then (1 - readout) I + readout S', with
+S' = (1 - crosstalk) S_product + crosstalk S.
+
+Rather than evolving one state per point, the simulation keeps the state
+after each number of depolarizing errors, k1 of the c1 single qubit channels
+and k2 of the c2 two qubit ones. A point then weighs them by
+p1^k1 (1 - p1)^(c1 - k1) p2^k2 (1 - p2)^(c2 - k2), so its cost is a
+contraction at the end, and thousands of points take about as long as one.
+Only the distinct zz angles need states of their own.
+
+    circuits = load_circuits(data_folder / "games/g14/circuits/4q")
+    noise = NoiseSweep.grid(p1=np.linspace(0, 0.01, 10), p2=np.linspace(0, 0.05, 10))
+    baseline = simulate_baseline(circuits, noise, spam=job.spam_matrices["z"])
+    baseline.winrates(game, shots=1000)
+    noise[baseline.closest(experiment_result)]  # noise point closest to a device
+
+The measured bits are read as an integer, o = sum_j c_j 2^j, so with two bits
+per player the outcome is a0 + 4 * a1, as in the counts store.
+"""
+
+import math
+from dataclasses import dataclass, fields
+from functools import lru_cache
+from pathlib import Path
+
+import numpy as np
+
+from .models import CircuitResult, NonlocalGame, Result, Winrate
+from .qasm import Circuit, Instruction, gate_matrix, load_qasm
+
+max_qubits = 10
+"""Largest circuit simulated, after removing idle qubits"""
+
+
+@dataclass(frozen=True)
+class NoiseSweep:
+    """Noise parameters of each point, as arrays of the same length"""
+
+    p1: np.ndarray
+    p2: np.ndarray
+    zz: np.ndarray
+    readout: np.ndarray
+    crosstalk: np.ndarray
+
+    def __post_init__(self):
+        arrays = np.broadcast_arrays(
+            *(
+                np.atleast_1d(np.asarray(getattr(self, f.name), float))
+                for f in fields(self)
+            )
+        )
+        for f, array in zip(fields(self), arrays):
+            object.__setattr__(self, f.name, array)
+
+    def __len__(self):
+        return len(self.p1)
+
+    def __getitem__(self, i: int) -> dict[str, float]:
+        return {f.name: float(getattr(self, f.name)[i]) for f in fields(self)}
+
+    @classmethod
+    def grid(cls, p1=0.0, p2=0.0, zz=0.0, readout=0.0, crosstalk=1.0) -> "NoiseSweep":
+        """Every combination of the given values"""
+        axes = [np.atleast_1d(v) for v in (p1, p2, zz, readout, crosstalk)]
+        return cls(*(a.ravel() for a in np.meshgrid(*axes, indexing="ij")))
+
+
+@dataclass(frozen=True)
+class Baseline:
+    queries: list[tuple[int, int]]
+
+    probs: np.ndarray
+    """(points, circuits, outcomes) probability of each outcome"""
+
+    win_rates: np.ndarray
+    """(points, circuits) win rate of each circuit"""
+
+    answers: int
+    """Number of answers of each player"""
+
+    def result(
+        self, point: int, shots: int, rng: np.random.Generator | None = None
+    ) -> Result:
+        """Synthetic result of a noise point, with counts sampled from it"""
+        rng = rng or np.random.default_rng()
+        result = Result()
+        for query, probs in zip(self.queries, self.probs[point]):
+            counts = rng.multinomial(shots, probs / probs.sum())
+            nonzero = counts.nonzero()[0]
+            answers = [(int(o) % self.answers, int(o) // self.answers) for o in nonzero]
+            wins = _wins(query, np.array(answers))
+            result.results.append(
+                CircuitResult(
+                    circuit=list(query),
+                    win_rate=float(counts[nonzero] @ wins / shots),
+                    counts={a: int(counts[o]) for a, o in zip(answers, nonzero)},
+                )
+            )
+
+        return result
+
+    def winrates(self, game: NonlocalGame, shots: int) -> list[Winrate]:
+        """Expected win rate of each noise point, with shots per circuit"""
+        return [
+            Winrate.from_circuit_winrates(game, wr.tolist(), shots)
+            for wr in self.win_rates
+        ]
+
+    def closest(self, result: Result) -> int:
+        """Noise point whose win rates are closest to the observed ones.
+
+        Only the questions asked in both are compared, by squared distance.
+        """
+        index = {query: i for i, query in enumerate(self.queries)}
+        columns, observed = [], []
+        for r in result.results:
+            if (i := index.get(tuple(r.circuit))) is not None:
+                columns.append(i)
+                observed.append(r.win_rate)
+
+        if not columns:
+            raise ValueError("The result has none of the simulated questions")
+
+        distance = ((self.win_rates[:, columns] - observed) ** 2).sum(axis=1)
+        return int(distance.argmin())
+
+
+def load_circuits(folder: Path) -> dict[tuple[int, int], Circuit]:
+    """Circuits of a strategy, keyed by the question (va, vb) in their names"""
+    circuits = {}
+    for file in sorted(Path(folder).rglob("*.qasm")):
+        *_, va, vb = file.stem.split("_")
+        circuits[int(va), int(vb)] = load_qasm(file).compact()
+
+    if not circuits:
+        raise FileNotFoundError(f"No QASM files in {folder}")
+    return circuits
+
+
+def simulate_baseline(
+    circuits: dict[tuple[int, int], Circuit],
+    noise: NoiseSweep,
+    spam: np.ndarray | None = None,
+) -> Baseline:
+    """Simulates every circuit at every noise point.
+
+    Args:
+        spam: SPAM matrix of the measured bits, with the prepared state as the
+            column. Without it, the readout is perfect.
+    """
+    queries = list(circuits)
+    probs = np.stack([simulate(circuits[q], noise, spam) for q in queries], axis=1)
+
+    bits = int(np.log2(probs.shape[-1]))
+    answers = 2 ** (bits // 2)
+    o = np.arange(probs.shape[-1])
+    same = (o % answers == o // answers).astype(float)
+    vertex_win_rate = probs @ same
+    vertex = np.array([va == vb for va, vb in queries])
+    win_rates = np.where(vertex, vertex_win_rate, 1 - vertex_win_rate)
+    return Baseline(queries, probs, win_rates, answers)
+
+
+def simulate(
+    circuit: Circuit,
+    noise: NoiseSweep,
+    spam: np.ndarray | None = None,
+    tolerance: float = 1e-9,
+) -> np.ndarray:
+    """(points, 2^bits) probabilities of the measured bits at each noise point.
+
+    Args:
+        tolerance: Largest chance of the errors that aren't simulated, i.e.
+            the error on each probability.
+    """
+    n = circuit.num_qubits
+    if n > max_qubits:
+        raise ValueError(f"Circuit has {n} qubits, more than {max_qubits}")
+
+    # Channels that can fire, per kind, and the most errors worth following
+    noisy = [i for i in circuit.gates if i.name not in _virtual_gates]
+    channels1 = sum(len(i.qubits) == 1 for i in noisy)
+    channels2 = sum(len(i.qubits) > 1 for i in noisy)
+    errors1 = _max_errors(noise.p1, channels1, tolerance)
+    errors2 = _max_errors(noise.p2, channels2, tolerance)
+    angles, angle_index = np.unique(noise.zz, return_inverse=True)
+
+    states = _ErrorPaths(n, angles, errors1, errors2)
+    for instruction in circuit.instructions:
+        states.add(instruction)
+
+    # Each path with k of the c channels firing has weight p^k (1 - p)^(c - k)
+    coefficients = states.measure(circuit)
+    weights1 = _path_weights(noise.p1, channels1)[:, : errors1 + 1]
+    weights2 = _path_weights(noise.p2, channels2)[:, : errors2 + 1]
+    probs = np.einsum("bi,bj,bijo->bo", weights1, weights2, coefficients[angle_index])
+    probs = np.clip(probs, 0, None)
+    if spam is not None:
+        probs = _readout(probs, spam, noise.readout, noise.crosstalk)
+
+    return probs
+
+
+def product_spam(spam: np.ndarray) -> np.ndarray:
+    """Product of the single bit marginals of a SPAM matrix.
+
+    The marginal of bit j averages the chance of reading each value of j
+    correctly over the other prepared bits. Bit 0 is the least significant.
+    """
+    states = spam.shape[0]
+    bits = int(np.log2(states))
+    state = np.arange(states)
+    product = np.ones((1, 1))
+    for j in range(bits):
+        marginal = np.zeros((2, 2))
+        for value in (0, 1):
+            same = state[(state >> j & 1) == value]
+            marginal[value, value] = spam[np.ix_(same, same)].sum() / len(same)
+            marginal[1 - value, value] = 1 - marginal[value, value]
+        product = np.kron(marginal, product)
+
+    return product
+
+
+_virtual_gates = ("rz", "p", "u1", "z", "s", "sdg", "t", "tdg")
+"""Single qubit gates that are noiseless, as they are frame changes on devices"""
+
+
+class _ErrorPaths:
+    """Density matrices after each number of errors, rho[angle, k1, k2].
+
+    Paths with more errors than the states hold are dropped.
+
+    Gates are multiplied into a pending unitary, which is only applied to the
+    states when a two qubit channel needs them. A single qubit channel
+    commutes with every gate that doesn't touch its qubit with another one,
+    so those channels are also kept pending and applied together.
+    """
+
+    def __init__(self, n: int, angles: np.ndarray, errors1: int, errors2: int):
+        self.n = n
+        self.dim = 2**n
+        self.angles = angles
+        self.rho = np.zeros(
+            (len(angles), errors1 + 1, errors2 + 1, self.dim, self.dim), complex
+        )
+        self.rho[:, 0, 0, 0, 0] = 1
+        self.unitary: np.ndarray | None = None
+        self.pending = [0] * n
+        self.noisy1 = errors1 > 0
+        self.noisy2 = errors2 > 0
+
+    def add(self, instruction: Instruction):
+        name, qubits = instruction.name, instruction.qubits
+        if name in ("barrier", "measure"):
+            return
+
+        if name == "reset" or len(qubits) > 1:
+            self._apply_pending(qubits)
+        if name == "reset":
+            for q in qubits:
+                self.rho = self._mix(self.rho, q, np.diag([1.0, 0.0]))
+            return
+
+        u = _embed(name, instruction.params, qubits, self.n)
+        if len(qubits) == 2 and self.angles.any():
+            u = _zz_phase(self.angles, qubits, self.n)[:, :, None] * u
+        self.unitary = u if self.unitary is None else u @ self.unitary
+
+        if len(qubits) == 1 and self.noisy1 and name not in _virtual_gates:
+            self.pending[qubits[0]] += 1
+        if len(qubits) > 1 and self.noisy2:
+            self._flush()
+            self.rho = self._depolarize(self.rho, qubits, axis=2, count=1)
+
+    def measure(self, circuit: Circuit) -> np.ndarray:
+        """(angles, k1, k2, 2^bits) probabilities of the measured bits"""
+        self._apply_pending(range(self.n))
+        self._flush()
+        diagonal = np.einsum("...ii->...i", self.rho).real
+        state = np.arange(self.dim)
+        outcome = np.zeros(self.dim, dtype=np.int64)
+        for q, c in circuit.measurements.items():
+            outcome |= (state >> q & 1) << c
+
+        marginal = np.zeros((self.dim, 2**circuit.num_clbits))
+        marginal[state, outcome] = 1
+        return diagonal @ marginal
+
+    def _flush(self):
+        if self.unitary is not None:
+            u = self.unitary.reshape(-1, 1, 1, self.dim, self.dim)
+            self.rho = u @ self.rho @ u.conj().swapaxes(-1, -2)
+            self.unitary = None
+
+    def _apply_pending(self, qubits):
+        if not any(self.pending[q] for q in qubits):
+            return
+
+        self._flush()
+        for q in qubits:
+            if self.pending[q]:
+                self.rho = self._depolarize(self.rho, (q,), 1, self.pending[q])
+                self.pending[q] = 0
+
+    def _depolarize(self, rho: np.ndarray, qubits, axis: int, count: int):
+        # Replacing each qubit by I / 2 in turn replaces them all by I / 2^k
+        mixed = rho
+        for q in qubits:
+            mixed = self._mix(mixed, q, np.eye(2) / 2)
+
+        # Without an error a state keeps its count. Of count channels, any j
+        # of them firing leave it mixed, j more errors up
+        result = rho.copy()
+        for j in range(1, min(count, rho.shape[axis] - 1) + 1):
+            source = [slice(None)] * rho.ndim
+            target = [slice(None)] * rho.ndim
+            source[axis], target[axis] = slice(None, -j), slice(j, None)
+            result[tuple(target)] += math.comb(count, j) * mixed[tuple(source)]
+
+        return result
+
+    def _mix(self, rho: np.ndarray, q: int, state: np.ndarray) -> np.ndarray:
+        # Traces out qubit q and replaces it by a single qubit state. Indices
+        # read the qubits as an integer, so q splits them in higher and lower
+        high, low = 2 ** (self.n - 1 - q), 2**q
+        tensor = rho.reshape(rho.shape[:3] + (high, 2, low) * 2)
+        traced = tensor[..., :, 0, :, :, 0, :] + tensor[..., :, 1, :, :, 1, :]
+        mixed = traced[..., :, None, :, :, None, :] * state.reshape(1, 2, 1, 1, 2, 1)
+        return mixed.reshape(rho.shape)
+
+
+@lru_cache(maxsize=4096)
+def _embed(name: str, params: tuple, qubits: tuple, n: int) -> np.ndarray:
+    # The gate as a 2^n x 2^n unitary, by applying it to the identity
+    k = len(qubits)
+    u = gate_matrix(name, params).reshape((2,) * 2 * k)
+    rows = [n - 1 - q for q in qubits]
+    identity = np.eye(2**n).reshape((2,) * 2 * n)
+    full = np.tensordot(u, identity, axes=(range(k, 2 * k), rows))
+    return np.moveaxis(full, range(k), rows).reshape(2**n, 2**n)
+
+
+def _zz_phase(angles: np.ndarray, qubits, n: int) -> np.ndarray:
+    # Diagonal of exp(-i zz / 2 Z Z) for each angle
+    a, b = qubits
+    state = np.arange(2**n)
+    parity = (1 - 2 * (state >> a & 1)) * (1 - 2 * (state >> b & 1))
+    return np.exp(-0.5j * angles[:, None] * parity)
+
+
+def _max_errors(p: np.ndarray, channels: int, tolerance: float) -> int:
+    # Fewest errors k such that more than k happen with at most tolerance
+    ways = np.array([math.comb(channels, k) for k in range(channels + 1)])
+    binomial = ways * _path_weights(p, channels)
+    tail = 1 - np.cumsum(binomial, axis=1)
+    tail[:, -1] = 0
+    return int(np.argmax((tail <= tolerance).all(axis=0)))
+
+
+def _path_weights(p: np.ndarray, channels: int) -> np.ndarray:
+    k = np.arange(channels + 1)
+    return p[:, None] ** k * (1 - p[:, None]) ** (channels - k)
+
+
+def _readout(probs: np.ndarray, spam, readout, crosstalk) -> np.ndarray:
+    spam = np.asarray(spam, dtype=float)
+    if spam.shape != (probs.shape[1],) * 2:
+        raise ValueError(
+            f"SPAM matrix of shape {spam.shape} doesn't match "
+            f"{probs.shape[1]} outcomes"
+        )
+
+    correlated = probs @ spam.T
+    independent = probs @ product_spam(spam).T
+    readout, crosstalk = readout[:, None], crosstalk[:, None]
+    noisy = crosstalk * correlated + (1 - crosstalk) * independent
+    return (1 - readout) * probs + readout * noisy
+
+
+def _wins(query: tuple[int, int], answers: np.ndarray) -> np.ndarray:
+    same = answers[:, 0] == answers[:, 1]
+    return same if query[0] == query[1] else ~same
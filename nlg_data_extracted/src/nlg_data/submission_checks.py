@@ -0,0 +1,216 @@
+"""Checks of the website's submissions, the Python side of validate-benchmark.js.
+
+The schema is compiled once per process. Files are read and checked
+concurrently, and duplicates are found with one pass over a hash table
+instead of comparing every pair:
+
+    report = validate_submissions(Path("../submissions"), jobs=8)
+    report.valid
+    report.slowest(5)  # files that took longest to check
+
+On top of the schema and the warnings of validate-benchmark.js, the
+``quantumSpecific`` block is checked for consistency: the gate counts by
+arity and the gate breakdown should add up to the gate count, the circuit
+can't use more qubits than the device has, and a win rate is at most 1.
+"""
+
+import functools
+import json
+import math
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+
+from .json_schema import Validator, compile_schema
+
+schema_file = Path("../schemas/benchmark-schema.json")
+"""Default benchmark schema, relative to the nlg_data project"""
+
+duplicate_tolerance = 1e-4
+"""Submissions of the same experiment and device closer than this are duplicates"""
+
+
+@dataclass
+class FileReport:
+    folder: str
+    errors: list[str] = field(default_factory=list)
+    warnings: list[str] = field(default_factory=list)
+    seconds: float = 0.0
+    """CPU time spent reading and checking the file. Unlike the wall time, it
+    doesn't count waiting for the other threads"""
+
+    benchmark: dict | None = field(default=None, repr=False)
+    """Parsed benchmark.json, None if it couldn't be read"""
+
+    @property
+    def valid(self) -> bool:
+        return not self.errors
+
+
+@dataclass
+class ValidationReport:
+    files: list[FileReport]
+    duplicates: list[tuple[str, str]]
+    """Pairs of (folder, folder it may duplicate)"""
+
+    seconds: float
+
+    @property
+    def valid(self) -> bool:
+        return all(f.valid for f in self.files)
+
+    def slowest(self, n: int = 10) -> list[FileReport]:
+        return sorted(self.files, key=lambda f: f.seconds, reverse=True)[:n]
+
+
+@functools.cache
+def load_schema(schema: Path = schema_file) -> Validator:
+    return compile_schema(json.loads(Path(schema).read_text("utf-8")))
+
+
+def check_benchmark(
+    benchmark: dict,
+    folder: str,
+    schema: Path = schema_file,
+    folder_path: Path | str | None = None,
+) -> tuple[list[str], list[str]]:
+    """Errors and warnings of a single benchmark.
+
+    Args:
+        folder_path: Submission folder, to check that its QASM files exist
+    """
+    errors = load_schema(schema)(benchmark)
+    warnings = []
+
+    if "id" not in benchmark:
+        warnings.append(f"id: will be generated from the folder name '{folder}'")
+    elif benchmark["id"] != folder:
+        warnings.append(f"id: '{benchmark['id']}' doesn't match the folder name")
+
+    if "timestamp" not in benchmark:
+        warnings.append("timestamp: will be generated")
+
+    if folder_path is not None:
+        for qasm_file in benchmark.get("qasmFiles", []):
+            if not isinstance(qasm_file, str):
+                continue
+            if not os.path.exists(os.path.join(folder_path, qasm_file)):
+                warnings.append(f"qasmFiles: '{qasm_file}' not found")
+
+    # Only check consistency once the types are known to be right
+    if not errors:
+        _check_consistency(benchmark, errors, warnings)
+
+    return errors, warnings
+
+
+def _check_consistency(benchmark: dict, errors: list[str], warnings: list[str]):
+    if benchmark["metricName"].lower() == "win rate" and benchmark["metricValue"] > 1:
+        errors.append("metricValue: a win rate can't exceed 1")
+
+    uncertainty = benchmark.get("uncertainty")
+    if uncertainty is not None and uncertainty > benchmark["metricValue"]:
+        warnings.append("uncertainty: larger than the metric value")
+
+    quantum = benchmark.get("quantumSpecific", {})
+    gates = quantum.get("gateCount")
+    by_arity = [
+        quantum[k]
+        for k in ("singleQubitGateCount", "twoQubitGateCount", "multiQubitGateCount")
+        if isinstance(quantum.get(k), int)
+    ]
+    if gates is not None and sum(by_arity) > gates:
+        errors.append(
+            f"quantumSpecific: {sum(by_arity)} gates by arity, more than "
+            f"gateCount {gates}"
+        )
+
+    breakdown = quantum.get("gateBreakdown")
+    if gates is not None and isinstance(breakdown, dict):
+        total = sum(v for v in breakdown.values() if isinstance(v, (int, float)))
+        if total != gates:
+            warnings.append(
+                f"quantumSpecific.gateBreakdown: adds up to {total}, not "
+                f"gateCount {gates}"
+            )
+
+    depth = quantum.get("circuitDepth")
+    if gates is not None and depth is not None and gates > 0 and depth > gates:
+        warnings.append(f"quantumSpecific.circuitDepth: {depth} exceeds gateCount")
+
+    qubits, device_qubits = quantum.get("qubitCount"), quantum.get("deviceQubits")
+    if isinstance(device_qubits, int) and qubits is not None and qubits > device_qubits:
+        errors.append(
+            f"quantumSpecific.qubitCount: {qubits} exceeds deviceQubits "
+            f"{device_qubits}"
+        )
+
+
+def check_file(folder_path: Path | str, schema: Path = schema_file) -> FileReport:
+    start = time.thread_time()
+    report = FileReport(os.path.basename(folder_path))
+    try:
+        # Plain os.path, since pathlib costs as much as the check itself here
+        with open(os.path.join(folder_path, "benchmark.json"), "rb") as f:
+            report.benchmark = json.loads(f.read())
+    except FileNotFoundError:
+        report.errors.append("file: benchmark.json not found")
+    except (json.JSONDecodeError, UnicodeDecodeError) as e:
+        report.errors.append(f"file: {e}")
+    else:
+        report.errors, report.warnings = check_benchmark(
+            report.benchmark, report.folder, schema, folder_path
+        )
+
+    report.seconds = time.thread_time() - start
+    return report
+
+
+def find_duplicates(benchmarks: dict[str, dict]) -> list[tuple[str, str]]:
+    """Benchmarks of the same experiment, device and metric with nearly the same
+    value, like checkDuplicates in validate-benchmark.js.
+
+    Values are bucketed by the tolerance, so only the neighbouring buckets of
+    each benchmark are compared and this takes linear time.
+    """
+    seen: dict[tuple, tuple[str, float]] = {}
+    duplicates = []
+    for folder, benchmark in benchmarks.items():
+        signature = tuple(
+            benchmark.get(k) for k in ("algorithmName", "device", "metricName")
+        )
+        value = benchmark.get("metricValue")
+        if not isinstance(value, (int, float)):
+            continue
+
+        bucket = math.floor(value / duplicate_tolerance)
+        for b in (bucket - 1, bucket, bucket + 1):
+            match = seen.get((signature, b))
+            if match is not None and abs(match[1] - value) < duplicate_tolerance:
+                duplicates.append((folder, match[0]))
+                break
+
+        seen.setdefault((signature, bucket), (folder, value))
+
+    return duplicates
+
+
+def validate_submissions(
+    submissions_folder: Path, schema: Path = schema_file, jobs: int | None = None
+) -> ValidationReport:
+    """Checks every submission folder, except the template"""
+    start = time.perf_counter()
+    load_schema(schema)
+    # scandir knows which entries are folders without a stat per entry
+    with os.scandir(submissions_folder) as entries:
+        folders = sorted(e.path for e in entries if e.is_dir() and e.name != "template")
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        files = list(executor.map(lambda p: check_file(p, schema), folders))
+
+    # Like validate-benchmark.js, only valid submissions can be duplicates
+    duplicates = find_duplicates(
+        {f.folder: f.benchmark for f in files if f.valid and f.benchmark is not None}
+    )
+    return ValidationReport(files, duplicates, time.perf_counter() - start)
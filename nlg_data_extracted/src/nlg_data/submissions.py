@@ -0,0 +1,292 @@
+"""Exports the best experiment of every device to the website's submissions.
+
+The website reads ``submissions/<name>/benchmark.json``. Each device's best
+experiment, from the ``best_device`` leaderboard view, is mapped to the
+benchmark schema. Fields derived from the database (win rate, uncertainty,
+experiment date, shots and circuit statistics) are written. Fields written by
+hand, like the team, notes or fidelities, are kept. A submission is matched to
+its device by the ``device`` name, so renamed folders keep working, otherwise a
+new ``<game>_<tag>_<provider>_<device>`` folder is created:
+
+    result = export_submissions(db, data_folder, Path("../submissions"))
+    result.written  # folders whose benchmark.json changed
+
+The hash of the inputs of every submission is kept in
+``data/submissions_state.json``, so a submission is only rebuilt when its
+experiment or game changes, or when its file was edited since the last
+export. Every rebuilt submission is checked with `submission_checks` before
+any file is written, so publishing a new best run only touches its own file.
+
+A file that wasn't written by the last export holds values maintained by
+hand. If the database would change any of them, e.g. the shots or the
+uncertainty, the changes are reported in ``result.conflicts`` and nothing is
+written, unless the export is forced:
+
+    result = export_submissions(db, data_folder, submissions, force=True)
+"""
+
+import hashlib
+import json
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from pathlib import Path
+
+from tinydb import TinyDB
+
+from .leaderboard import LeaderboardViews
+from .models import Experiment, NonlocalGame
+from .submission_checks import check_benchmark, schema_file
+
+state_file = Path("submissions_state.json")
+"""Location of the export state relative to the data folder"""
+
+_version = 1
+"""Bumped when the mapping changes, so every submission is rebuilt"""
+
+_providers = {
+    "ibm": "IBM",
+    "ionq": "IonQ",
+    "rigetti": "Rigetti",
+    "duke": "Duke Quantum",
+}
+
+
+@dataclass
+class ExportResult:
+    written: list[str] = field(default_factory=list)
+    """Folders whose benchmark.json was created or changed"""
+
+    unchanged: list[str] = field(default_factory=list)
+    """Folders whose benchmark.json was already up to date"""
+
+    conflicts: dict[str, list[str]] = field(default_factory=dict)
+    """Hand-maintained values each folder would change, as "field: old -> new".
+    Nothing is written if there are any, unless forced"""
+
+
+def device_name(provider: str, name: str) -> str:
+    """Name of a device on the website, e.g. IBM Sherbrooke or Rigetti Ankaa-2"""
+    provider = _providers.get(provider, provider.capitalize())
+    return f"{provider} {'-'.join(p.capitalize() for p in name.split('-'))}"
+
+
+def benchmark_fields(experiment: Experiment, game: NonlocalGame) -> dict:
+    """Fields of benchmark.json derived from the database"""
+    circuit_data = experiment.circuit_data
+    quantum = {
+        "shots": circuit_data.shots,
+        "circuitVariations": circuit_data.num_circuits,
+    }
+    if circuit_data.metrics is not None:
+        metrics = circuit_data.metrics
+        quantum |= {
+            "qubitCount": metrics.qubits,
+            "gateCount": round(metrics.gates),
+            "circuitDepth": round(metrics.depth),
+            "twoQubitGateCount": round(metrics.two_qubit_gates),
+            "singleQubitGateCount": round(metrics.single_qubit_gates),
+            "gateBreakdown": {
+                gate: round(count / metrics.num_circuits)
+                for gate, count in metrics.gate_counts.items()
+            },
+        }
+
+    return {
+        "metricName": "Win Rate",
+        "metricValue": round(experiment.win_rate.value, 3),
+        "uncertainty": round(experiment.win_rate.ci95, 3),
+        "experimentDate": _timestamp(experiment.date),
+        "quantumSpecific": quantum,
+    }
+
+
+def new_benchmark(folder: str, experiment: Experiment, game: NonlocalGame) -> dict:
+    """Fields written once, when a device has no submission yet"""
+    device = device_name(experiment.device.provider, experiment.device.name)
+    kind = " ".join(game.tags[0].split("-")).title() if game.tags else "Nonlocal"
+    threshold = 100 * game.optimal_classical_value
+    benchmark = {
+        "id": folder,
+        "algorithmName": f"{game.name} {kind} (Nonlocal Game)",
+        "device": device,
+        "description": (
+            f"{game.name} {kind.lower()} nonlocal game implementation on {device}. "
+            f"Quantum advantage threshold is >{threshold:.1f}% win rate."
+        ),
+        "timestamp": _timestamp(experiment.date),
+    }
+    if experiment.publication is not None:
+        benchmark["paperUrl"] = str(experiment.publication.url)
+
+    return benchmark
+
+
+def export_submissions(
+    db: TinyDB,
+    data_folder: Path,
+    submissions_folder: Path,
+    schema: Path = schema_file,
+    force: bool = False,
+) -> ExportResult:
+    """Writes the benchmark.json of every device whose best experiment changed.
+
+    Raises a ValueError listing the errors of every invalid submission, in
+    which case nothing is written.
+
+    Args:
+        force: Overwrite values of files edited by hand since the last export,
+            or never exported, that differ from the database. Otherwise they
+            are only reported in the result's conflicts.
+    """
+    table = db.table("experiments")
+    game_docs = {g["id"]: g for g in db.table("games").all()}
+    views = LeaderboardViews.load(data_folder, table)
+    state = _load_state(data_folder)
+    folders = _device_folders(submissions_folder)
+
+    result = ExportResult()
+    inputs: dict[str, str] = {}
+    rebuilt: dict[str, dict] = {}
+    for entry in views.rows("best_device"):
+        doc = table.get(doc_id=entry["doc_id"])
+        game = NonlocalGame.model_validate(game_docs[doc["game_id"]])
+        device = device_name(entry["provider"], entry["device"])
+        folder = folders.get(device) or _folder_name(
+            game, entry["provider"], entry["device"]
+        )
+
+        file = submissions_folder / folder / "benchmark.json"
+        inputs[folder] = _hash(
+            {"version": _version, "experiment": doc, "game": game_docs[doc["game_id"]]}
+        )
+        if state.get(folder) == {"inputs": inputs[folder], "file": _file_hash(file)}:
+            result.unchanged.append(folder)
+            continue
+
+        experiment = Experiment.model_validate(doc)
+        current = json.loads(file.read_text("utf-8")) if file.exists() else None
+        derived = benchmark_fields(experiment, game)
+        benchmark = _merge(current or new_benchmark(folder, experiment, game), derived)
+        if benchmark == current:
+            # Only the state was missing or stale
+            result.unchanged.append(folder)
+            continue
+
+        rebuilt[folder] = benchmark
+        exported = state.get(folder, {}).get("file")
+        if current is not None and exported != _file_hash(file):
+            if changes := _changes(current, derived):
+                result.conflicts[folder] = changes
+
+    errors = [
+        f"{folder}/benchmark.json {error}"
+        for folder, benchmark in rebuilt.items()
+        for error in check_benchmark(benchmark, folder, schema)[0]
+    ]
+    if errors:
+        raise ValueError("Invalid submissions:\n" + "\n".join(errors))
+    if result.conflicts and not force:
+        return result
+
+    now = _timestamp(datetime.now(timezone.utc))
+    for folder, benchmark in rebuilt.items():
+        benchmark["lastUpdated"] = now
+        file = submissions_folder / folder / "benchmark.json"
+        file.parent.mkdir(parents=True, exist_ok=True)
+        tmp_file = file.with_suffix(".tmp")
+        tmp_file.write_text(
+            json.dumps(benchmark, indent=2, ensure_ascii=False), "utf-8"
+        )
+        tmp_file.replace(file)
+        result.written.append(folder)
+
+    for folder, value in inputs.items():
+        file = submissions_folder / folder / "benchmark.json"
+        state[folder] = {"inputs": value, "file": _file_hash(file)}
+
+    _save_state(data_folder, state)
+    return result
+
+
+def _merge(benchmark: dict, derived: dict) -> dict:
+    """Overwrites the derived fields, keeping everything else and its order"""
+    merged = dict(benchmark)
+    for key, value in derived.items():
+        # Keeps hand-written quantumSpecific fields like the architecture
+        if isinstance(value, dict) and isinstance(merged.get(key), dict):
+            merged[key] = {**merged[key], **value}
+        else:
+            merged[key] = value
+
+    # lastUpdated only changes when something else does
+    if "lastUpdated" in benchmark:
+        unchanged = {**merged, "lastUpdated": benchmark["lastUpdated"]}
+        if unchanged == benchmark:
+            return benchmark
+
+    return merged
+
+
+def _changes(current: dict, derived: dict, prefix: str = "") -> list[str]:
+    """Values of current that derived would overwrite with different ones"""
+    changes = []
+    for key, value in derived.items():
+        if key not in current:
+            continue
+
+        if isinstance(value, dict) and isinstance(current[key], dict):
+            changes += _changes(current[key], value, f"{prefix}{key}.")
+        elif value != current[key]:
+            changes.append(f"{prefix}{key}: {current[key]!r} -> {value!r}")
+
+    return changes
+
+
+def _device_folders(submissions_folder: Path) -> dict[str, str]:
+    """Submission folder of every device that already has one"""
+    folders = {}
+    for file in sorted(submissions_folder.glob("*/benchmark.json")):
+        device = json.loads(file.read_text("utf-8")).get("device")
+        if device is not None:
+            folders.setdefault(device, file.parent.name)
+
+    return folders
+
+
+def _folder_name(game: NonlocalGame, provider: str, device: str) -> str:
+    parts = [game.name, *game.tags[:1], provider, device.replace("-", "")]
+    return "_".join(p.lower().replace("-", "_") for p in parts)
+
+
+def _timestamp(date: datetime) -> str:
+    if date.tzinfo is None:
+        date = date.replace(tzinfo=timezone.utc)
+
+    date = date.astimezone(timezone.utc)
+    return date.isoformat(timespec="milliseconds").replace("+00:00", "Z")
+
+
+def _hash(value) -> str:
+    data = json.dumps(value, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(data.encode()).hexdigest()
+
+
+def _file_hash(file: Path) -> str | None:
+    try:
+        return hashlib.sha256(file.read_bytes()).hexdigest()
+    except FileNotFoundError:
+        return None
+
+
+def _load_state(data_folder: Path) -> dict[str, dict]:
+    try:
+        return json.loads((data_folder / state_file).read_text("utf-8"))
+    except FileNotFoundError:
+        return {}
+
+
+def _save_state(data_folder: Path, state: dict[str, dict]):
+    file = data_folder / state_file
+    tmp_file = file.with_suffix(".tmp")
+    tmp_file.write_text(json.dumps(state, indent=4, sort_keys=True), "utf-8")
+    tmp_file.replace(file)
@@ -3,23 +3,34 @@ import numpy as np
 
 def calculate_ci(winrates: list[float], shots: int, d: float = 0.05):
     wr = np.array(winrates)
-    m = len(winrates)
-    n = shots
+    sigma2 = np.mean(wr * (1 - wr))
+    return ci_from_moments(len(winrates), sigma2, shots, d)
 
+
+def calculate_p_value(winrates: list[float], shots: int, omega_c: float):
+    wr = np.array(winrates)
     sigma2 = np.mean(wr * (1 - wr))
+    return p_value_from_moments(len(winrates), np.mean(wr), sigma2, shots, omega_c)
+
+
+# The bounds only depend on the number of circuits m, the mean win rate and
+# sigma2, the mean of wr * (1 - wr) over the circuits, so they can also be
+# computed from running moments without keeping every win rate
+
+
+def ci_from_moments(m: int, sigma2: float, shots: int, d: float = 0.05):
+    n = shots
     sigma = np.sqrt(sigma2)
     term1 = 2 * np.log(2 / d) / (3 * n)
     term2 = 2 * np.log(2 / d) / (m * n)
     return term1 + sigma * np.sqrt(term2)
 
 
-def calculate_p_value(winrates: list[float], shots: int, omega_c: float):
-    wr = np.array(winrates)
-    m = len(winrates)
+def p_value_from_moments(
+    m: int, mean: float, sigma2: float, shots: int, omega_c: float
+):
     n = shots
-    sigma2 = np.mean(wr * (1 - wr))
-
-    eps_c = np.mean(wr) - omega_c
+    eps_c = mean - omega_c
 
     if eps_c < 0:
         return 1
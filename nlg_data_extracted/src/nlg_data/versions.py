@@ -0,0 +1,257 @@
+"""Immutable, versioned snapshots of the experiments and their counts.
+
+A version is a Merkle tree in the blob store. Every experiment is a record,
+the tree of its serialized document and its counts file. Records are grouped
+into buckets by the hash of their run key, see
+`create_database.experiment_key`, and the root lists the buckets:
+
+    root      bucket prefix -> bucket digest
+    bucket    run key -> record digest
+    record    "experiment" -> document digest, "counts" -> counts digest
+
+Blobs are content addressed, so a new version only stores the records, and
+buckets, that changed since the last one, and shares the rest. Versions are
+named v1, v2, ... in ``data/versions.json``, unless given a name:
+
+    version = snapshot(db.table("experiments"), data_folder, blobs)
+    changes = diff(blobs, versions.get("v1").root, version.root)
+
+Equal digests mean equal subtrees, so `diff` only opens the buckets and
+records that differ. Its cost is proportional to the number of changes, not
+to the size of the database.
+"""
+
+import hashlib
+import json
+from dataclasses import asdict, dataclass, field
+from datetime import datetime, timezone
+from pathlib import Path
+
+from tinydb.table import Table
+
+from .blob_store import BlobStore
+from .create_database import counts_file, experiment_key
+from .models import Result
+
+versions_file = Path("versions.json")
+"""Location of the version list relative to the data folder"""
+
+_prefix_length = 2
+"""Hex digits of the run key hash that pick the bucket of a record"""
+
+_statistics = {
+    "win_rate": ("win_rate", "value"),
+    "ci95": ("win_rate", "ci95"),
+    "p_value": ("win_rate", "p_value"),
+    "var": ("win_rate", "var"),
+    "shots": ("circuit_data", "shots"),
+    "num_circuits": ("circuit_data", "num_circuits"),
+}
+"""Statistics of an experiment reported by diff, and where they are stored"""
+
+
+@dataclass(frozen=True)
+class Version:
+    name: str
+    root: str
+    """Digest of the root tree in the blob store"""
+
+    created: str
+    experiments: int
+
+
+@dataclass
+class Versions:
+    versions: list[Version] = field(default_factory=list)
+
+    @classmethod
+    def load(cls, data_folder: Path) -> "Versions":
+        try:
+            data = json.loads((data_folder / versions_file).read_text("utf-8"))
+        except FileNotFoundError:
+            return cls()
+
+        return cls([Version(**version) for version in data["versions"]])
+
+    def save(self, data_folder: Path):
+        data = {"versions": [asdict(version) for version in self.versions]}
+        tmp_file = (data_folder / versions_file).with_suffix(".tmp")
+        tmp_file.write_text(json.dumps(data, indent=4), "utf-8")
+        tmp_file.replace(data_folder / versions_file)
+
+    def get(self, name: str) -> Version:
+        """Version by name. "latest" is the most recent one"""
+        if name == "latest" and self.versions:
+            return self.versions[-1]
+
+        for version in self.versions:
+            if version.name == name:
+                return version
+
+        raise KeyError(f"No version named '{name}'")
+
+    def next_name(self) -> str:
+        return f"v{len(self.versions) + 1}"
+
+
+@dataclass(frozen=True)
+class ExperimentChange:
+    key: str
+    """Run key of the experiment"""
+
+    before: dict | None
+    """Document in the old version, None if it was added"""
+
+    after: dict | None
+    """Document in the new version, None if it was removed"""
+
+    counts_changed: bool = False
+    max_circuit_delta: float | None = None
+    """Largest change of the win rate of a circuit, if both have counts"""
+
+    @property
+    def status(self) -> str:
+        if self.before is None:
+            return "added"
+        if self.after is None:
+            return "removed"
+        return "changed"
+
+    def deltas(self) -> dict[str, float]:
+        """Change of each statistic that differs between the versions"""
+        if self.before is None or self.after is None:
+            return {}
+
+        deltas = {}
+        for name, path in _statistics.items():
+            before, after = _get(self.before, path), _get(self.after, path)
+            if before is not None and after is not None and before != after:
+                deltas[name] = after - before
+        return deltas
+
+
+def snapshot(
+    table: Table, data_folder: Path, blobs: BlobStore, name: str | None = None
+) -> Version:
+    """Stores the experiments table and its counts as a new version.
+
+    Unchanged records and buckets are already in the store, so only what
+    changed since the last version is written. The caller saves the blobs.
+    """
+    versions = Versions.load(data_folder)
+    name = name or versions.next_name()
+    if any(version.name == name for version in versions.versions):
+        raise ValueError(f"Version '{name}' already exists")
+
+    buckets: dict[str, dict[str, str]] = {}
+    for doc in table.all():
+        key = _record_key(doc)
+        record = {"experiment": blobs.put_bytes(_serialize(doc))}
+        counts = _counts_digest(doc, data_folder, blobs)
+        if counts is not None:
+            record["counts"] = counts
+
+        buckets.setdefault(_bucket(key), {})[key] = blobs.put_manifest(record)
+
+    root = blobs.put_manifest(
+        {prefix: blobs.put_manifest(bucket) for prefix, bucket in buckets.items()}
+    )
+
+    # Versions hold their root, so gc keeps every blob they reach
+    blobs.add_ref(root)
+    version = Version(
+        name=name,
+        root=root,
+        created=datetime.now(timezone.utc).isoformat(),
+        experiments=len(table),
+    )
+    versions.versions.append(version)
+    versions.save(data_folder)
+    return version
+
+
+def diff(blobs: BlobStore, old: str, new: str) -> list[ExperimentChange]:
+    """Experiments added, removed or changed between two version roots, sorted
+    by run key"""
+    changes = []
+    for _, old_bucket, new_bucket in _changed(blobs, old, new):
+        for key, old_record, new_record in _changed(blobs, old_bucket, new_bucket):
+            changes.append(_change(blobs, key, old_record, new_record))
+
+    return sorted(changes, key=lambda change: change.key)
+
+
+def _changed(blobs: BlobStore, old: str | None, new: str | None):
+    """Names whose digests differ between two trees, with both digests"""
+    if old == new:
+        return
+
+    old_tree = blobs.manifest(old) if old is not None else {}
+    new_tree = blobs.manifest(new) if new is not None else {}
+    for name in old_tree.keys() | new_tree.keys():
+        if old_tree.get(name) != new_tree.get(name):
+            yield name, old_tree.get(name), new_tree.get(name)
+
+
+def _change(
+    blobs: BlobStore, key: str, old: str | None, new: str | None
+) -> ExperimentChange:
+    old_record = blobs.manifest(old) if old is not None else {}
+    new_record = blobs.manifest(new) if new is not None else {}
+    before, after = (
+        json.loads(blobs.read(record["experiment"])) if record else None
+        for record in (old_record, new_record)
+    )
+
+    old_counts, new_counts = old_record.get("counts"), new_record.get("counts")
+    counts_changed = (
+        before is not None and after is not None and old_counts != new_counts
+    )
+    max_circuit_delta = None
+    if counts_changed and old_counts is not None and new_counts is not None:
+        max_circuit_delta = _max_circuit_delta(
+            _circuit_win_rates(blobs, old_counts), _circuit_win_rates(blobs, new_counts)
+        )
+
+    return ExperimentChange(key, before, after, counts_changed, max_circuit_delta)
+
+
+def _circuit_win_rates(blobs: BlobStore, digest: str) -> dict[tuple, float]:
+    result = Result.model_validate_json(blobs.read(digest))
+    return {tuple(r.circuit): r.win_rate for r in result.results}
+
+
+def _max_circuit_delta(old: dict[tuple, float], new: dict[tuple, float]) -> float:
+    shared = old.keys() & new.keys()
+    return max((abs(new[c] - old[c]) for c in shared), default=0.0)
+
+
+def _record_key(doc: dict) -> str:
+    return "/".join(map(str, experiment_key(doc)))
+
+
+def _bucket(key: str) -> str:
+    return hashlib.sha256(key.encode()).hexdigest()[:_prefix_length]
+
+
+def _serialize(doc: dict) -> bytes:
+    return json.dumps(doc, sort_keys=True, separators=(",", ":")).encode()
+
+
+def _counts_digest(doc, data_folder: Path, blobs: BlobStore) -> str | None:
+    digest = doc["circuit_data"].get("result_digest")
+    if digest is not None and digest in blobs:
+        return digest
+
+    # Databases built without the blob store only have the file
+    file = counts_file(data_folder, doc.doc_id)
+    if doc.get("attributes", {}).get("has_counts") and file.exists():
+        return blobs.put(file)
+
+    return None
+
+
+def _get(doc: dict, path: tuple[str, ...]):
+    for part in path:
+        doc = doc.get(part) if isinstance(doc, dict) else None
+    return doc